@@ -1,3 +1,11 @@
-import pkg_resources
+# Django imports this package on startup, pkg_resources is slow to import and
+# only used without importlib.metadata.
+try:
+    from importlib.metadata import version
+except ImportError:
+    from pkg_resources import get_distribution
 
-VERSION = pkg_resources.get_distribution('django_omnibus').version
+    def version(name):
+        return get_distribution(name).version
+
+VERSION = version('django_omnibus')
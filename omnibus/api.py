@@ -1,9 +1,18 @@
-from .pubsub import PubSub
+from django.utils.functional import SimpleLazyObject
 
+from .backend import get_pubsub
 
-pubsub = PubSub()
 
+# The bus backend is created on first use, importing the api doesn't import
+# the backend or open any sockets.
+pubsub = SimpleLazyObject(get_pubsub)
 
-def publish(channel, payload_type, payload=None, sender=None):
+
+def publish(channel, payload_type, payload=None, sender=None, ttl=None):
     """ API method to publish messages to pubsub subsystem. """
-    return pubsub.publish(channel, payload_type, payload, sender)
+    return pubsub.publish(channel, payload_type, payload, sender, ttl=ttl)
+
+
+def send_to(identifier, payload_type, payload=None, sender=None):
+    """ API method to send messages to the connections of an identifier. """
+    return pubsub.send_to(identifier, payload_type, payload, sender)
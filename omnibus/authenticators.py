@@ -1,11 +1,19 @@
 import hashlib
 import hmac
+from collections import namedtuple
 
 from django.conf import settings
 from django.utils.encoding import force_bytes
 
 
+# The user fields an authenticator needs, stored instead of the model instance
+# to keep the connections small.
+UserInfo = namedtuple('UserInfo', ('pk', 'is_staff'))
+
+
 class NoOpAuthenticator(object):
+    __slots__ = ('identifier',)
+
     @classmethod
     def authenticate(cls, args):
         """
@@ -52,6 +60,8 @@ class NoOpAuthenticator(object):
 
 
 class UserAuthenticator(object):
+    __slots__ = ('identifier', 'user')
+
     @classmethod
     def authenticate(cls, args):
         # First of all, check if we found a auth_token (assuming the connection
@@ -74,9 +84,11 @@ class UserAuthenticator(object):
                 # for backwards compatibility
                 from django.contrib.auth.models import User
 
-            # We validated the auth_token, fetch user from db for further use.
+            # We validated the auth_token, fetch the required user fields from
+            # db for further use.
             try:
-                user = User.objects.get(pk=int(user_id), is_active=True)
+                user = UserInfo(*User.objects.values_list(*UserInfo._fields).get(
+                    pk=int(user_id), is_active=True))
             except (ValueError, User.DoesNotExist):
                 return None
         else:
@@ -102,7 +114,8 @@ class UserAuthenticator(object):
 
     def __init__(self, identifier, user):
         self.identifier = identifier
-        self.user = user
+        # Only keep the required fields if a user model instance is passed.
+        self.user = None if user is None else UserInfo(user.pk, user.is_staff)
 
     def get_identifier(self):
         return self.identifier
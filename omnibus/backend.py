@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+
+try:
+    from django.utils.module_loading import import_string
+except ImportError:
+    from django.utils.module_loading import import_by_path as import_string
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import exceptions as ex
+from .direct import get_topic
+from .settings import PUBSUB_BACKEND
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_pubsub(**kwargs):
+    """
+    `get_pubsub` returns an instance of the bus backend configured by
+    ``OMNIBUS_PUBSUB_BACKEND``.
+    """
+    return import_string(PUBSUB_BACKEND)(**kwargs)
+
+
+class BasePubSub(object):
+    """
+    `BasePubSub` is the interface of the bus backends. The messages are built
+    here, backends implement sending the frames and the subscribers.
+
+    Frames are the channel (or topic) followed by a colon and the JSON encoded
+    message. Subscribers are created with a callback, which is called with a
+    list of frames (as bytes) for every received message.
+    """
+    logger = logger
+
+    def log(self, level, message):
+        getattr(self.logger, level)(u'[%s] %s' % (id(self), message))
+
+    # PUBLISHING -------------------------------------------------------------
+
+    def send(self, msg):
+        """
+        `send` publishes a frame to all subscribers of its channel.
+        """
+        raise NotImplementedError
+
+    def get_message(self, payload_type, payload=None, sender=None):
+        """
+        `get_message` returns the message envelope and ensures the payload
+        has the correct data type.
+        """
+        if payload is None:
+            payload = {}
+
+        if not isinstance(payload, dict):
+            raise ex.OmnibusDataException(
+                'Invalid payload, needs to be a dict: {0}'.format(type(payload)))
+
+        return {
+            'sender': sender,
+            'type': payload_type,
+            'payload': payload
+        }
+
+    def publish(self, channel, payload_type, payload=None, sender=None, ttl=None):
+        """
+        `publish` is a highlevel method to publish stuff. It handles the json
+        converting and ensures the payload has the correct data type.
+
+        Messages with a `ttl` (in seconds) are dropped by ``omnibusd`` instead
+        of being delivered after their expiry time. The expiry time is the
+        first key of the message, to be found without decoding it.
+        """
+        message = self.get_message(payload_type, payload, sender)
+
+        try:
+            self.log(
+                'debug',
+                u'publish to {0} (payload_type:{1}, payload:{2}, sender:{3})'.format(
+                    channel, payload_type, payload, sender))
+
+            data = json.dumps(message, cls=DjangoJSONEncoder)
+            if ttl is not None:
+                data = u'{{"expires":{0:.3f},{1}'.format(time.time() + ttl, data[1:])
+
+            return self.send(u'{0}:{1}'.format(channel, data))
+        except (TypeError, ValueError) as e:
+            raise ex.OmnibusDataException(e)
+
+    def publish_batch(self, channel, messages):
+        """
+        `publish_batch` publishes a list of `(payload_type, payload, sender)`
+        tuples to a channel as a single frame, containing a list of messages.
+        """
+        messages = [self.get_message(*message) for message in messages]
+        if len(messages) == 1:
+            data = messages[0]
+        else:
+            data = messages
+
+        try:
+            self.log('debug', u'publish {0} messages to {1}'.format(len(messages), channel))
+
+            return self.send(u'{0}:{1}'.format(
+                channel, json.dumps(data, cls=DjangoJSONEncoder)))
+        except (TypeError, ValueError) as e:
+            raise ex.OmnibusDataException(e)
+
+    def send_to(self, identifier, payload_type, payload=None, sender=None):
+        """
+        `send_to` publishes a message to the connections of the given
+        identifier, without the need of a channel per identifier.
+        """
+        message = self.get_message(payload_type, payload, sender)
+
+        try:
+            self.log(
+                'debug',
+                u'send to {0} (payload_type:{1}, payload:{2}, sender:{3})'.format(
+                    identifier, payload_type, payload, sender))
+
+            return self.send(u'{0}{1}'.format(
+                get_topic(identifier), json.dumps(message, cls=DjangoJSONEncoder)))
+        except (TypeError, ValueError) as e:
+            raise ex.OmnibusDataException(e)
+
+    # SUBSCRIBING ------------------------------------------------------------
+
+    def get_subscriber(self, callback, address=None):
+        """
+        `get_subscriber` returns a new subscriber calling the callback for
+        every message of its channels. The `channels` attribute of the
+        subscriber lists the subscribed channels.
+        """
+        raise NotImplementedError
+
+    def close_subscriber(self, subscriber):
+        raise NotImplementedError
+
+    def subscribe(self, subscriber, channel):
+        """
+        `subscribe` subscribes the subscriber to a channel, returns False if
+        the subscriber is subscribed already.
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscriber, channel):
+        """
+        `unsubscribe` unsubscribes the subscriber from a channel, returns False
+        if the subscriber isn't subscribed.
+        """
+        raise NotImplementedError
+
+    def subscribe_topic(self, subscriber, topic):
+        """
+        `subscribe_topic` subscribes the subscriber to a topic which isn't a
+        channel, e.g. the direct messages of an identifier.
+        """
+        raise NotImplementedError
+
+    def unsubscribe_topic(self, subscriber, topic):
+        raise NotImplementedError
+
+    def replay(self, channel, offset, callback):
+        """
+        `replay` requests the stored messages of a durable channel from the
+        offset on. The callback is called with the list of frames, the offset
+        following them and whether more frames are available. The frames are
+        None if the request failed.
+        """
+        raise NotImplementedError
+
+    # BRIDGING ---------------------------------------------------------------
+
+    def init_director(self):
+        """
+        `init_director` starts the message hub within this process, if the
+        backend needs one.
+        """
+        raise NotImplementedError
+
+    def init_forwarder(self):
+        raise NotImplementedError
+
+    def close(self, linger=None):
+        """
+        `close` closes all subscribers and connections, pending messages are
+        sent for up to `linger` milliseconds.
+        """
+        raise NotImplementedError
@@ -1,4 +1,12 @@
 import re
+import sys
+
+# Python 2 has intern as a builtin, Python 3 moved it to sys.
+intern = getattr(sys, 'intern', None) or __builtins__['intern']
+
+# Text types for Python 2 (unicode, str) and Python 3 (str).
+string_types = (type(u''), type(''))
+
 
 host_validation_re = re.compile(r"^([a-z0-9.-]+|\[[a-f0-9]*:[a-f0-9:]+\])(:\d+)?$")
 
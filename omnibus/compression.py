@@ -0,0 +1,146 @@
+import zlib
+
+from django.utils.encoding import force_bytes
+from tornado.iostream import StreamClosedError
+from tornado.websocket import WebSocketClosedError
+
+from .settings import (
+    COMPRESSION_ENABLED, COMPRESSION_LEVEL, COMPRESSION_MEM_LEVEL,
+    COMPRESSION_WINDOW_BITS, COMPRESSION_MIN_SIZE, COMPRESSION_EXEMPT_CHANNELS)
+
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+
+
+class FrameCompressor(object):
+    """
+    `FrameCompressor` decides per message whether a permessage-deflate frame
+    should be compressed. Small messages and messages to exempted channels
+    are sent uncompressed, which the extension explicitly allows.
+
+    If the client negotiated `server_no_context_takeover`, every message is
+    compressed with a fresh deflate context. The result only depends on the
+    message, so the compressed bytes are shared between all recipients of a
+    broadcast. Otherwise Tornado compresses the message per connection.
+
+    The frames are written using private internals of Tornado's websocket
+    protocol, which were checked up to Tornado 6.
+    """
+
+    # The cache only needs to survive one fan-out.
+    cache_size = 64
+
+    def __init__(
+        self, enabled=COMPRESSION_ENABLED, level=COMPRESSION_LEVEL,
+        mem_level=COMPRESSION_MEM_LEVEL, window_bits=COMPRESSION_WINDOW_BITS,
+        min_size=COMPRESSION_MIN_SIZE, exempt_channels=COMPRESSION_EXEMPT_CHANNELS
+    ):
+        self.enabled = enabled
+        self.level = level
+        self.mem_level = mem_level
+        self.window_bits = window_bits
+        self.min_size = min_size
+        self.exempt_channels = tuple(force_bytes(c) for c in exempt_channels)
+        self.cache = {}
+
+    def get_compression_options(self):
+        """
+        `get_compression_options` returns the options for Tornado's websocket
+        handler, None disables compression.
+        """
+        if not self.enabled:
+            return None
+
+        return {
+            'compression_level': self.level,
+            'mem_level': self.mem_level,
+        }
+
+    def limit_window(self, handler):
+        """
+        `limit_window` makes the connection's deflate context (with context
+        takeover) use `window_bits`. The window size is negotiated by the
+        client and Tornado only accepts its offer, but compressing with a
+        smaller window than negotiated is always valid for the client. Called
+        before the first message is written.
+        """
+        deflate = getattr(handler.ws_connection, '_compressor', None)
+        if (
+            deflate is None or getattr(deflate, '_compressor', None) is None
+            or not hasattr(deflate, '_max_wbits')
+            or not hasattr(deflate, '_create_compressor')
+        ):
+            return
+
+        if self.window_bits < deflate._max_wbits:
+            deflate._max_wbits = self.window_bits
+            deflate._compressor = deflate._create_compressor()
+
+    def should_compress(self, msg):
+        if len(msg) < self.min_size:
+            return False
+
+        # Frames start with the channel name, exempted channels are prefixes.
+        return not msg.startswith(self.exempt_channels)
+
+    def compress(self, msg, max_wbits):
+        """
+        `compress` returns the deflated message without the trailing empty
+        block, as required by permessage-deflate. A smaller window than the
+        negotiated one is always valid for the receiving side.
+        """
+        wbits = min(self.window_bits, max_wbits)
+
+        key = (msg, wbits)
+        data = self.cache.get(key, None)
+        if data is None:
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, -wbits, self.mem_level)
+            data = compressor.compress(msg) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            data = data[:-4]
+
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[key] = data
+
+        return data
+
+    def write_message(self, handler, msg, binary=False):
+        """
+        `write_message` writes the message to the websocket handler, deciding
+        on its own whether and how the frame is compressed.
+        """
+        protocol = handler.ws_connection
+        deflate = getattr(protocol, '_compressor', None)
+
+        # Compression wasn't negotiated or the connection is closing, nothing
+        # to decide here. The same if the internals of Tornado's websocket
+        # protocol changed, Tornado compresses every message then.
+        if (
+            deflate is None or protocol.is_closing()
+            or not hasattr(protocol, '_write_frame')
+            or not hasattr(deflate, '_compressor') or not hasattr(deflate, '_max_wbits')
+        ):
+            return handler.write_message(msg, binary=binary)
+
+        msg = force_bytes(msg)
+        opcode = OPCODE_BINARY if binary else OPCODE_TEXT
+
+        if not self.should_compress(msg):
+            return self.write_frame(protocol, opcode, msg, 0)
+
+        if deflate._compressor is None:
+            # No context takeover, compressed bytes can be shared.
+            return self.write_frame(
+                protocol, opcode, self.compress(msg, deflate._max_wbits),
+                protocol.RSV1)
+
+        # Context takeover, the connection's compressor keeps the window.
+        return handler.write_message(msg, binary=binary)
+
+    def write_frame(self, protocol, opcode, data, flags):
+        try:
+            return protocol._write_frame(True, opcode, data, flags=flags)
+        except StreamClosedError:
+            raise WebSocketClosedError()
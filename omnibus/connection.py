@@ -1,5 +1,25 @@
 import json
 import logging
+import math
+import time
+
+from django.utils.encoding import force_bytes
+
+from . import exceptions as ex
+from . import metrics
+from .compat import intern, string_types
+from .direct import router
+from .encoding import get_encoding
+from .expiry import get_expiry, has_expired
+from .monitor import monitored, watchdog
+from .presence import presence
+from .ratelimit import get_rate_limiter
+from .registry import connections
+from .rpc import rpc
+from .settings import (
+    SEND_BATCH_INTERVAL, SEND_WINDOW, HEARTBEAT_INTERVAL, AUTHENTICATION_TIMEOUT, IDLE_TIMEOUT,
+    MAX_CONNECTIONS, CONNECTION_RATE_LIMIT, COMMAND_RATE_LIMIT, PUBLISH_RATE_LIMIT,
+    RETRY_AFTER, DURABLE_CHANNELS)
 
 
 logger = logging.getLogger(__name__)
@@ -10,16 +30,83 @@ LOG_LEVELS = {
     'error': logger.error,
 }
 
+# Close code telling clients to reconnect after the number of seconds given
+# as close reason.
+CLOSE_RETRY_AFTER = 4429
+
+
+def get_channel(frame):
+    """
+    `get_channel` returns the channel of a frame, or the command (e.g.
+    ``!presence``) of command frames.
+    """
+    if isinstance(frame, bytes):
+        return frame[:frame.find(b':')].decode('utf-8', 'replace')
+    return frame[:frame.find(':')]
+
 
 class MessageConnection(object):
+    # Connections are long-lived and numerous, keep the per-instance state in
+    # slots. Transport handlers mixed in still provide their own __dict__.
+    __slots__ = (
+        'authenticator', 'subscriber', 'encoding', 'send_buffer', 'opened',
+        'last_activity', 'address', 'rejected', 'replaying', 'pending_frames')
+
     authenticator_class = None
     pubsub = None
 
+    # Set to True by transports which are able to deliver binary frames.
+    binary_supported = False
+
+    # Milliseconds to collect outgoing messages before sending them as one
+    # batch frame. 0 collects within one IOLoop iteration, None disables.
+    send_batch_interval = SEND_BATCH_INTERVAL
+
+    # Number of channel message frames written to the transport, but not sent
+    # yet, before further messages wait in the send buffer. None disables.
+    send_window = SEND_WINDOW
+
+    # Responses of these commands are written right away, they jump the queue
+    # of channel messages waiting for the batch or the send window.
+    control_commands = frozenset([
+        'authenticate', 'subscribe', 'unsubscribe', 'resume', 'heartbeat',
+        'encoding', 'batch'])
+
+    # Timeouts in seconds, checked periodically by the reaper. Connections
+    # are closed if they failed to authenticate in time or went silent.
+    # Silent connections get a heartbeat command first, if enabled.
+    authentication_timeout = AUTHENTICATION_TIMEOUT
+    idle_timeout = IDLE_TIMEOUT
+    heartbeat_interval = HEARTBEAT_INTERVAL
+
+    registry = connections
+    presence = presence
+    router = router
+    rpc = rpc
+
+    # Admission control, the limiters are shared by all connections of the
+    # process and keyed by address or identifier.
+    max_connections = MAX_CONNECTIONS
+    connection_limiter = get_rate_limiter(CONNECTION_RATE_LIMIT)
+    command_limiter = get_rate_limiter(COMMAND_RATE_LIMIT)
+    publish_limiter = get_rate_limiter(PUBLISH_RATE_LIMIT)
+    retry_after = RETRY_AFTER
+
+    # Prefixes of channels whose messages can be replayed after reconnecting.
+    durable_channels = tuple(DURABLE_CHANNELS)
+
     def __init__(self, *args, **kwargs):
         # Initialize authenticator and subscriber attributes to make sure we
         # have a clean instance.
         self.authenticator = None
         self.subscriber = None
+        self.encoding = None
+        self.send_buffer = []
+        self.opened = self.last_activity = None
+        self.address = None
+        self.rejected = False
+        self.replaying = None
+        self.pending_frames = 0
         super(MessageConnection, self).__init__(*args, **kwargs)
 
     def log(self, level, message):
@@ -28,37 +115,100 @@ class MessageConnection(object):
 
     # MESSAGES ---------------------------------------------------------------
 
+    @monitored('MessageConnection.on_open')
     def on_open(self, info):
         self.log('debug', 'CON: Connecting..')
+        self.address = self.get_remote_address(info)
+
+        retry_after = self.check_admission()
+        if retry_after:
+            self.close_retry_after(retry_after)
+            return
+
         self.open_connection()
         self.log('info', 'CON: Connected.')
 
+    @monitored('MessageConnection.on_close')
     def on_close(self):
         self.log('debug', 'CON: Disconnecting..')
         self.close_connection()
         self.log('info', 'CON: Disconnected.')
 
+    @monitored('MessageConnection.on_error')
     def on_error(self, exception):
         self.log('error', u'CON: Error: {0}'.format(exception))
         self.close_connection()
 
     def on_message(self, msg):
         self.log('debug', u'IN: {0}'.format(msg))
+        self.last_activity = time.time()
+
+        # The connection is about to be closed, ignore everything.
+        if self.rejected:
+            return
 
         # Command messages start with "!", lets see if the have a command here.
         if msg[0] == '!':
             command, args = msg[1:].split(':', 1)
+
+            # The messages of a batch are checked one by one.
+            if command != 'batch':
+                retry_after = self.check_rate_limit(self.command_limiter, 'command')
+                if retry_after:
+                    self.close_retry_after(retry_after)
+                    return
+
             # We have a command, handle it.
             self.on_command_message(command, args)
         elif self.is_authenticated():
+            if self.check_rate_limit(self.publish_limiter, 'publish'):
+                self.log('info', 'PUB: Rate limited, dropping message.')
+                return
+
             # Handle incoming channel messages only when connection is
             # authenticated.
             channel = msg[:msg.index(':')]
             self.on_channel_message(channel, msg)
 
+    @monitored('MessageConnection.on_subscriber_message')
     def on_subscriber_message(self, msg):
         # Message from subscriber zmq connection
-        self.send(msg[0])
+        # Connections never subscribe internal channels, frames of them are
+        # dropped in case a subscription matches them anyway, e.g. by prefix.
+        if msg[0][:1] == b'!':
+            return
+
+        if self.replaying:
+            # Messages of channels being replayed are sent after the replay.
+            held = self.replaying.get(msg[0][:msg[0].find(b':')], None)
+            if held is not None:
+                held.append(msg[0])
+                return
+
+        self.send_message(msg[0])
+
+    def send_message(self, frame):
+        """
+        `send_message` sends a channel message frame of the bus, using the
+        encoding of the connection. Expired messages are dropped.
+        """
+        # The expiry is read before the frame is encoded, the send buffer
+        # checks it again.
+        expiry = get_expiry(frame)
+        if has_expired(expiry, 'subscriber'):
+            return
+
+        if self.encoding is None:
+            self.send(frame, expiry=expiry)
+            return
+
+        try:
+            frame = self.encoding.transcode(frame)
+        except (TypeError, ValueError) as e:
+            self.log('error', u'OUT: Unable to encode message: {0}'.format(e))
+            return
+
+        self.send(frame, expiry=expiry)
 
     def on_command_message(self, command, args):
         """
@@ -73,8 +223,12 @@ class MessageConnection(object):
             self.respond_command(command, False)
         else:
             self.log('info', u'CON: {0} with {1}'.format(command, args))
-            handler(args)
+            if watchdog.enabled:
+                watchdog.call(u'command_{0}'.format(command), handler, args)
+            else:
+                handler(args)
 
+    @monitored('MessageConnection.on_channel_message')
     def on_channel_message(self, channel, payload):
         """
         `on_channel_message` is called after a message was received from a client
@@ -88,6 +242,7 @@ class MessageConnection(object):
             and self.authenticator.can_publish(channel)
         ):
             # Connection is subscribed and allowed to publish.
+            metrics.messages_received.inc(label=channel)
             self.publish(payload)
 
     # CONNECTION -------------------------------------------------------------
@@ -97,11 +252,141 @@ class MessageConnection(object):
         # connection or from python-api calls.
         self.subscriber = self.pubsub.get_subscriber(
             self.on_subscriber_message)
+        metrics.connections.inc()
+
+        self.opened = self.last_activity = time.time()
+        self.registry.add(self)
 
     def close_connection(self):
+        # Pending messages cannot be delivered anymore.
+        metrics.send_queue.dec(len(self.send_buffer))
+        self.send_buffer = []
+        self.replaying = None
+        self.registry.remove(self)
+
+        if self.is_authenticated():
+            self.router.remove(self, self.authenticator.get_identifier())
+
         # Check if we have a initialized subscriber connection, if yes - close!
+        # The subscriber is reset, close_connection is called on error and
+        # on close.
         if self.subscriber is not None:
-            self.pubsub.close_subscriber(self.subscriber)
+            subscriber, self.subscriber = self.subscriber, None
+            for channel in subscriber.channels:
+                metrics.subscriptions.dec(label=channel)
+                if self.presence.tracks(channel):
+                    self.presence.leave(self, channel)
+            metrics.connections.dec()
+            self.pubsub.close_subscriber(subscriber)
+
+    def get_remote_address(self, info):
+        """
+        `get_remote_address` returns the client's IP address, transports
+        override this if the address isn't available from `info`.
+        """
+        return getattr(info, 'ip', None)
+
+    def check_admission(self):
+        """
+        `check_admission` is called when a connection is opened. Returns 0 if
+        the connection is accepted, otherwise the seconds the client should
+        wait before reconnecting.
+        """
+        if self.registry.draining:
+            metrics.rejected.inc(label='draining')
+            return self.retry_after
+
+        if (
+            self.max_connections is not None
+            and len(self.registry) >= self.max_connections
+        ):
+            metrics.rejected.inc(label='max_connections')
+            return self.retry_after
+
+        if self.connection_limiter is not None:
+            retry_after = self.connection_limiter.check(self.address)
+            if retry_after:
+                metrics.rejected.inc(label='connection')
+                return retry_after
+
+        return 0
+
+    def check_rate_limit(self, limiter, kind):
+        """
+        `check_rate_limit` consumes a token of the limiter, keyed by identifier
+        once authenticated and by address before. Returns 0 if allowed,
+        otherwise the seconds to wait.
+        """
+        if limiter is None:
+            return 0
+
+        if self.is_authenticated():
+            key = self.authenticator.get_identifier()
+        else:
+            key = self.address
+
+        retry_after = limiter.check(key)
+        if retry_after:
+            metrics.rejected.inc(label=kind)
+        return retry_after
+
+    def close_retry_after(self, retry_after):
+        """
+        `close_retry_after` closes the connection and tells the client to wait
+        the given seconds, but at least `retry_after` seconds, before
+        reconnecting.
+        """
+        self.rejected = True
+        retry_after = int(math.ceil(max(retry_after, self.retry_after)))
+        self.log('info', u'CON: Closing, retry after {0}s.'.format(retry_after))
+        self.close_transport(CLOSE_RETRY_AFTER, str(retry_after))
+
+    def close_transport(self, code, reason):
+        """
+        `close_transport` closes the connection with the given close code and
+        reason, if supported by the transport.
+        """
+        self.close()
+
+    def drain(self):
+        """
+        `drain` is called when ``omnibusd`` shuts down. Pending messages are
+        sent before the client is asked to reconnect, to another process.
+        """
+        if self.send_buffer:
+            self.flush_send_buffer(force=True)
+        self.close_retry_after(0)
+
+    def check_timeouts(self, now):
+        """
+        `check_timeouts` is called periodically by the reaper.
+        """
+        if (
+            self.authentication_timeout is not None
+            and not self.is_authenticated()
+            and now - self.opened > self.authentication_timeout
+        ):
+            self.reap('authentication')
+        elif (
+            self.idle_timeout is not None
+            and now - self.last_activity > self.idle_timeout
+        ):
+            self.reap('idle')
+        elif (
+            self.heartbeat_interval is not None
+            and now - self.last_activity > self.heartbeat_interval
+        ):
+            # The client answers with a heartbeat, which counts as activity.
+            self.respond_command('heartbeat', True)
+
+    def reap(self, reason):
+        """
+        `reap` closes the connection, the resources are freed in `on_close`.
+        """
+        self.log('info', u'CON: Closing, {0} timeout.'.format(reason))
+        metrics.reaped.inc(label=reason)
+        self.registry.remove(self)
+        self.close()
 
     def publish(self, msg):
         """
@@ -111,25 +396,221 @@ class MessageConnection(object):
         self.log('debug', u'PUB: {0}'.format(msg))
         self.pubsub.send(msg)
 
-    def send(self, msg):
+    def send(self, msg, priority=False, expiry=None):
         """
         `send` is used to deliver messages and command responses to client/browser.
+        Priority messages skip the send buffer and the send window. Messages
+        with an `expiry` are dropped if they expire in the send buffer.
         """
         self.log('debug', u'OUT: {0}'.format(msg))
+        metrics.messages_sent.inc(label=get_channel(msg))
+        metrics.bytes_sent.inc(len(msg))
+
+        if priority:
+            return self.send_frame(msg)
+
+        # Messages keep their order, once collected or waiting for the send
+        # window, further messages are collected as well.
+        if not self.send_buffer and not self.is_window_full():
+            # Binary frames are never batched.
+            if self.send_batch_interval is None or self.encoding is not None:
+                return self.write_frame(msg)
+
+            if self.send_batch_interval:
+                self.pubsub.loop.call_later(
+                    self.send_batch_interval / 1000.0, self.flush_send_buffer)
+            else:
+                self.pubsub.loop.add_callback(self.flush_send_buffer)
+
+        self.send_buffer.append((msg, expiry))
+        metrics.send_queue.inc()
+
+    def flush_send_buffer(self, force=False):
+        """
+        `flush_send_buffer` sends all collected messages as a single batch frame.
+        The messages keep waiting while the send window is full, unless forced.
+        """
+        if not force and self.is_window_full():
+            return
+
+        messages, self.send_buffer = self.send_buffer, []
+        metrics.send_queue.dec(len(messages))
+
+        # Messages may expire while waiting for the batch or the send window.
+        messages = [
+            (msg, expiry) for msg, expiry in messages
+            if not has_expired(expiry, 'send_buffer')]
+
+        if self.encoding is not None:
+            # Binary frames are never batched, the frames beyond the send
+            # window keep waiting.
+            sent = 0
+            while sent < len(messages) and (force or not self.is_window_full()):
+                self.write_frame(messages[sent][0])
+                sent += 1
+            if sent < len(messages):
+                self.send_buffer[:0] = messages[sent:]
+                metrics.send_queue.inc(len(messages) - sent)
+        elif len(messages) == 1:
+            self.write_frame(messages[0][0])
+        elif messages:
+            self.write_frame('!batch:{0}'.format(json.dumps([
+                msg.decode('utf-8') if isinstance(msg, bytes) else msg
+                for msg, expiry in messages
+            ])))
+
+    def is_window_full(self):
+        return self.send_window is not None and self.pending_frames >= self.send_window
+
+    def write_frame(self, msg):
+        """
+        `write_frame` writes a frame of channel messages to the transport. If
+        the transport returns a future, the frame counts towards the send
+        window until it was sent.
+        """
+        future = self.send_frame(msg)
+        if self.send_window is not None and future is not None:
+            self.pending_frames += 1
+            future.add_done_callback(self.on_frame_sent)
+        return future
+
+    def on_frame_sent(self, future):
+        # Failed writes close the connection, the error is handled there.
+        future.exception()
+        self.pending_frames -= 1
+
+        if self.send_buffer and not self.is_window_full():
+            self.flush_send_buffer()
+
+    def send_frame(self, msg):
+        """
+        `send_frame` writes a single frame to the transport.
+        """
         return super(MessageConnection, self).send(msg)
 
     def respond_command(self, command, success, payload=None):
         """
         `respond_command` is a helper method for command responses.
         """
-        self.send('!{0}:{1}'.format(
-            command,
-            json.dumps({
-                'type': command,
-                'success': success,
-                'payload': payload
-            })
-        ))
+        response = {
+            'type': command,
+            'success': success,
+            'payload': payload
+        }
+
+        priority = command in self.control_commands
+        if self.encoding is not None:
+            self.send(self.encoding.encode('!{0}'.format(command), response), priority)
+        else:
+            self.send('!{0}:{1}'.format(command, json.dumps(response)), priority)
+
+    def send_command_frame(self, frame, command, payload):
+        """
+        `send_command_frame` sends a command which is the same for many
+        connections, e.g. presence changes. The text frame is encoded once by
+        the caller, connections with a binary encoding encode the payload.
+        """
+        if self.encoding is None:
+            self.send(frame)
+        else:
+            self.respond_command(command, True, payload)
+
+    # BATCHING ---------------------------------------------------------------
+
+    def command_batch(self, args):
+        """
+        `command_batch` handles a batch of messages coalesced by the client.
+        The messages are processed in order, as if they were received one by one.
+        """
+        try:
+            messages = json.loads(args)
+        except ValueError:
+            messages = None
+
+        if not isinstance(messages, list):
+            self.respond_command('batch', False)
+            return
+
+        for msg in messages:
+            # Nested batches are not allowed.
+            if (
+                isinstance(msg, string_types) and msg
+                and not msg.startswith('!batch:')
+            ):
+                self.on_message(msg)
+
+    # ENCODING ---------------------------------------------------------------
+
+    def command_encoding(self, args):
+        """
+        `command_encoding` switches the connection to a binary encoding. The
+        response is sent before switching, using the current encoding.
+        """
+        encoding = get_encoding(args) if self.binary_supported else None
+
+        self.respond_command('encoding', encoding is not None, {'encoding': args})
+
+        if encoding is not None:
+            self.encoding = encoding
+
+    # HEARTBEAT --------------------------------------------------------------
+
+    def command_heartbeat(self, args):
+        """
+        `command_heartbeat` handles the client's answer to a heartbeat. The
+        activity was already recorded when the message was received.
+        """
+        pass
+
+    # RPC --------------------------------------------------------------------
+
+    def command_call(self, args):
+        """
+        `command_call` handles remote procedure calls in the format
+        `<id>:<method>:<json params>`. The handler runs on the thread pool of
+        the rpc instance, the response carries the id of the call.
+        """
+        try:
+            call_id, method, params = args.split(':', 2)
+            params = json.loads(params)
+        except ValueError:
+            self.respond_command('call', False)
+            return
+
+        if not self.is_authenticated():
+            self.respond_call(call_id, error=u'Not authenticated')
+            return
+
+        try:
+            self.rpc.submit(
+                method, self.authenticator, params,
+                lambda future: self.on_call_done(call_id, method, future))
+        except ex.OmnibusRPCException as e:
+            self.respond_call(call_id, error=str(e))
+
+    @monitored('MessageConnection.on_call_done')
+    def on_call_done(self, call_id, method, future):
+        # The connection was closed while the handler was running.
+        if self.subscriber is None:
+            return
+
+        error = future.exception()
+        if error is None:
+            self.respond_call(call_id, result=future.result())
+        elif isinstance(error, ex.OmnibusRPCException):
+            self.respond_call(call_id, error=str(error))
+        else:
+            self.log('error', u'RPC: {0} failed: {1!r}'.format(method, error))
+            self.respond_call(call_id, error=u'Internal error')
+
+    def respond_call(self, call_id, result=None, error=None):
+        try:
+            self.respond_command('call', error is None, {
+                'id': call_id, 'result': result, 'error': error})
+        except (TypeError, ValueError) as e:
+            self.log('error', u'RPC: Unable to encode result: {0}'.format(e))
+            self.respond_command('call', False, {
+                'id': call_id, 'result': None, 'error': u'Invalid result'})
 
     # AUTHENTICATION ---------------------------------------------------------
 
@@ -141,13 +622,19 @@ class MessageConnection(object):
         `command_authenticate` is called when a client connection has sent the
         `authenticate` command.
         """
+        if self.is_authenticated():
+            self.router.remove(self, self.authenticator.get_identifier())
+
         self.authenticator = self.authenticator_class.authenticate(args)
 
         # The authenticator classmethod authenticate returns None if the connection
         # cannot be authenticated.
         if self.authenticator is None:
+            metrics.authentications.inc(label='failure')
             self.respond_command('authenticate', False)
         else:
+            metrics.authentications.inc(label='success')
+            self.router.add(self, self.authenticator.get_identifier())
             self.respond_command('authenticate', True)
 
     # PUBSUB -----------------------------------------------------------------
@@ -157,19 +644,119 @@ class MessageConnection(object):
         `command_subscribe` handles subscribe commands from client connections.
         """
         channel = str(args)
+        result = self.subscribe_channel(channel)
+
+        # Tell the client wether subscription was successful or not.
+        self.respond_command('subscribe', result, {'channel': channel})
+
+    def command_resume(self, args):
+        """
+        `command_resume` subscribes a reconnected client to a JSON list of
+        channels at once. A single response lists the result per channel.
+
+        Instead of a list, clients may send an object with the offset of the
+        last message received per channel. The later messages of durable
+        channels are replayed.
+        """
+        try:
+            channels = json.loads(args)
+        except ValueError:
+            channels = None
+
+        offsets = {}
+        if isinstance(channels, dict):
+            offsets, channels = channels, list(channels)
+
+        if not isinstance(channels, list):
+            self.respond_command('resume', False)
+            return
+
+        result = {}
+        for index, channel in enumerate(channels):
+            # Every channel counts as a command, like subscribing one by one.
+            # The first one was counted when the command was received.
+            if index:
+                retry_after = self.check_rate_limit(self.command_limiter, 'command')
+                if retry_after:
+                    self.close_retry_after(retry_after)
+                    return
+
+            if isinstance(channel, string_types) and channel:
+                result[channel] = self.subscribe_channel(str(channel))
+
+        self.respond_command('resume', True, {'channels': result})
+
+        for channel, offset in offsets.items():
+            if (
+                result.get(channel) and str(channel).startswith(self.durable_channels)
+                and isinstance(offset, int) and not isinstance(offset, bool) and offset >= -1
+            ):
+                self.replay_channel(str(channel), offset + 1)
+
+    def replay_channel(self, channel, offset):
+        """
+        `replay_channel` sends the stored messages of a durable channel from
+        the offset on. New messages of the channel are held back until the
+        replay is done, the client drops duplicates by their offset.
+        """
+        if self.replaying is None:
+            self.replaying = {}
+        self.replaying.setdefault(force_bytes(channel), [])
+
+        self.pubsub.replay(
+            channel, offset,
+            lambda frames, next_offset, more: self.on_replay(channel, frames, next_offset, more))
+
+    @monitored('MessageConnection.on_replay')
+    def on_replay(self, channel, frames, next_offset, more):
+        # The connection was closed in the meantime.
+        if self.subscriber is None:
+            return
+
+        subscribed = channel in self.subscriber.channels
+        if frames is None:
+            self.log('error', u'SUB: Unable to replay {0}.'.format(channel))
+        elif subscribed:
+            for frame in frames:
+                self.send_message(frame)
+
+            if more:
+                self.replay_channel(channel, next_offset)
+                return
+
+        held = self.replaying.pop(force_bytes(channel), [])
+        if subscribed:
+            self.respond_command('replay', frames is not None, {
+                'channel': channel, 'offset': next_offset})
+            for frame in held:
+                self.send_message(frame)
+
+    def subscribe_channel(self, channel):
+        """
+        `subscribe_channel` subscribes the connection to the channel, if
+        allowed. Returns True if the subscription was successful.
+        """
+        # Channel names are shared by many connections, keep only one copy.
+        channel = intern(channel)
         # Ensure the connection isn't already subscribed and is allowed to
-        # subscribe.
+        # subscribe. Channels starting with "!" are internal, the empty channel
+        # would match all channels.
         if (
-            channel not in self.subscriber.channels
+            channel and not channel.startswith('!')
+            and channel not in self.subscriber.channels
             and self.authenticator.can_subscribe(channel)
         ):
             # We're allowed to subscribe, try.
             result = self.pubsub.subscribe(self.subscriber, channel)
-        else:
-            result = False
+            if result:
+                metrics.subscriptions.inc(label=channel)
+                if self.presence.tracks(channel):
+                    self.presence.join(self, channel)
+                    self.respond_command(
+                        'presence', True, self.presence.snapshot(channel))
+            return result
 
-        # Tell the client wether subscription was successful or not.
-        self.respond_command('subscribe', result, {'channel': channel})
+        return False
 
     def command_unsubscribe(self, args):
         """
@@ -184,6 +771,10 @@ class MessageConnection(object):
         ):
             # Go, try it.
             result = self.pubsub.unsubscribe(self.subscriber, channel)
+            if result:
+                metrics.subscriptions.dec(label=channel)
+                if self.presence.tracks(channel):
+                    self.presence.leave(self, channel)
         else:
             result = False
 
@@ -0,0 +1,101 @@
+import json
+import logging
+
+from . import exceptions as ex
+from . import metrics
+from .monitor import monitored
+
+
+logger = logging.getLogger(__name__)
+
+# Bus channel of direct messages, followed by the JSON encoded identifier of
+# the receiver. The closing quote ensures the topic of an identifier isn't
+# a prefix of another identifier's topic.
+DIRECT_CHANNEL = '!direct'
+
+decoder = json.JSONDecoder()
+
+
+def get_topic(identifier):
+    return u'{0}:{1}:'.format(DIRECT_CHANNEL, json.dumps(identifier))
+
+
+class DirectRouter(object):
+    """
+    `DirectRouter` delivers direct messages to the connections of an
+    identifier.
+
+    The connections are indexed by identifier once authenticated. A single
+    subscriber per ``omnibusd`` process subscribes the topics of the indexed
+    identifiers, the director only forwards direct messages to the processes
+    holding a connection of the receiver.
+    """
+
+    def __init__(self):
+        self.connections = {}
+        self.pubsub = None
+        self.subscriber = None
+
+    def start(self, pubsub):
+        self.pubsub = pubsub
+        self.subscriber = pubsub.get_subscriber(self.on_message)
+        for identifier in self.connections:
+            self.subscribe(identifier, True)
+
+    def add(self, connection, identifier):
+        connections = self.connections.get(identifier, None)
+        if connections is None:
+            connections = self.connections[identifier] = set()
+            self.subscribe(identifier, True)
+        connections.add(connection)
+
+    def remove(self, connection, identifier):
+        connections = self.connections.get(identifier, None)
+        if connections is None:
+            return
+
+        connections.discard(connection)
+        if not connections:
+            del self.connections[identifier]
+            self.subscribe(identifier, False)
+
+    def subscribe(self, identifier, subscribe):
+        if self.subscriber is None:
+            return
+
+        # The channel list of pubsub subscribers doesn't scale to one topic
+        # per user, the topics are subscribed without it.
+        try:
+            if subscribe:
+                self.pubsub.subscribe_topic(self.subscriber, get_topic(identifier))
+            else:
+                self.pubsub.unsubscribe_topic(self.subscriber, get_topic(identifier))
+        except ex.OmnibusSubscriberException as e:
+            logger.error(u'Unable to subscribe direct messages: {0}'.format(e))
+
+    @monitored('DirectRouter.on_message')
+    def on_message(self, msg):
+        try:
+            text = msg[0].decode('utf-8')
+            identifier, end = decoder.raw_decode(text, len(DIRECT_CHANNEL) + 1)
+            message = json.loads(text[end + 1:])
+        except (TypeError, ValueError) as e:
+            logger.error(u'Invalid direct message: {0}'.format(e))
+            return
+
+        connections = self.connections.get(identifier, None)
+        if not connections:
+            return
+
+        frame = '!direct:{0}'.format(json.dumps({
+            'type': 'direct',
+            'success': True,
+            'payload': message,
+        }))
+
+        for connection in list(connections):
+            metrics.direct_messages.inc()
+            connection.send_command_frame(frame, 'direct', message)
+
+
+router = DirectRouter()
@@ -0,0 +1,344 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+from django.utils.encoding import force_bytes
+
+from . import exceptions as ex
+from . import metrics
+from .settings import (
+    DURABLE_CHANNELS, DURABLE_PATH, DURABLE_SEGMENT_SIZE, DURABLE_SEGMENTS)
+
+
+logger = logging.getLogger(__name__)
+
+# Records are the length of the frame followed by the frame.
+HEADER = struct.Struct('>I')
+# Entries of the offset index are the end positions of the records.
+ENTRY = struct.Struct('>I')
+
+
+def map_file(path, size):
+    """
+    `map_file` memory-maps a file, which is created (sparse) or grown to at
+    least `size` bytes.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        size = max(size, os.fstat(fd).st_size)
+        os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+class Segment(object):
+    """
+    `Segment` is a memory-mapped file of records, the first record has the
+    offset `base`. The offset index is a second memory-mapped file with the
+    end position of every record, records are found without scanning.
+    """
+    # Average record size the index is dimensioned for.
+    record_size = 32
+
+    def __init__(self, path, base, size):
+        self.path = path
+        self.base = base
+        self.data = map_file(path + '.log', size)
+        self.index = map_file(path + '.index', size // self.record_size * ENTRY.size)
+        self.size = len(self.data)
+        self.capacity = len(self.index) // ENTRY.size
+        self.count = self.recover()
+        self.position = self.get_end(self.count - 1)
+
+    @property
+    def next_offset(self):
+        return self.base + self.count
+
+    def get_end(self, entry):
+        if entry < 0:
+            return 0
+        return ENTRY.unpack_from(self.index, entry * ENTRY.size)[0]
+
+    def recover(self):
+        """
+        `recover` returns the number of records. Entries are written in order
+        after their record, the first empty entry ends the index.
+        """
+        low, high = 0, self.capacity
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_end(middle):
+                low = middle + 1
+            else:
+                high = middle
+
+        # Drop the last entries if their records are incomplete, e.g. after
+        # a power loss.
+        count = low
+        while count:
+            start, end = self.get_end(count - 2), self.get_end(count - 1)
+            if (
+                start + HEADER.size <= end <= self.size
+                and HEADER.unpack_from(self.data, start)[0] == end - start - HEADER.size
+            ):
+                break
+            count -= 1
+            ENTRY.pack_into(self.index, count * ENTRY.size, 0)
+
+        return count
+
+    def append(self, frame):
+        """
+        `append` writes the frame and returns its offset, or None if the
+        segment is full.
+        """
+        start = self.position
+        end = start + HEADER.size + len(frame)
+        if end > self.size or self.count >= self.capacity:
+            return None
+
+        HEADER.pack_into(self.data, start, len(frame))
+        self.data[start + HEADER.size:end] = frame
+        ENTRY.pack_into(self.index, self.count * ENTRY.size, end)
+
+        self.count += 1
+        self.position = end
+        return self.base + self.count - 1
+
+    def read(self, offset, limit):
+        frames = []
+        entry = offset - self.base
+        start = self.get_end(entry - 1)
+        while entry < self.count and len(frames) < limit:
+            end = self.get_end(entry)
+            frames.append(self.data[start + HEADER.size:end])
+            start = end
+            entry += 1
+
+        return frames
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+    def delete(self):
+        self.data.close()
+        self.index.close()
+        os.unlink(self.path + '.log')
+        os.unlink(self.path + '.index')
+
+
+class ChannelLog(object):
+    """
+    `ChannelLog` is the append-only log of a durable channel, a directory of
+    segments named by their first offset. When a segment is full, a new one
+    is started and the oldest segments beyond `max_segments` are deleted.
+    """
+
+    def __init__(self, directory, segment_size, max_segments):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        bases = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith('.log'))
+        self.segments = [Segment(self.get_path(base), base, segment_size) for base in bases]
+        if not self.segments:
+            self.segments.append(Segment(self.get_path(0), 0, segment_size))
+
+    def get_path(self, base):
+        return os.path.join(self.directory, '{0:020d}'.format(base))
+
+    @property
+    def next_offset(self):
+        return self.segments[-1].next_offset
+
+    def append(self, frame):
+        """
+        `append` returns the offset of the frame, or None if the frame doesn't
+        fit into a segment.
+        """
+        if HEADER.size + len(frame) > self.segment_size:
+            return None
+
+        offset = self.segments[-1].append(frame)
+        if offset is None:
+            self.rotate()
+            offset = self.segments[-1].append(frame)
+
+        return offset
+
+    def rotate(self):
+        segment = self.segments[-1]
+        segment.flush()
+
+        base = segment.next_offset
+        self.segments.append(Segment(self.get_path(base), base, self.segment_size))
+
+        while len(self.segments) > self.max_segments:
+            self.segments.pop(0).delete()
+
+    def read(self, offset, limit):
+        """
+        `read` returns up to `limit` frames from the offset on and the offset
+        following them. Offsets of deleted segments are skipped, offsets
+        beyond the end (of a log which was removed) start at the end.
+        """
+        offset = min(max(offset, self.segments[0].base), self.next_offset)
+        position = bisect.bisect_right([segment.base for segment in self.segments], offset)
+
+        frames = []
+        for segment in self.segments[max(position - 1, 0):]:
+            frames.extend(segment.read(offset + len(frames), limit - len(frames)))
+            if len(frames) >= limit:
+                break
+
+        return frames, offset + len(frames)
+
+    def flush(self):
+        self.segments[-1].flush()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+class DurableLog(object):
+    """
+    `DurableLog` keeps the messages of durable channels on disk, one
+    `ChannelLog` per channel. The director appends every message of a channel
+    starting with one of the `channels` prefixes, the offset of the message
+    within its channel is added to the message, clients resume from it.
+    """
+
+    def __init__(
+        self, path=DURABLE_PATH, channels=DURABLE_CHANNELS,
+        segment_size=DURABLE_SEGMENT_SIZE, max_segments=DURABLE_SEGMENTS
+    ):
+        if not path:
+            raise ex.OmnibusException('OMNIBUS_DURABLE_PATH is required for durable channels')
+
+        self.path = path
+        self.channels = tuple(force_bytes(channel) for channel in channels)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.logs = {}
+
+    def get_log(self, channel, create=True):
+        """
+        `get_log` returns the log of the channel, opening it if necessary.
+        Without `create`, None is returned if the channel has no log yet.
+        """
+        log = self.logs.get(channel, None)
+        if log is None:
+            name = quote(channel.decode('utf-8'), safe='').replace('.', '%2E')
+            directory = os.path.join(self.path, name)
+            if not create and not os.path.isdir(directory):
+                return None
+
+            log = self.logs[channel] = ChannelLog(
+                directory, self.segment_size, self.max_segments)
+        return log
+
+    def append(self, frame):
+        """
+        `append` stores the frame if its channel is durable and returns it
+        with the offset added. Other frames are returned unchanged.
+
+        Frames with a list of messages, e.g. of `publish_batch`, are stored as
+        one record per message, every message of the list gets its offset.
+        """
+        index = frame.find(b':')
+        channel = frame[:index]
+        if index < 0 or not channel.startswith(self.channels):
+            return frame
+
+        body = frame[index + 1:]
+        if body[:1] == b'{':
+            body = self.append_message(channel, body)
+        elif body[:1] == b'[':
+            body = self.append_list(channel, body)
+        else:
+            return frame
+
+        if body is None:
+            return frame
+        return b''.join([channel, b':', body])
+
+    def append_message(self, channel, body):
+        """
+        `append_message` stores a single message and returns it with the
+        offset added, or None if it wasn't stored.
+        """
+        log = self.get_log(channel)
+        rest = body[1:]
+        body = b''.join([
+            b'{"offset":', str(log.next_offset).encode('ascii'),
+            b'' if rest.lstrip().startswith(b'}') else b',', rest])
+
+        if log.append(b''.join([channel, b':', body])) is None:
+            logger.error(u'Message of {0} is too large for the durable log'.format(
+                channel.decode('utf-8')))
+            return None
+
+        metrics.durable_messages.inc()
+        return body
+
+    def append_list(self, channel, body):
+        try:
+            messages = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return None
+
+        bodies = []
+        for message in messages:
+            message = json.dumps(message).encode('utf-8')
+            if message[:1] == b'{':
+                message = self.append_message(channel, message) or message
+            bodies.append(message)
+
+        return b''.join([b'[', b','.join(bodies), b']'])
+
+    def read(self, channel, offset, limit):
+        """
+        `read` returns up to `limit` frames of the channel from the offset on,
+        the offset following them and whether there are more frames. Logs are
+        only created by `append`, reading a channel without messages doesn't
+        create one.
+        """
+        if not channel.startswith(self.channels):
+            return [], offset, False
+
+        log = self.get_log(channel, create=False)
+        if log is None:
+            return [], offset, False
+
+        frames, next_offset = log.read(offset, limit)
+        return frames, next_offset, next_offset < log.next_offset
+
+    def flush(self):
+        for log in self.logs.values():
+            log.flush()
+
+    def close(self):
+        for log in self.logs.values():
+            log.close()
+        self.logs = {}
@@ -0,0 +1,98 @@
+import json
+
+from django.utils.encoding import force_bytes
+
+from .settings import BINARY_ENCODINGS
+
+
+class Encoding(object):
+    """
+    Base class for binary encodings. A binary frame consists of the utf-8
+    encoded channel (or `!command`) name, a colon and the encoded message body.
+    Channel names cannot contain colons, so the first colon always terminates
+    the header.
+    """
+    name = None
+
+    # Frames received from the bus are transcoded once per process, not once
+    # per connection. The cache only needs to survive one fan-out.
+    cache_size = 64
+
+    def __init__(self):
+        self.cache = {}
+
+    def dumps(self, data):
+        raise NotImplementedError
+
+    def encode(self, name, data):
+        """
+        `encode` returns a binary frame for the given channel or command name.
+        """
+        return force_bytes(name) + b':' + self.dumps(data)
+
+    def transcode(self, msg):
+        """
+        `transcode` converts a json frame as received from the bus into a
+        binary frame.
+        """
+        msg = force_bytes(msg)
+        frame = self.cache.get(msg, None)
+        if frame is None:
+            delimiter = msg.index(b':')
+            frame = self.encode(
+                msg[:delimiter], json.loads(msg[delimiter + 1:].decode('utf-8')))
+
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[msg] = frame
+
+        return frame
+
+
+class MsgPackEncoding(Encoding):
+    name = 'msgpack'
+
+    def __init__(self):
+        import msgpack
+        self.packb = msgpack.packb
+        super(MsgPackEncoding, self).__init__()
+
+    def dumps(self, data):
+        return self.packb(data, use_bin_type=True)
+
+
+class CBOREncoding(Encoding):
+    name = 'cbor'
+
+    def __init__(self):
+        import cbor2
+        self.cbor_dumps = cbor2.dumps
+        super(CBOREncoding, self).__init__()
+
+    def dumps(self, data):
+        return self.cbor_dumps(data)
+
+
+ENCODINGS = {
+    MsgPackEncoding.name: MsgPackEncoding,
+    CBOREncoding.name: CBOREncoding,
+}
+
+_instances = {}
+
+
+def get_encoding(name):
+    """
+    `get_encoding` returns the shared encoding instance for the requested name
+    or None if the encoding is unknown, disabled or its library is missing.
+    """
+    if name not in BINARY_ENCODINGS or name not in ENCODINGS:
+        return None
+
+    if name not in _instances:
+        try:
+            _instances[name] = ENCODINGS[name]()
+        except ImportError:
+            _instances[name] = None
+
+    return _instances[name]
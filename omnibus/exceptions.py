@@ -12,3 +12,7 @@ class OmnibusSubscriberException(OmnibusException):
 
 class OmnibusDataException(OmnibusException):
     pass
+
+
+class OmnibusRPCException(OmnibusException):
+    pass
@@ -0,0 +1,59 @@
+import time
+
+from . import metrics
+
+
+# Messages published with a ttl start with their expiry time, as unix
+# timestamp. Durable channels put the offset in front of it.
+EXPIRES_KEY = b'"expires":'
+OFFSET_KEY = b'"offset":'
+
+
+def get_expiry(frame):
+    """
+    `get_expiry` returns the expiry time of a bus frame, or None. Only the
+    beginning of the message is read, the JSON is not decoded.
+    """
+    if not isinstance(frame, bytes):
+        frame = frame.encode('utf-8')
+
+    index = frame.find(b':') + 1
+    if frame[index:index + 1] != b'{':
+        return None
+
+    index += 1
+    if frame.startswith(OFFSET_KEY, index):
+        index = frame.find(b',', index) + 1
+        if not index:
+            return None
+
+    if not frame.startswith(EXPIRES_KEY, index):
+        return None
+
+    index += len(EXPIRES_KEY)
+    end = frame.find(b',', index)
+    try:
+        return float(frame[index:end if end >= 0 else frame.find(b'}', index)])
+    except ValueError:
+        return None
+
+
+def is_expired(frame, stage):
+    """
+    `is_expired` returns True if the frame expired. Expired frames are
+    counted per `stage`, the place the frame was queued at.
+    """
+    return has_expired(get_expiry(frame), stage)
+
+
+def has_expired(expiry, stage):
+    """
+    `has_expired` returns True if the expiry time, as returned by
+    `get_expiry`, passed. Used for frames which can't be parsed anymore,
+    e.g. after they were encoded.
+    """
+    if expiry is None or expiry > time.time():
+        return False
+
+    metrics.expired.inc(label=stage)
+    return True
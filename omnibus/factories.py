@@ -1,7 +1,29 @@
+import time
+
 from tornado import web
 
+from . import metrics
+from .compression import FrameCompressor
 from .connection import MessageConnection
-from .settings import SERVER_BASE_URL
+from .settings import SERVER_BASE_URL, METRICS_URL, PING_INTERVAL, PING_TIMEOUT
+
+
+class MetricsHandler(web.RequestHandler):
+    """
+    `MetricsHandler` exposes the omnibusd metrics in the Prometheus text format.
+    """
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(metrics.registry.render())
+
+
+def metrics_handlers():
+    """
+    `metrics_handlers` returns the url handlers of the metrics endpoint, if enabled.
+    """
+    if METRICS_URL is None:
+        return []
+    return [(METRICS_URL, MetricsHandler)]
 
 
 def noopauthenticator_factory():
@@ -32,16 +54,33 @@ def websocket_connection_factory(auth_class, pubsub_instance):
     class GeneratedMessageConnection(MessageConnection, WebSocketHandler):
         authenticator_class = auth_class
         pubsub = pubsub_instance
+        binary_supported = True
+        compressor = FrameCompressor()
 
         def check_origin(self, origin):
             return True
 
+        def get_compression_options(self):
+            return self.compressor.get_compression_options()
+
         def open(self):
+            self.compressor.limit_window(self)
             self.on_open(None)
 
-        def send(self, msg):
-            self.log('debug', u'OUT: {0}'.format(len(msg)))
-            self.write_message(msg)
+        def get_remote_address(self, info):
+            return self.request.remote_ip
+
+        def close_transport(self, code, reason):
+            self.close(code, reason)
+
+        def on_pong(self, data):
+            # Answers to the protocol level pings count as activity.
+            self.last_activity = time.time()
+
+        def send_frame(self, msg):
+            # The future of the write tracks the send window.
+            return self.compressor.write_message(
+                self, msg, binary=self.encoding is not None)
 
     return GeneratedMessageConnection
 
@@ -51,7 +90,10 @@ def websocket_webapp_factory(connection):
     `websocket_webapp_factory` returns the Tornado web application with the
     provided connction handler.
     """
-    return web.Application([(SERVER_BASE_URL, connection)])
+    return web.Application(
+        [(SERVER_BASE_URL, connection)] + metrics_handlers(),
+        websocket_ping_interval=PING_INTERVAL,
+        websocket_ping_timeout=PING_TIMEOUT)
 
 
 def sockjs_connection_factory(auth_class, pubsub_instance):
@@ -65,6 +107,9 @@ def sockjs_connection_factory(auth_class, pubsub_instance):
         authenticator_class = auth_class
         pubsub = pubsub_instance
 
+        def close_transport(self, code, reason):
+            self.session.close(code, reason)
+
     return GeneratedMessageConnection
 
 
@@ -75,4 +120,5 @@ def sockjs_webapp_factory(connection):
     """
     from sockjs.tornado import SockJSRouter
 
-    return web.Application(SockJSRouter(connection, SERVER_BASE_URL).urls)
+    return web.Application(
+        SockJSRouter(connection, SERVER_BASE_URL).urls + metrics_handlers())
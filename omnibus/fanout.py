@@ -0,0 +1,90 @@
+import logging
+from collections import deque
+
+from . import metrics
+from .settings import FANOUT_CHUNK_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+class FanOut(object):
+    """
+    `FanOut` delivers messages to many receivers without blocking the IOLoop
+    for long. At most `chunk_size` receivers are served per IOLoop iteration,
+    the remaining ones in the following iterations. Other callbacks, e.g.
+    authentication and subscribe commands, run in between.
+
+    Messages are delivered in the order they were queued, a message never
+    overtakes the remaining receivers of an earlier one.
+    """
+
+    def __init__(self, chunk_size=FANOUT_CHUNK_SIZE, loop=None):
+        self.chunk_size = chunk_size
+        self.loop = loop
+        # Pending deliveries, [callback, receivers, message, position].
+        self.queue = deque()
+        self.scheduled = False
+
+    def __len__(self):
+        return sum(len(job[1]) - job[3] for job in self.queue)
+
+    def deliver(self, callback, receivers, msg):
+        """
+        `deliver` calls `callback(receiver, msg)` for every receiver. Small
+        fan-outs are delivered right away if nothing is pending.
+        """
+        if not receivers:
+            return
+
+        if self.chunk_size is None or (not self.queue and len(receivers) <= self.chunk_size):
+            self.run_job(callback, receivers, msg, 0, len(receivers))
+            return
+
+        self.queue.append([callback, list(receivers), msg, 0])
+        metrics.fanout_queue.inc(len(receivers))
+        self.schedule()
+
+    def schedule(self):
+        if not self.scheduled:
+            self.scheduled = True
+            loop = self.loop
+            if loop is None:
+                from tornado.ioloop import IOLoop
+                loop = IOLoop.current()
+            loop.add_callback(self.run)
+
+    def run(self):
+        """
+        `run` delivers the next chunk and schedules the following one.
+        """
+        self.scheduled = False
+        budget = self.chunk_size
+
+        while self.queue and budget > 0:
+            job = self.queue[0]
+            callback, receivers, msg, position = job
+            end = min(len(receivers), position + budget)
+
+            # The job is updated first, the callbacks may queue more jobs.
+            job[3] = end
+            if end == len(receivers):
+                self.queue.popleft()
+
+            metrics.fanout_queue.dec(end - position)
+            self.run_job(callback, receivers, msg, position, end)
+            budget -= end - position
+
+        if self.queue:
+            self.schedule()
+
+    def run_job(self, callback, receivers, msg, start, end):
+        for index in range(start, end):
+            try:
+                callback(receivers[index], msg)
+            except Exception:
+                logger.exception(u'Fan-out to {0!r} failed.'.format(receivers[index]))
+
+    def clear(self):
+        metrics.fanout_queue.dec(len(self))
+        self.queue.clear()
@@ -0,0 +1,207 @@
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+import zmq
+from zmq.error import ZMQError
+from zmq.eventloop.zmqstream import ZMQStream
+from tornado.ioloop import PeriodicCallback
+
+from django.utils.encoding import force_bytes
+
+from . import exceptions as ex
+from . import metrics
+from .expiry import is_expired
+from .monitor import monitored
+from .settings import DIRECTOR_HEARTBEAT_INTERVAL, DIRECTOR_HEARTBEAT_TIMEOUT
+
+
+logger = logging.getLogger(__name__)
+
+# Bus channel of the heartbeats directors publish every heartbeat interval.
+# Clients are not allowed to subscribe to channels starting with "!".
+HEARTBEAT_CHANNEL = '!director'
+
+
+def get_heartbeat(director):
+    return force_bytes(u'{0}:{1}'.format(HEARTBEAT_CHANNEL, json.dumps({
+        'director': director,
+        'ts': time.time(),
+    })))
+
+
+def set_heartbeat_options(connection, interval, timeout):
+    """
+    `set_heartbeat_options` enables zmq heartbeats on a socket if libzmq
+    supports them (4.2+), connections to hanging peers are dropped and
+    reconnected instead of waiting for TCP timeouts.
+    """
+    if not hasattr(zmq, 'HEARTBEAT_IVL'):
+        return
+
+    connection.setsockopt(zmq.HEARTBEAT_IVL, interval)
+    connection.setsockopt(zmq.HEARTBEAT_TIMEOUT, timeout)
+
+
+class Forwarder(object):
+    """
+    `Forwarder` connects an ``omnibusd`` process to a list of redundant
+    directors.
+
+    Messages from the local publishers get an id and are published to every
+    healthy director. The messages of all directors are received, duplicates
+    are dropped by their id before they are forwarded to the local
+    subscribers. A director is healthy as long as it sent a heartbeat (or any
+    other message) within `timeout` milliseconds, an outage therefore doesn't
+    interrupt the delivery as long as one director is left.
+    """
+    # Number of recent message ids kept to detect duplicates.
+    dedup_size = 10000
+
+    def __init__(
+        self, pubsub, subscriber_addresses, publisher_addresses,
+        interval=DIRECTOR_HEARTBEAT_INTERVAL, timeout=DIRECTOR_HEARTBEAT_TIMEOUT
+    ):
+        assert len(subscriber_addresses) == len(publisher_addresses), (
+            'Every director needs a subscriber and a publisher address')
+
+        self.pubsub = pubsub
+        self.interval = interval
+        self.timeout = timeout
+        self.node = uuid.uuid4().hex
+        self.counter = itertools.count()
+        self.seen = OrderedDict()
+        self.callback = None
+        self.streams = []
+        self.bridges = None
+
+        self.directors = [{
+            'subscriber_address': subscriber_address,
+            'publisher_address': publisher_address,
+            'publisher': None,
+            'seen': None,
+            'healthy': False,
+        } for subscriber_address, publisher_address in zip(
+            subscriber_addresses, publisher_addresses)]
+
+    def start(self, publisher_address, subscriber_address):
+        """
+        `start` binds the local publisher and subscriber addresses and connects
+        to the directors. Returns the bridges of both directions, like
+        `PubSub.init_forwarder`.
+        """
+        context = self.pubsub.context
+
+        try:
+            local_in = context.socket(zmq.SUB)
+            self.pubsub.bind(local_in, publisher_address)
+            local_in.setsockopt(zmq.SUBSCRIBE, b'')
+
+            self.local_out = context.socket(zmq.PUB)
+            self.pubsub.bind(self.local_out, subscriber_address)
+
+            for director in self.directors:
+                subscriber = context.socket(zmq.SUB)
+                set_heartbeat_options(subscriber, self.interval, self.timeout)
+                subscriber.connect(director['subscriber_address'])
+                subscriber.setsockopt(zmq.SUBSCRIBE, b'')
+                self.add_stream(
+                    subscriber, lambda msg, director=director: self.receive(director, msg))
+
+                director['publisher'] = context.socket(zmq.PUB)
+                set_heartbeat_options(director['publisher'], self.interval, self.timeout)
+                director['publisher'].connect(director['publisher_address'])
+        except ZMQError as e:
+            raise ex.OmnibusException(e)
+
+        self.add_stream(local_in, self.publish)
+
+        self.callback = PeriodicCallback(self.check, self.interval)
+        self.callback.start()
+
+        self.bridges = ({'in': local_in}, {'out': self.local_out})
+        return self.bridges
+
+    def add_stream(self, connection, callback):
+        stream = ZMQStream(connection, io_loop=self.pubsub.loop)
+        stream.on_recv(callback)
+        self.streams.append(stream)
+
+    def close(self):
+        if self.callback is not None:
+            self.callback.stop()
+            self.callback = None
+
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+
+    # MESSAGES ---------------------------------------------------------------
+
+    def get_id(self):
+        return force_bytes(u'{0}:{1}'.format(self.node, next(self.counter)))
+
+    @monitored('Forwarder.publish')
+    def publish(self, msg):
+        # Messages forwarded by another forwarder keep their id.
+        message_id = msg[1] if len(msg) > 1 else self.get_id()
+
+        directors = [director for director in self.directors if director['healthy']]
+        if not directors:
+            # Don't drop messages while the heartbeats are pending.
+            directors = self.directors
+
+        metrics.bridge_messages.inc(label='forwarder')
+        metrics.bridge_bytes.inc(len(msg[0]), label='forwarder')
+        if is_expired(msg[0], 'bridge'):
+            return
+
+        for director in directors:
+            director['publisher'].send_multipart([msg[0], message_id])
+
+    @monitored('Forwarder.receive')
+    def receive(self, director, msg):
+        director['seen'] = time.time()
+        if not director['healthy']:
+            self.set_healthy(director, True)
+
+        if msg[0].startswith(force_bytes(HEARTBEAT_CHANNEL + ':')):
+            return
+
+        if len(msg) > 1:
+            message_id = msg[1]
+            if message_id in self.seen:
+                metrics.director_duplicates.inc()
+                return
+
+            self.seen[message_id] = None
+            if len(self.seen) > self.dedup_size:
+                self.seen.popitem(last=False)
+
+        metrics.bridge_messages.inc(label=director['subscriber_address'])
+        metrics.bridge_bytes.inc(len(msg[0]), label=director['subscriber_address'])
+        if is_expired(msg[0], 'bridge'):
+            return
+
+        self.local_out.send_multipart(msg)
+
+    # HEALTH -----------------------------------------------------------------
+
+    def check(self):
+        expired = time.time() - self.timeout / 1000.0
+        for director in self.directors:
+            if director['healthy'] and director['seen'] < expired:
+                self.set_healthy(director, False)
+
+    def set_healthy(self, director, healthy):
+        director['healthy'] = healthy
+        metrics.director_healthy.set(int(healthy), label=director['subscriber_address'])
+
+        if healthy:
+            logger.info(u'Director {0} is healthy.'.format(director['subscriber_address']))
+        else:
+            logger.error(u'Director {0} missed its heartbeats.'.format(
+                director['subscriber_address']))
@@ -1,4 +1,5 @@
 import logging
+import signal
 
 from django.core.management.base import BaseCommand
 
@@ -7,12 +8,20 @@ try:
 except ImportError:
     from django.utils.module_loading import import_by_path as import_string
 
-from tornado import ioloop
+from tornado import httpserver, netutil
 
-from ...pubsub import PubSub
+from ...backend import get_pubsub
+from ...direct import router
+from ...metrics import LoopLagSampler
+from ...monitor import watchdog
+from ...presence import presence
+from ...registry import Drainer, Reaper, connections
+from ...rpc import rpc
 from ...settings import (
     SERVER_PORT, AUTHENTICATOR_FACTORY, CONNECTION_FACTORY, WEBAPP_FACTORY,
-    DIRECTOR_ENABLED, FORWARDER_ENABLED)
+    DIRECTOR_ENABLED, FORWARDER_ENABLED, METRICS_URL, WATCHDOG_THRESHOLD,
+    HEARTBEAT_INTERVAL, AUTHENTICATION_TIMEOUT, IDLE_TIMEOUT, DRAIN_LINGER,
+    REUSE_PORT, PRESENCE_CHANNELS)
 
 
 logger = logging.getLogger(__name__)
@@ -21,7 +30,7 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         # Initialize pubsub helper.
-        pubsub = PubSub()
+        pubsub = get_pubsub()
 
         if DIRECTOR_ENABLED:
             logger.info('Starting director.')
@@ -36,11 +45,50 @@ class Command(BaseCommand):
         connection_factory = import_string(CONNECTION_FACTORY)
         webapp_factory = import_string(WEBAPP_FACTORY)
 
-        # Create app and listen on SEVER_PORT
+        # Create app and listen on SEVER_PORT. With REUSE_PORT, a new omnibusd
+        # can bind the port while the old one is still draining.
         app = webapp_factory(connection_factory(authenticator_factory(), pubsub))
-        app.listen(SERVER_PORT)
+        server = httpserver.HTTPServer(app)
+        server.add_sockets(netutil.bind_sockets(SERVER_PORT, reuse_port=REUSE_PORT))
+
+        loop = pubsub.loop
+
+        def drain():
+            if connections.draining:
+                return
+
+            logger.info('Received SIGTERM, draining omnibusd.')
+            server.stop()
+            Drainer(connections).start(stop)
+
+        def stop():
+            logger.info('Stopping omnibusd.')
+            presence.stop()
+            rpc.shutdown()
+            pubsub.close(linger=DRAIN_LINGER)
+            loop.stop()
+
+        # The handler runs on the main thread between two bytecodes of the
+        # IOLoop, add_callback wakes the loop up.
+        signal.signal(signal.SIGTERM, lambda signum, frame: loop.add_callback(drain))
+
+        if WATCHDOG_THRESHOLD is not None:
+            logger.info('Starting watchdog.')
+            watchdog.start(loop)
+        elif METRICS_URL is not None:
+            LoopLagSampler(loop).start()
+
+        timeouts = (HEARTBEAT_INTERVAL, AUTHENTICATION_TIMEOUT, IDLE_TIMEOUT)
+        if any(timeout is not None for timeout in timeouts):
+            logger.info('Starting reaper.')
+            Reaper(connections).start()
+
+        router.start(pubsub)
+
+        if PRESENCE_CHANNELS:
+            logger.info('Starting presence tracking.')
+            presence.start(pubsub)
 
-        loop = ioloop.IOLoop().instance()
         try:
             logger.info('Starting omnibusd.')
             loop.start()
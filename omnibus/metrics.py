@@ -0,0 +1,233 @@
+from .settings import METRICS_MAX_LABELS
+
+
+# Label of the values beyond `max_labels`.
+OTHER_LABEL = 'other'
+
+
+class Metric(object):
+    """
+    Base class for process wide metrics, rendered in the Prometheus text format.
+    Updating a metric is a dict lookup and an addition. Labeled values are
+    only allocated the first time a label is seen.
+
+    Labels chosen by clients, e.g. channel names, are limited to `max_labels`
+    values, further labels are counted as "other".
+    """
+    kind = None
+
+    def __init__(self, name, documentation, label=None, max_labels=None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.max_labels = max_labels
+        self.values = {None: 0} if label is None else {}
+
+    def get_label(self, label):
+        if (
+            self.max_labels is not None and label not in self.values
+            and len(self.values) >= self.max_labels
+        ):
+            return OTHER_LABEL
+        return label
+
+    def inc(self, amount=1, label=None):
+        values = self.values
+        label = self.get_label(label)
+        values[label] = values.get(label, 0) + amount
+
+    def get(self, label=None):
+        return self.values.get(label, 0)
+
+    def samples(self):
+        for label, value in list(self.values.items()):
+            if label is None:
+                yield self.name, value
+            else:
+                yield u'{0}{{{1}="{2}"}}'.format(
+                    self.name, self.label, escape_label(label)), value
+
+    def render(self):
+        lines = [
+            u'# HELP {0} {1}'.format(self.name, self.documentation),
+            u'# TYPE {0} {1}'.format(self.name, self.kind),
+        ]
+        lines.extend(u'{0} {1}'.format(name, value) for name, value in self.samples())
+        return u'\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def dec(self, amount=1, label=None):
+        values = self.values
+        # Labels without a value of their own were counted as "other", even
+        # if a slot is free by now.
+        if self.max_labels is not None and label is not None and label not in values:
+            label = OTHER_LABEL
+        value = values.get(label, 0) - amount
+        if value <= 0 and label is not None:
+            # Don't keep labels of gauges which dropped to zero, e.g.
+            # channels nobody is subscribed to anymore.
+            values.pop(label, None)
+        else:
+            values[label] = value
+
+    def set(self, value, label=None):
+        self.values[self.get_label(label)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, label=None, buckets=None, max_labels=None):
+        if buckets is not None:
+            self.buckets = tuple(buckets)
+        super(Histogram, self).__init__(name, documentation, label, max_labels)
+        if label is None:
+            self.values = {None: self.create_value()}
+
+    def create_value(self):
+        # One counter per bucket, followed by the sum and the count.
+        return [0] * len(self.buckets) + [0, 0]
+
+    def observe(self, amount, label=None):
+        label = self.get_label(label)
+        value = self.values.get(label, None)
+        if value is None:
+            value = self.values[label] = self.create_value()
+
+        for index, bound in enumerate(self.buckets):
+            if amount <= bound:
+                value[index] += 1
+        value[-2] += amount
+        value[-1] += 1
+
+    def get(self, label=None):
+        value = self.values.get(label, None)
+        return value[-1] if value else 0
+
+    def samples(self):
+        for label, value in list(self.values.items()):
+            prefix = u'' if label is None else u'{0}="{1}",'.format(
+                self.label, escape_label(label))
+            suffix = u'' if label is None else u'{{{0}}}'.format(prefix[:-1])
+
+            for bound, count in zip(self.buckets, value):
+                yield u'{0}_bucket{{{1}le="{2}"}}'.format(self.name, prefix, bound), count
+            yield u'{0}_bucket{{{1}le="+Inf"}}'.format(self.name, prefix), value[-1]
+            yield u'{0}_sum{1}'.format(self.name, suffix), value[-2]
+            yield u'{0}_count{1}'.format(self.name, suffix), value[-1]
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label=None, max_labels=None):
+        return self.register(Counter(name, documentation, label, max_labels))
+
+    def gauge(self, name, documentation, label=None, max_labels=None):
+        return self.register(Gauge(name, documentation, label, max_labels))
+
+    def histogram(self, name, documentation, label=None, buckets=None, max_labels=None):
+        return self.register(Histogram(name, documentation, label, buckets, max_labels))
+
+    def render(self):
+        return u'\n'.join(metric.render() for metric in self.metrics) + u'\n'
+
+
+def escape_label(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+connections = registry.gauge(
+    'omnibus_connections', 'Open client connections.')
+subscriptions = registry.gauge(
+    'omnibus_subscriptions', 'Subscribed connections per channel.', 'channel',
+    METRICS_MAX_LABELS)
+messages_received = registry.counter(
+    'omnibus_messages_received_total',
+    'Channel messages published by clients per channel.', 'channel', METRICS_MAX_LABELS)
+direct_messages = registry.counter(
+    'omnibus_direct_messages_total', 'Direct messages delivered to connections.')
+messages_sent = registry.counter(
+    'omnibus_messages_sent_total',
+    'Messages sent to clients per channel or command.', 'channel', METRICS_MAX_LABELS)
+bytes_sent = registry.counter(
+    'omnibus_bytes_sent_total', 'Uncompressed bytes sent to clients.')
+reaped = registry.counter(
+    'omnibus_reaped_connections_total', 'Connections closed by the reaper.', 'reason')
+rejected = registry.counter(
+    'omnibus_rate_limited_total', 'Rejected connections and messages by limit.', 'limit')
+rpc_calls = registry.counter(
+    'omnibus_rpc_calls_total', 'Remote procedure calls by result.', 'result')
+rpc_duration = registry.histogram(
+    'omnibus_rpc_duration_seconds', 'Duration of remote procedure calls.', 'method')
+authentications = registry.counter(
+    'omnibus_authentications_total', 'Authentication attempts by result.', 'result')
+send_queue = registry.gauge(
+    'omnibus_send_queue_depth', 'Messages waiting in batch send buffers.')
+fanout_queue = registry.gauge(
+    'omnibus_fanout_queue_depth', 'Deliveries waiting for the next fan-out chunk.')
+published = registry.counter(
+    'omnibus_published_messages_total', 'Messages published to the bus.')
+bridge_messages = registry.counter(
+    'omnibus_bridge_messages_total', 'Messages forwarded per bridge input.', 'bridge')
+bridge_bytes = registry.counter(
+    'omnibus_bridge_bytes_total', 'Bytes forwarded per bridge input.', 'bridge')
+director_healthy = registry.gauge(
+    'omnibus_director_healthy', 'Health of redundant directors by heartbeat.', 'director')
+director_duplicates = registry.counter(
+    'omnibus_director_duplicates_total', 'Messages received from more than one director.')
+expired = registry.counter(
+    'omnibus_expired_messages_total', 'Messages dropped after their expiry time.', 'stage')
+durable_messages = registry.counter(
+    'omnibus_durable_messages_total', 'Messages appended to durable channel logs.')
+durable_replayed = registry.counter(
+    'omnibus_durable_replayed_total', 'Messages replayed from durable channel logs.')
+ioloop_lag = registry.gauge(
+    'omnibus_ioloop_lag_seconds', 'Delay of the last scheduled IOLoop sample.')
+ioloop_lag_histogram = registry.histogram(
+    'omnibus_ioloop_lag_distribution_seconds', 'Delays of scheduled IOLoop samples.')
+callback_duration = registry.histogram(
+    'omnibus_callback_duration_seconds', 'Duration of monitored callbacks.', 'callback')
+
+
+class LoopLagSampler(object):
+    """
+    `LoopLagSampler` schedules a callback every `interval` seconds and records
+    how late it was executed.
+    """
+
+    def __init__(self, loop, interval=1.0, callback=None):
+        self.loop = loop
+        self.interval = interval
+        self.callback = callback
+        self.expected = None
+
+    def start(self):
+        self.expected = self.loop.time() + self.interval
+        self.loop.call_later(self.interval, self.sample)
+
+    def sample(self):
+        lag = max(0.0, self.loop.time() - self.expected)
+        ioloop_lag.set(lag)
+        ioloop_lag_histogram.observe(lag)
+        if self.callback is not None:
+            self.callback(lag)
+        self.start()
@@ -0,0 +1,100 @@
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from . import metrics
+from .settings import WATCHDOG_THRESHOLD
+
+
+logger = logging.getLogger(__name__)
+
+
+class Watchdog(object):
+    """
+    `Watchdog` measures the duration of monitored callbacks running on the
+    IOLoop. A background thread samples the stack of the IOLoop thread while
+    a callback runs longer than `threshold` seconds, the sample is logged
+    together with the callback name and duration once the callback returns.
+
+    The watchdog is disabled until `start` is called, monitored callbacks
+    only pay for a single attribute lookup then.
+    """
+
+    def __init__(self, threshold=WATCHDOG_THRESHOLD):
+        self.threshold = threshold
+        self.enabled = False
+        self.thread_id = None
+        self.current = None
+        self.sample = None
+
+    def start(self, loop):
+        self.enabled = True
+        self.thread_id = threading.current_thread().ident
+
+        thread = threading.Thread(target=self.run, name='omnibus-watchdog')
+        thread.daemon = True
+        thread.start()
+
+        metrics.LoopLagSampler(loop, callback=self.check_lag).start()
+
+    def run(self):
+        while self.enabled:
+            time.sleep(self.threshold / 2.0)
+            self.check_current()
+
+    def check_current(self):
+        current = self.current
+        if (
+            current is not None
+            and self.sample is None
+            and time.time() - current[1] > self.threshold
+        ):
+            frame = sys._current_frames().get(self.thread_id, None)
+            if frame is not None and self.current is current:
+                self.sample = ''.join(traceback.format_stack(frame))
+
+    def check_lag(self, lag):
+        if lag > self.threshold:
+            logger.warning(u'IOLoop lag of {0:.3f}s'.format(lag))
+
+    def call(self, name, func, *args, **kwargs):
+        """
+        `call` runs and measures the given callback.
+        """
+        if self.current is not None:
+            # Nested monitored callback, the outer callback is measured.
+            return func(*args, **kwargs)
+
+        self.sample = None
+        self.current = (name, time.time())
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.time() - self.current[1]
+            self.current = None
+            metrics.callback_duration.observe(duration, label=name)
+
+            if duration > self.threshold:
+                logger.warning(u'Slow callback {0} took {1:.3f}s\n{2}'.format(
+                    name, duration, self.sample or 'No stack sample available.'))
+
+
+watchdog = Watchdog()
+
+
+def monitored(name):
+    """
+    `monitored` decorates IOLoop callbacks which should be measured by the
+    watchdog.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not watchdog.enabled:
+                return func(*args, **kwargs)
+            return watchdog.call(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
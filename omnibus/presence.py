@@ -0,0 +1,271 @@
+import json
+import logging
+import time
+import uuid
+
+from tornado.ioloop import PeriodicCallback
+
+from .fanout import FanOut
+from .monitor import monitored
+from .settings import PRESENCE_CHANNELS, PRESENCE_INTERVAL, PRESENCE_MAX_MEMBERS
+
+
+logger = logging.getLogger(__name__)
+
+# Bus channel the omnibusd processes exchange their presence changes on.
+# Clients are not allowed to subscribe to channels starting with "!".
+PRESENCE_CHANNEL = '!presence'
+
+
+class Presence(object):
+    """
+    `Presence` tracks the members of channels, keyed by the identifier of the
+    subscribed connections.
+
+    Every ``omnibusd`` process collects the joins and leaves of its own
+    connections and publishes them once per `interval` milliseconds as a
+    single message through the director. All processes apply these messages
+    to the members of every process and deliver the resulting changes to their
+    subscribed connections, again once per interval and channel.
+
+    Channels with more than `max_members` members only get the number of
+    members, this keeps the traffic of large channels linear.
+    """
+    # Processes which didn't publish for this number of intervals are gone,
+    # their members leave.
+    expiry_intervals = 5
+
+    def __init__(
+        self, channels=PRESENCE_CHANNELS, interval=PRESENCE_INTERVAL,
+        max_members=PRESENCE_MAX_MEMBERS
+    ):
+        self.channels = tuple(channels)
+        self.interval = interval
+        self.max_members = max_members
+        self.node = uuid.uuid4().hex
+        self.enabled = False
+        self.pubsub = None
+        self.subscriber = None
+        self.callback = None
+        self.fanout = FanOut()
+
+        # Local connections per channel with their identifier.
+        self.subscribers = {}
+        # Number of local connections per channel and identifier.
+        self.local = {}
+        # Local joins (True) and leaves (False) to publish.
+        self.pending = {}
+        # Processes per channel and identifier.
+        self.members = {}
+        # Last message per process.
+        self.nodes = {}
+        # Joins and leaves to deliver to the local connections.
+        self.changes = {}
+        # Channels delivered without members.
+        self.large = set()
+        # Publish the full local state, because a process asked for it.
+        self.send_state = False
+        # Ask the other processes for their full state.
+        self.request_state = True
+
+    def start(self, pubsub):
+        if not self.channels:
+            return
+
+        self.enabled = True
+        self.pubsub = pubsub
+        self.subscriber = pubsub.get_subscriber(self.on_message)
+        pubsub.subscribe(self.subscriber, PRESENCE_CHANNEL)
+
+        self.callback = PeriodicCallback(self.flush, self.interval)
+        self.callback.start()
+
+    def stop(self):
+        if self.callback is not None:
+            self.callback.stop()
+            self.callback = None
+            # Publish the leaves of the closed connections.
+            self.flush()
+
+    def tracks(self, channel):
+        return self.enabled and channel.startswith(self.channels)
+
+    # LOCAL CONNECTIONS ------------------------------------------------------
+
+    def join(self, connection, channel):
+        identifier = connection.authenticator.get_identifier()
+        self.subscribers.setdefault(channel, {})[connection] = identifier
+
+        counts = self.local.setdefault(channel, {})
+        counts[identifier] = counts.get(identifier, 0) + 1
+        if counts[identifier] == 1:
+            self.pending.setdefault(channel, {})[identifier] = True
+
+    def leave(self, connection, channel):
+        subscribers = self.subscribers.get(channel, {})
+        identifier = subscribers.pop(connection, None)
+        if identifier is None:
+            return
+        if not subscribers:
+            del self.subscribers[channel]
+
+        counts = self.local[channel]
+        counts[identifier] -= 1
+        if not counts[identifier]:
+            del counts[identifier]
+            if not counts:
+                del self.local[channel]
+            self.pending.setdefault(channel, {})[identifier] = False
+
+    def snapshot(self, channel):
+        """
+        `snapshot` returns the current members of the channel, sent to
+        connections after subscribing.
+        """
+        members = self.members.get(channel, {})
+        payload = {'channel': channel, 'count': len(members)}
+        if len(members) <= self.max_members:
+            payload['members'] = list(members)
+        return payload
+
+    # MEMBERS ----------------------------------------------------------------
+
+    def apply(self, node, channel, identifier, joined):
+        members = self.members.setdefault(channel, {})
+        nodes = members.get(identifier, None)
+
+        if joined:
+            if nodes is None:
+                nodes = members[identifier] = set()
+                self.change(channel, identifier, True)
+            nodes.add(node)
+        elif nodes is not None and node in nodes:
+            nodes.discard(node)
+            if not nodes:
+                del members[identifier]
+                self.change(channel, identifier, False)
+
+        if not members:
+            del self.members[channel]
+
+    def change(self, channel, identifier, joined):
+        changes = self.changes.setdefault(channel, {})
+        # A join and a leave within one interval cancel each other out.
+        if changes.get(identifier, joined) != joined:
+            del changes[identifier]
+        else:
+            changes[identifier] = joined
+
+    def expire(self, node):
+        logger.info(u'Presence of {0} expired.'.format(node))
+        del self.nodes[node]
+        for channel, members in list(self.members.items()):
+            for identifier, nodes in list(members.items()):
+                if node in nodes:
+                    self.apply(node, channel, identifier, False)
+
+    @monitored('Presence.on_message')
+    def on_message(self, msg):
+        try:
+            data = json.loads(msg[0][len(PRESENCE_CHANNEL) + 1:])
+            node = data['node']
+        except (TypeError, ValueError, KeyError):
+            logger.error(u'Invalid presence message.')
+            return
+
+        # Our own changes were applied when publishing them.
+        if node == self.node:
+            return
+
+        if data.get('sync', False):
+            self.send_state = True
+        if node not in self.nodes and not data.get('state', False):
+            # We missed the earlier changes of this process.
+            self.request_state = True
+        self.nodes[node] = time.time()
+
+        for key, joined in (('joined', True), ('left', False)):
+            for channel, identifiers in data.get(key, {}).items():
+                for identifier in identifiers:
+                    self.apply(node, channel, identifier, joined)
+
+    # PUBLISHING -------------------------------------------------------------
+
+    @monitored('Presence.flush')
+    def flush(self):
+        """
+        `flush` is called every interval. The local changes are published, also
+        as a sign of life if there aren't any, and the changes of all processes
+        are delivered to the local connections.
+        """
+        pending, self.pending = self.pending, {}
+        if self.send_state:
+            # Pending leaves are kept, all local members join (again).
+            for channel, counts in self.local.items():
+                pending.setdefault(channel, {}).update(dict.fromkeys(counts, True))
+
+        message = {
+            'node': self.node,
+            'sync': self.request_state,
+            'state': self.send_state,
+            'joined': {},
+            'left': {},
+        }
+        self.send_state = self.request_state = False
+
+        for channel, changes in pending.items():
+            for identifier, joined in changes.items():
+                message['joined' if joined else 'left'].setdefault(
+                    channel, []).append(identifier)
+                self.apply(self.node, channel, identifier, joined)
+
+        try:
+            self.pubsub.send(u'{0}:{1}'.format(PRESENCE_CHANNEL, json.dumps(message)))
+        except Exception:
+            logger.exception(u'Unable to publish presence.')
+
+        expired = time.time() - self.interval * self.expiry_intervals / 1000.0
+        for node, seen in list(self.nodes.items()):
+            if seen < expired:
+                self.expire(node)
+
+        self.deliver()
+
+    def deliver(self):
+        changes, self.changes = self.changes, {}
+
+        for channel, identifiers in changes.items():
+            if not identifiers or channel not in self.subscribers:
+                continue
+
+            count = len(self.members.get(channel, {}))
+            payload = {'channel': channel, 'count': count}
+
+            if count > self.max_members:
+                self.large.add(channel)
+            elif channel in self.large:
+                # The connections only know the count, send all members.
+                self.large.discard(channel)
+                payload['members'] = list(self.members.get(channel, {}))
+            else:
+                payload['joined'] = [i for i, joined in identifiers.items() if joined]
+                payload['left'] = [i for i, joined in identifiers.items() if not joined]
+
+            frame = '!presence:{0}'.format(json.dumps({
+                'type': 'presence',
+                'success': True,
+                'payload': payload,
+            }))
+
+            self.fanout.deliver(self.send, list(self.subscribers[channel]), (frame, payload))
+
+    def send(self, connection, message):
+        # The connection may have been closed while the fan-out was pending.
+        if connection.subscriber is None:
+            return
+
+        frame, payload = message
+        connection.send_command_frame(frame, 'presence', payload)
+
+
+presence = Presence()
@@ -0,0 +1,270 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+class ModelPublisher(object):
+    """
+    `ModelPublisher` declares how changes of a model are published. Subclass
+    it to publish to other channels or to send other payloads, returning no
+    channel skips the change.
+    """
+    channel = None
+
+    def __init__(self, model):
+        self.model = model
+
+    def get_channel(self, instance, action):
+        return self.channel
+
+    def get_type(self, action):
+        return u'{0}.{1}'.format(self.model._meta.model_name, action)
+
+    def get_payload(self, instance, action):
+        return {'pk': instance.pk}
+
+
+def merge(changes, key, publisher, action, payload):
+    """
+    `merge` adds a change to the changes, merged with the previous change of
+    the same instance.
+    """
+    previous = changes.pop(key, (None, None, None))[1]
+
+    if previous == CREATED:
+        if action == DELETED:
+            # Created and deleted within the transaction, nothing happened.
+            return
+        action = CREATED
+
+    changes[key] = (publisher, action, payload)
+
+
+class Savepoint(object):
+    """
+    `Savepoint` collects the changes made within a savepoint. Its commit hook
+    is dropped by Django if the savepoint is rolled back, the changes of a
+    savepoint whose hook is still pending (or was called) are merged into the
+    enclosing savepoint.
+    """
+
+    def __init__(self, savepoint_ids):
+        self.savepoint_ids = savepoint_ids
+        self.changes = OrderedDict()
+        self.released = False
+        # Keep the bound method, see `Batch.callback`.
+        self.callback = self.release
+
+    def release(self):
+        self.released = True
+
+    def merge(self, savepoint):
+        for key, change in savepoint.changes.items():
+            merge(self.changes, key, *change)
+
+
+def is_pending(connection, callback):
+    return any(hook[1] is callback for hook in connection.run_on_commit)
+
+
+class Batch(object):
+    """
+    `Batch` collects the changes of a transaction and publishes them once it
+    was committed, as one message per channel. Multiple changes of the same
+    instance are merged, also across savepoints. The changes of savepoints
+    which were rolled back are dropped.
+    """
+
+    def __init__(self, pubsub, savepoint_ids=()):
+        self.pubsub = pubsub
+        # The savepoints with changes, from the outermost to the current one.
+        self.savepoints = [Savepoint(savepoint_ids)]
+        # Keep the bound method, the batch is pending as long as this object
+        # is registered as commit hook.
+        self.callback = self.flush
+
+    @property
+    def changes(self):
+        return self.savepoints[-1].changes
+
+    def is_pending(self, connection):
+        return is_pending(connection, self.callback)
+
+    def enter(self, connection, savepoint_ids):
+        """
+        `enter` makes the savepoint with the given ids the current one. The
+        savepoints which ended since the last change are merged into the
+        enclosing savepoint if they were released, or dropped.
+        """
+        while len(self.savepoints) > 1:
+            savepoint = self.savepoints[-1]
+            if savepoint_ids[:len(savepoint.savepoint_ids)] == savepoint.savepoint_ids:
+                break
+
+            self.savepoints.pop()
+            if is_pending(connection, savepoint.callback):
+                self.savepoints[-1].merge(savepoint)
+
+        # The changes of the outermost savepoint belong to the enclosing
+        # savepoint once it was released, the batch is dropped otherwise.
+        if len(self.savepoints) == 1:
+            outermost = self.savepoints[0]
+            length = 0
+            for sid, other in zip(outermost.savepoint_ids, savepoint_ids):
+                if sid != other:
+                    break
+                length += 1
+            outermost.savepoint_ids = outermost.savepoint_ids[:length]
+
+        if savepoint_ids == self.savepoints[-1].savepoint_ids:
+            return
+
+        savepoint = Savepoint(savepoint_ids)
+        self.savepoints.append(savepoint)
+        transaction.on_commit(savepoint.callback, using=connection.alias)
+
+        # Publish after the hooks of the savepoints were called, they tell
+        # which savepoints were rolled back.
+        hooks = connection.run_on_commit
+        index = [hook[1] for hook in hooks].index(self.callback)
+        hooks.append(hooks.pop(index))
+
+    def add(self, publisher, instance, action, channel):
+        merge(
+            self.changes, (channel, publisher.model, instance.pk),
+            publisher, action, publisher.get_payload(instance, action))
+
+    def flush(self):
+        # The hooks of released savepoints were called before.
+        while len(self.savepoints) > 1:
+            savepoint = self.savepoints.pop()
+            if savepoint.released:
+                self.savepoints[-1].merge(savepoint)
+
+        channels = OrderedDict()
+        for (channel, model, pk), (publisher, action, payload) in self.changes.items():
+            channels.setdefault(channel, []).append(
+                (publisher.get_type(action), payload, None))
+        self.changes.clear()
+
+        # The changes are saved already, failing to publish them mustn't fail
+        # the request.
+        for channel, messages in channels.items():
+            try:
+                self.pubsub.publish_batch(channel, messages)
+            except Exception:
+                logger.exception(u'Unable to publish changes to {0}.'.format(channel))
+
+
+class PublisherRegistry(object):
+    """
+    `PublisherRegistry` connects the registered models to the model signals.
+    Changes made in a transaction are published after the commit, nothing is
+    published if it is rolled back.
+    """
+
+    def __init__(self, pubsub=None):
+        self.pubsub = pubsub
+        self.publishers = {}
+        self.local = threading.local()
+
+    def get_pubsub(self):
+        if self.pubsub is None:
+            from .api import pubsub
+            self.pubsub = pubsub
+        return self.pubsub
+
+    def register(self, model, publisher_class=None, **options):
+        """
+        `register` publishes the changes of the model using the given publisher
+        class. Options override attributes of the class, e.g. `channel`.
+        """
+        publisher_class = publisher_class or ModelPublisher
+        if options:
+            publisher_class = type(publisher_class.__name__, (publisher_class,), options)
+
+        self.publishers[model] = publisher_class(model)
+
+        uid = u'omnibus.publishers.{0}'.format(id(self))
+        post_save.connect(self.on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(self.on_delete, sender=model, dispatch_uid=uid)
+
+    def unregister(self, model):
+        self.publishers.pop(model, None)
+
+        uid = u'omnibus.publishers.{0}'.format(id(self))
+        post_save.disconnect(sender=model, dispatch_uid=uid)
+        post_delete.disconnect(sender=model, dispatch_uid=uid)
+
+    def on_save(self, sender, instance, created, using=None, **kwargs):
+        self.on_change(sender, instance, CREATED if created else UPDATED, using)
+
+    def on_delete(self, sender, instance, using=None, **kwargs):
+        self.on_change(sender, instance, DELETED, using)
+
+    def on_change(self, model, instance, action, using):
+        publisher = self.publishers.get(model, None)
+        if publisher is None:
+            return
+
+        channel = publisher.get_channel(instance, action)
+        if channel is None:
+            return
+
+        batch = self.get_batch(using)
+        if batch is None:
+            # Not in a transaction, publish right away.
+            batch = Batch(self.get_pubsub())
+            batch.add(publisher, instance, action, channel)
+            batch.flush()
+        else:
+            batch.add(publisher, instance, action, channel)
+
+    def get_batch(self, using):
+        """
+        `get_batch` returns the batch of the current transaction, or None
+        outside of transactions. The changes of a savepoint are dropped if it
+        is rolled back, and merged into the transaction if it is released.
+        """
+        on_commit = getattr(transaction, 'on_commit', None)
+        connection = transaction.get_connection(using)
+        batches = self.local.__dict__.setdefault('batches', {})
+
+        if on_commit is None or not connection.in_atomic_block:
+            batches.pop(connection.alias, None)
+            return None
+
+        # Atomic blocks without savepoint belong to the enclosing savepoint.
+        savepoint_ids = tuple(sid for sid in connection.savepoint_ids if sid)
+        batch = batches.get(connection.alias, None)
+        if batch is None or not batch.is_pending(connection):
+            batch = batches[connection.alias] = Batch(self.get_pubsub(), savepoint_ids)
+            on_commit(batch.callback, using=connection.alias)
+        else:
+            batch.enter(connection, savepoint_ids)
+        return batch
+
+
+registry = PublisherRegistry()
+
+
+def register(*models, **options):
+    """
+    `register` is a class decorator which registers a `ModelPublisher`
+    subclass for the given models.
+    """
+    def decorator(publisher_class):
+        for model in models:
+            registry.register(model, publisher_class, **options)
+        return publisher_class
+    return decorator
@@ -1,49 +1,181 @@
-import json
+import errno
+import itertools
 import logging
+import os
+import socket
+import stat
+import uuid
 
 import zmq
 from zmq.error import ZMQError
-from zmq.eventloop.zmqstream import ZMQStream
-from zmq.eventloop import ioloop
 
 from django.utils.encoding import force_bytes
-from django.core.serializers.json import DjangoJSONEncoder
 
 from . import exceptions as ex
+from . import metrics
+from .backend import BasePubSub
+from .compat import string_types
+from .expiry import is_expired
+from .sharding import Shards
+from .monitor import monitored
 from .settings import (
     SUBSCRIBER_ADDRESS, PUBLISHER_ADDRESS,
-    DIRECTOR_SUBSCRIBER_ADDRESS, DIRECTOR_PUBLISHER_ADDRESS)
+    DIRECTOR_SUBSCRIBER_ADDRESS, DIRECTOR_PUBLISHER_ADDRESS,
+    CONTROL_SUBSCRIBER_ADDRESS, CONTROL_PUBLISHER_ADDRESS,
+    DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS, DIRECTOR_CONTROL_PUBLISHER_ADDRESS,
+    IPC_PERMISSIONS, INPROC_ENABLED, DIRECTOR_HEARTBEAT_INTERVAL,
+    DIRECTOR_SHARDS, DIRECTOR_SHARD, FORWARDER_ENABLED, DURABLE_CHANNELS, DURABLE_ADDRESS,
+    DURABLE_FLUSH_INTERVAL, DURABLE_REPLAY_LIMIT, DURABLE_REPLAY_TIMEOUT)
 
 
 logger = logging.getLogger(__name__)
 
-
-LOG_LEVELS = {
-    'debug': logger.debug,
-    'info': logger.info,
-    'error': logger.error,
-}
-
-
-class PubSub(object):
+# Addresses the director (or forwarder) additionally binds if inproc is enabled,
+# they are only reachable within the zmq context of the omnibusd process.
+INPROC_SUBSCRIBER_ADDRESS = 'inproc://omnibus-subscriber'
+INPROC_PUBLISHER_ADDRESS = 'inproc://omnibus-publisher'
+
+
+def get_ipc_path(address):
+    """
+    `get_ipc_path` returns the socket file of an ipc address, None for other
+    transports and abstract sockets.
+    """
+    if not address.startswith('ipc://'):
+        return None
+
+    path = address[len('ipc://'):]
+    if not path or path.startswith('@'):
+        return None
+    return path
+
+
+def is_stale_ipc(path):
+    """
+    `is_stale_ipc` checks if the socket file was left behind by a process which
+    is gone. zmq would remove the file when binding, even if another process
+    is still listening.
+    """
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        return False
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error as e:
+        return e.errno == errno.ECONNREFUSED
+    finally:
+        sock.close()
+
+    return False
+
+
+def is_control(channel):
+    """
+    `is_control` checks if the channel is internal, like the channels of
+    direct messages and presence. Internal channels start with "!".
+    """
+    return channel[:1] in ('!', b'!')
+
+
+def get_addresses(addresses):
+    """
+    `get_addresses` returns the director addresses as a list, the settings
+    accept a single address or a list of redundant directors.
+    """
+    if addresses is None or isinstance(addresses, string_types):
+        return [addresses]
+    return list(addresses)
+
+
+class PubSub(BasePubSub):
+    """
+    `PubSub` is the default bus backend, using zmq sockets. A director
+    process binds the addresses all other processes connect to.
+
+    Publishing only needs zmq. Tornado and the modules of the director are
+    imported once needed, processes which only publish, e.g. Django using
+    `omnibus.api`, don't import them.
+    """
     BIND = 'bind'
     CONNECT = 'connect'
 
+    logger = logger
     ioloop_installed = False
     connections = None
     bridges = None
+    forwarder = None
+    heartbeat = None
+    shard_router = None
+    durable = None
+    durable_server = None
+    durable_flush = None
 
     def __init__(self, loop=None):
         self.context = zmq.Context()
         self.connections = {}
         self.bridges = {}
-        self.loop = loop or ioloop.IOLoop.instance()
-
-    def log(self, level, message):
-        LOG_LEVELS[level](u'[%s] %s' % (id(self), message))
+        self._loop = loop
+
+        # Switched to the inproc addresses, once the director runs within
+        # this context.
+        self.subscriber_address = SUBSCRIBER_ADDRESS
+        self.publisher_address = PUBLISHER_ADDRESS
+
+        # Internal channels use a separate bridge of the director if
+        # configured, they don't wait behind the messages of busy channels.
+        self.control_subscriber_address = CONTROL_SUBSCRIBER_ADDRESS
+        self.control_publisher_address = CONTROL_PUBLISHER_ADDRESS
+
+        # Director shards, messages are published to the shard of their
+        # channel and subscribers connect to the shards of their channels.
+        self.shards = Shards(DIRECTOR_SHARDS) if DIRECTOR_SHARDS else None
+
+        # Replay requests to directors, the pending callbacks by request id.
+        self.replayers = {}
+        self.replays = {}
+        self.replay_ids = itertools.count()
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            from tornado.ioloop import IOLoop
+            self._loop = IOLoop.current()
+        return self._loop
+
+    @loop.setter
+    def loop(self, loop):
+        self._loop = loop
+
+    def get_stream(self, connection):
+        """
+        `get_stream` returns a stream calling back on the IOLoop for the
+        messages received by the connection.
+        """
+        from zmq.eventloop.zmqstream import ZMQStream
+        return ZMQStream(connection, io_loop=self.loop)
 
     # CONNECTION -------------------------------------------------------------
 
+    def bind(self, connection, address):
+        """
+        `bind` binds a socket to the address. Stale socket files of ipc
+        addresses are removed before, the permissions are set afterwards.
+        """
+        path = get_ipc_path(address)
+
+        if path is not None and os.path.exists(path):
+            if not is_stale_ipc(path):
+                raise ZMQError(errno.EADDRINUSE, u'{0} is in use'.format(address))
+
+            self.log('info', u'remove stale socket {0}'.format(path))
+            os.unlink(path)
+
+        connection.bind(address)
+
+        if path is not None and IPC_PERMISSIONS is not None:
+            os.chmod(path, IPC_PERMISSIONS)
+
     def get_connection(self, mode, address, bind=False):
         # Lets see if we have a connection to the address already (also respect
         # if we should bind or connect and the zmq socket mode)
@@ -54,7 +186,7 @@ class PubSub(object):
             try:
                 connection = self.context.socket(mode)
                 if bind:
-                    connection.bind(address)
+                    self.bind(connection, address)
                 else:
                     connection.connect(address)
             except ZMQError as e:
@@ -72,65 +204,51 @@ class PubSub(object):
         publisher can be provided, if no publisher is provived, we request
         the default one.
         """
+        address = self.publisher_address
+        if self.control_publisher_address is not None and is_control(msg):
+            address = self.control_publisher_address
+        elif self.shards is not None and not FORWARDER_ENABLED:
+            # The local forwarder picks the shard otherwise.
+            address = self.shards.get_publisher_address(msg[:msg.find(':')])
+
         try:
-            self.log('debug', u'send {0} to {1}'.format(msg, PUBLISHER_ADDRESS))
-            publisher = self.get_connection(zmq.PUB, PUBLISHER_ADDRESS)
+            self.log('debug', u'send {0} to {1}'.format(msg, address))
+            publisher = self.get_connection(zmq.PUB, address)
             publisher.send_unicode(msg)
         except ZMQError as e:
             raise ex.OmnibusPublisherException(e)
 
-        return True
-
-    def publish(self, channel, payload_type, payload=None, sender=None):
-        """
-        `publish` is a highlevel method to publish stuff. It handles the json
-        converting and ensures the payload has the correct data type.
-        """
-        if payload is None:
-            payload = {}
-
-        if not isinstance(payload, dict):
-            raise ex.OmnibusDataException(
-                'Invalid payload, needs to be a dict: {0}'.format(type(payload)))
+        metrics.published.inc()
 
-        try:
-            self.log(
-                'debug',
-                u'publish to {0} (payload_type:{1}, payload:{2}, sender:{3})'.format(
-                    channel, payload_type, payload, sender))
-
-            return self.send(u'{0}:{1}'.format(
-                channel,
-                json.dumps({
-                    'sender': sender,
-                    'type': payload_type,
-                    'payload': payload
-                }, cls=DjangoJSONEncoder)
-            ))
-        except (TypeError, ValueError) as e:
-            raise ex.OmnibusDataException(e)
+        return True
 
     # SUBSCRIBING ------------------------------------------------------------
 
     def get_subscriber(self, callback, address=None):
         """
         `get_subscriber` creates a new zmq subscriber stream. If no address is
-        provided, the default subscriber address is used.
+        provided, the default subscriber address is used. With director shards,
+        the subscriber connects to the shards of its channels when subscribing.
         """
-        if address is None:
-            address = SUBSCRIBER_ADDRESS
+        if address is None and self.shards is None:
+            address = self.subscriber_address
 
         try:
             subscriber_socket = self.context.socket(zmq.SUB)
-            subscriber_socket.connect(address)
+            if address is not None:
+                subscriber_socket.connect(address)
 
-            subscriber = ZMQStream(subscriber_socket, io_loop=self.loop)
+            subscriber = self.get_stream(subscriber_socket)
             subscriber.on_recv(callback)
         except ZMQError as e:
             raise ex.OmnibusSubscriberException(e)
 
         # Initialize channel list
         subscriber.channels = []
+        # Number of channels per connected shard.
+        subscriber.shards = {} if address is None else None
+        # Connected to the control lane, once subscribed to an internal channel.
+        subscriber.control = False
 
         return subscriber
 
@@ -156,6 +274,8 @@ class PubSub(object):
             return False
 
         try:
+            self.connect_control(subscriber, channel)
+            self.connect_shard(subscriber, channel)
             subscriber.setsockopt(zmq.SUBSCRIBE, force_bytes(channel))
             subscriber.channels.append(channel)
         except ZMQError as e:
@@ -174,11 +294,114 @@ class PubSub(object):
         try:
             subscriber.setsockopt(zmq.UNSUBSCRIBE, force_bytes(channel))
             subscriber.channels.remove(channel)
+            self.disconnect_shard(subscriber, channel)
         except ZMQError as e:
             raise ex.OmnibusSubscriberException(e)
 
         return True
 
+    def subscribe_topic(self, subscriber, topic):
+        try:
+            self.connect_control(subscriber, topic)
+            self.connect_shard(subscriber, topic[:topic.find(':')])
+            subscriber.setsockopt(zmq.SUBSCRIBE, force_bytes(topic))
+        except ZMQError as e:
+            raise ex.OmnibusSubscriberException(e)
+
+    def unsubscribe_topic(self, subscriber, topic):
+        try:
+            subscriber.setsockopt(zmq.UNSUBSCRIBE, force_bytes(topic))
+            self.disconnect_shard(subscriber, topic[:topic.find(':')])
+        except ZMQError as e:
+            raise ex.OmnibusSubscriberException(e)
+
+    def replay(self, channel, offset, callback):
+        """
+        `replay` requests the stored messages of a durable channel from the
+        director (or the director shard of the channel), see
+        `BasePubSub.replay`.
+        """
+        address = DURABLE_ADDRESS
+        if self.shards is not None:
+            address = self.shards.get_shard(channel).get('durable_address', address)
+
+        replayer = self.replayers.get(address, None)
+        if replayer is None:
+            try:
+                replayer_socket = self.context.socket(zmq.DEALER)
+                replayer_socket.connect(address)
+                replayer = self.get_stream(replayer_socket)
+                replayer.on_recv(self.on_replay)
+            except ZMQError as e:
+                raise ex.OmnibusException(e)
+
+            self.replayers[address] = replayer
+
+        request_id = force_bytes(str(next(self.replay_ids)))
+        timeout = self.loop.call_later(
+            DURABLE_REPLAY_TIMEOUT, lambda: self.on_replay_timeout(request_id))
+        self.replays[request_id] = (callback, offset, timeout)
+
+        replayer.send_multipart([request_id, force_bytes(channel), force_bytes(str(offset))])
+
+    @monitored('PubSub.on_replay')
+    def on_replay(self, msg):
+        request_id, next_offset, more, frames = msg[0], msg[1], msg[2], msg[3:]
+
+        # The request timed out already.
+        if request_id not in self.replays:
+            return
+
+        callback, _, timeout = self.replays.pop(request_id)
+        self.loop.remove_timeout(timeout)
+        callback(frames, int(next_offset), more == b'1')
+
+    def on_replay_timeout(self, request_id):
+        callback, offset, _ = self.replays.pop(request_id)
+        self.log('error', u'replay request {0} timed out'.format(request_id))
+        callback(None, offset, False)
+
+    def connect_control(self, subscriber, channel):
+        """
+        `connect_control` connects the subscriber to the control lane for
+        internal channels, if configured and not connected yet. The connection
+        is kept until the subscriber is closed.
+        """
+        if (
+            self.control_subscriber_address is None or subscriber.control
+            or not is_control(channel)
+        ):
+            return
+
+        subscriber.socket.connect(self.control_subscriber_address)
+        subscriber.control = True
+
+    def connect_shard(self, subscriber, channel):
+        """
+        `connect_shard` connects the subscriber to the director shard of the
+        channel, if not connected yet. Does nothing without shards.
+        """
+        if self.shards is None or subscriber.shards is None:
+            return
+
+        address = self.shards.get_subscriber_address(channel)
+        count = subscriber.shards.get(address, 0)
+        if not count:
+            subscriber.socket.connect(address)
+        subscriber.shards[address] = count + 1
+
+    def disconnect_shard(self, subscriber, channel):
+        if self.shards is None or subscriber.shards is None:
+            return
+
+        address = self.shards.get_subscriber_address(channel)
+        count = subscriber.shards.get(address, 0) - 1
+        if count > 0:
+            subscriber.shards[address] = count
+        elif address in subscriber.shards:
+            del subscriber.shards[address]
+            subscriber.socket.disconnect(address)
+
     # BRIDGING ---------------------------------------------------------------
 
     def init_bridge(self, in_mode, in_address, out_mode, out_address):
@@ -194,20 +417,21 @@ class PubSub(object):
             try:
                 instances['in'] = self.context.socket(zmq.SUB)
                 if in_mode == self.BIND:
-                    instances['in'].bind(in_address)
+                    self.bind(instances['in'], in_address)
                 elif in_mode == self.CONNECT:
                     instances['in'].connect(in_address)
                 instances['in'].setsockopt(zmq.SUBSCRIBE, b'')
 
                 instances['out'] = self.context.socket(zmq.PUB)
                 if out_mode == self.BIND:
-                    instances['out'].bind(out_address)
+                    self.bind(instances['out'], out_address)
                 elif out_mode == self.CONNECT:
                     instances['out'].connect(out_address)
 
                 # Transfer data from subscriber to publisher.
-                instances['bridge'] = ZMQStream(instances['in'], io_loop=self.loop)
-                instances['bridge'].on_recv(lambda msg: instances['out'].send(msg[0]))
+                instances['bridge'] = self.get_stream(instances['in'])
+                instances['bridge'].on_recv(
+                    lambda msg: self.forward(instances['out'], msg, in_address))
 
             except ZMQError as e:
                 raise ex.OmnibusException(e)
@@ -216,14 +440,276 @@ class PubSub(object):
 
         return instances
 
+    @monitored('PubSub.forward')
+    def forward(self, publisher, msg, bridge):
+        """
+        `forward` is called by bridges for every message received on their
+        subscriber socket.
+        """
+        metrics.bridge_messages.inc(label=bridge)
+        metrics.bridge_bytes.inc(len(msg[0]), label=bridge)
+
+        if is_expired(msg[0], 'bridge'):
+            return
+
+        if self.durable is not None:
+            # Only the director stores messages, frames of durable channels
+            # get their offset.
+            msg[0] = self.durable.append(msg[0])
+
+        # Further frames, like the message id of forwarders, are passed on.
+        publisher.send_multipart(msg)
+
+    def close(self, linger=None):
+        """
+        `close` closes the bridges and all sockets, pending messages are sent
+        for up to `linger` milliseconds.
+        """
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+            self.heartbeat = None
+
+        if self.forwarder is not None:
+            self.forwarder.close()
+            self.forwarder = None
+
+        if self.shard_router is not None:
+            self.shard_router['bridge'].close()
+            self.shard_router = None
+
+        if self.durable is not None:
+            if self.durable_flush is not None:
+                self.durable_flush.stop()
+                self.durable_flush = None
+            self.durable_server.close()
+            self.durable.close()
+            self.durable = self.durable_server = None
+
+        for replayer in self.replayers.values():
+            replayer.close()
+        self.replayers = {}
+
+        for in_modes in self.bridges.values():
+            for out_addresses in in_modes.values():
+                for out_modes in out_addresses.values():
+                    for instances in out_modes.values():
+                        instances['bridge'].close()
+        self.bridges = {}
+        self.connections = {}
+
+        try:
+            # Closes the remaining sockets (including subscribers) as well.
+            self.context.destroy(linger=linger)
+        except ZMQError as e:
+            raise ex.OmnibusException(e)
+
+    def init_inproc(self, pub_bridge, sub_bridge):
+        """
+        `init_inproc` binds the bridges to the inproc addresses as well. The
+        subscribers and publishers of this process use these addresses and
+        skip the network stack, other processes still use the configured ones.
+        """
+        if self.subscriber_address == INPROC_SUBSCRIBER_ADDRESS:
+            return
+
+        try:
+            pub_bridge['in'].bind(INPROC_PUBLISHER_ADDRESS)
+            sub_bridge['out'].bind(INPROC_SUBSCRIBER_ADDRESS)
+        except ZMQError as e:
+            raise ex.OmnibusException(e)
+
+        self.subscriber_address = INPROC_SUBSCRIBER_ADDRESS
+        self.publisher_address = INPROC_PUBLISHER_ADDRESS
+
+    def init_durable(self, address):
+        """
+        `init_durable` opens the log of the durable channels and binds the
+        address omnibusd processes request replays on.
+        """
+        if self.durable is not None:
+            return
+
+        from tornado.ioloop import PeriodicCallback
+        from .durable import DurableLog
+
+        durable = DurableLog()
+        try:
+            server_socket = self.context.socket(zmq.ROUTER)
+            self.bind(server_socket, address)
+            self.durable_server = self.get_stream(server_socket)
+            self.durable_server.on_recv(self.serve_replay)
+        except ZMQError as e:
+            durable.close()
+            raise ex.OmnibusException(e)
+
+        self.durable = durable
+
+        if DURABLE_FLUSH_INTERVAL:
+            self.durable_flush = PeriodicCallback(durable.flush, DURABLE_FLUSH_INTERVAL)
+            self.durable_flush.start()
+
+    @monitored('PubSub.serve_replay')
+    def serve_replay(self, msg):
+        """
+        `serve_replay` answers a replay request, `[identity, request id,
+        channel, offset]`, with `[identity, request id, next offset, more,
+        frames..]`.
+        """
+        try:
+            identity, request_id, channel, offset = msg
+            offset = int(offset)
+        except ValueError:
+            self.log('error', u'invalid replay request {0}'.format(msg))
+            return
+
+        frames, next_offset, more = self.durable.read(channel, offset, DURABLE_REPLAY_LIMIT)
+        metrics.durable_replayed.inc(len(frames))
+
+        self.durable_server.send_multipart([
+            identity, request_id, force_bytes(str(next_offset)), b'1' if more else b'0'
+        ] + frames)
+
     def init_director(self):
-        return self.init_bridge(
-            self.BIND, PUBLISHER_ADDRESS, self.BIND, SUBSCRIBER_ADDRESS)
+        publisher_address, subscriber_address = PUBLISHER_ADDRESS, SUBSCRIBER_ADDRESS
+        durable_address = DURABLE_ADDRESS
+        if self.shards is not None and DIRECTOR_SHARD is not None:
+            shard = self.shards.shards[DIRECTOR_SHARD]
+            publisher_address = shard['publisher_address']
+            subscriber_address = shard['subscriber_address']
+            durable_address = shard.get('durable_address', durable_address)
+
+        if DURABLE_CHANNELS:
+            self.init_durable(durable_address)
+
+        director = self.init_bridge(
+            self.BIND, publisher_address, self.BIND, subscriber_address)
+        self.init_control(director=True)
+
+        if INPROC_ENABLED:
+            self.init_inproc(director, director)
+
+        if DIRECTOR_HEARTBEAT_INTERVAL and self.heartbeat is None:
+            from tornado.ioloop import PeriodicCallback
+            from .forwarder import get_heartbeat
+
+            # Forwarders connected to redundant directors check their health
+            # by the heartbeats.
+            node = uuid.uuid4().hex
+            self.heartbeat = PeriodicCallback(
+                lambda: director['out'].send(get_heartbeat(node)),
+                DIRECTOR_HEARTBEAT_INTERVAL)
+            self.heartbeat.start()
+
+        return director
 
     def init_forwarder(self):
+        self.init_control(director=False)
+
+        if self.shards is not None:
+            return self.init_sharded_forwarder()
+
+        subscriber_addresses = get_addresses(DIRECTOR_SUBSCRIBER_ADDRESS)
+        publisher_addresses = get_addresses(DIRECTOR_PUBLISHER_ADDRESS)
+
+        if len(subscriber_addresses) > 1 or len(publisher_addresses) > 1:
+            return self.init_redundant_forwarder(subscriber_addresses, publisher_addresses)
+
         sub_forwarder = self.init_bridge(
-            self.CONNECT, DIRECTOR_SUBSCRIBER_ADDRESS, self.BIND, SUBSCRIBER_ADDRESS)
+            self.CONNECT, subscriber_addresses[0], self.BIND, SUBSCRIBER_ADDRESS)
         pub_forwarder = self.init_bridge(
-            self.BIND, PUBLISHER_ADDRESS, self.CONNECT, DIRECTOR_PUBLISHER_ADDRESS)
+            self.BIND, PUBLISHER_ADDRESS, self.CONNECT, publisher_addresses[0])
+
+        if INPROC_ENABLED:
+            self.init_inproc(pub_forwarder, sub_forwarder)
 
         return pub_forwarder, sub_forwarder
+
+    def init_control(self, director):
+        """
+        `init_control` starts the bridges of the control lane, if configured.
+        The director bridges its control addresses, forwarders bridge them to
+        the control addresses of the director. Not supported with director
+        shards or redundant directors.
+        """
+        addresses = (self.control_publisher_address, self.control_subscriber_address)
+        if addresses == (None, None):
+            return None
+
+        if None in addresses:
+            raise ex.OmnibusException(
+                'The control lane needs a subscriber and a publisher address')
+
+        if self.shards is not None or len(get_addresses(DIRECTOR_SUBSCRIBER_ADDRESS)) > 1:
+            raise ex.OmnibusException(
+                'The control lane is not supported with director shards or redundant directors')
+
+        if director:
+            return self.init_bridge(self.BIND, addresses[0], self.BIND, addresses[1])
+
+        if None in (DIRECTOR_CONTROL_PUBLISHER_ADDRESS, DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS):
+            raise ex.OmnibusException(
+                'Forwarders need the control addresses of the director for the control lane')
+
+        return (
+            self.init_bridge(
+                self.BIND, addresses[0], self.CONNECT, DIRECTOR_CONTROL_PUBLISHER_ADDRESS),
+            self.init_bridge(
+                self.CONNECT, DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS, self.BIND, addresses[1]))
+
+    def init_redundant_forwarder(self, subscriber_addresses, publisher_addresses):
+        """
+        `init_redundant_forwarder` starts a forwarder for a list of directors,
+        see `omnibus.forwarder.Forwarder`. Not supported with durable channels,
+        their offsets need a single director per channel.
+        """
+        if DURABLE_CHANNELS:
+            raise ex.OmnibusException(
+                'OMNIBUS_DURABLE_CHANNELS is not supported with redundant directors')
+
+        if self.forwarder is None:
+            from .forwarder import Forwarder
+
+            self.forwarder = Forwarder(self, subscriber_addresses, publisher_addresses)
+            self.forwarder.start(PUBLISHER_ADDRESS, SUBSCRIBER_ADDRESS)
+
+            if INPROC_ENABLED:
+                self.init_inproc(*self.forwarder.bridges)
+
+        return self.forwarder.bridges
+
+    def init_sharded_forwarder(self):
+        """
+        `init_sharded_forwarder` publishes the messages of the local publishers
+        to the director shards of their channels. There is no subscriber side,
+        subscribers connect to the shards directly.
+        """
+        if self.shard_router is None:
+            try:
+                shard_router = {'in': self.context.socket(zmq.SUB)}
+                self.bind(shard_router['in'], PUBLISHER_ADDRESS)
+                shard_router['in'].setsockopt(zmq.SUBSCRIBE, b'')
+
+                shard_router['bridge'] = self.get_stream(shard_router['in'])
+                shard_router['bridge'].on_recv(self.route)
+            except ZMQError as e:
+                raise ex.OmnibusException(e)
+
+            self.shard_router = shard_router
+
+        return self.shard_router, None
+
+    @monitored('PubSub.route')
+    def route(self, msg):
+        """
+        `route` is called by the sharded forwarder for every message of the
+        local publishers.
+        """
+        frame = msg[0]
+        address = self.shards.get_publisher_address(frame[:frame.find(b':')])
+
+        metrics.bridge_messages.inc(label=PUBLISHER_ADDRESS)
+        metrics.bridge_bytes.inc(len(frame), label=PUBLISHER_ADDRESS)
+        if is_expired(frame, 'bridge'):
+            return
+
+        self.get_connection(zmq.PUB, address).send_multipart(msg)
@@ -0,0 +1,88 @@
+import time
+
+
+class TokenBucket(object):
+    """
+    `TokenBucket` allows `burst` actions at once and refills with `rate`
+    tokens per second.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.time() if now is None else now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now=None):
+        """
+        `consume` takes a token from the bucket. Returns 0 if a token was
+        available, otherwise the seconds until the next token is available.
+        """
+        self.refill(time.time() if now is None else now)
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now):
+        self.refill(now)
+        return self.tokens >= self.burst
+
+
+class RateLimiter(object):
+    """
+    `RateLimiter` keeps a token bucket per key, e.g. per IP address or per
+    connection identifier. Buckets which refilled completely are dropped
+    once the number of buckets exceeds `cleanup_size`, a fresh bucket behaves
+    the same.
+    """
+
+    def __init__(self, rate, burst, cleanup_size=10000):
+        self.rate = rate
+        self.burst = burst
+        self.cleanup_size = cleanup_size
+        self.buckets = {}
+
+    def check(self, key, now=None):
+        """
+        `check` consumes a token for the given key. Returns 0 if the action
+        is allowed, otherwise the seconds to wait before retrying.
+        """
+        if now is None:
+            now = time.time()
+
+        bucket = self.buckets.get(key, None)
+        if bucket is None:
+            if len(self.buckets) >= self.cleanup_size:
+                self.cleanup(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+
+        return bucket.consume(now)
+
+    def cleanup(self, now):
+        for key, bucket in list(self.buckets.items()):
+            if bucket.is_full(now):
+                del self.buckets[key]
+
+        # Everyone is busy, allow the dict to grow before trying again.
+        if len(self.buckets) >= self.cleanup_size:
+            self.cleanup_size *= 2
+
+
+def get_rate_limiter(setting):
+    """
+    `get_rate_limiter` returns a rate limiter for a `(rate, burst)` setting or
+    None if the setting is None.
+    """
+    if setting is None:
+        return None
+
+    rate, burst = setting
+    return RateLimiter(rate, burst)
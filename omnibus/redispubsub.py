@@ -0,0 +1,275 @@
+import json
+import logging
+import select
+import socket
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from django.utils.encoding import force_bytes
+
+from . import exceptions as ex
+from . import metrics
+from .backend import BasePubSub
+from .direct import DIRECT_CHANNEL, get_topic
+from .expiry import is_expired
+from .fanout import FanOut
+from .monitor import monitored
+from .settings import DURABLE_CHANNELS, REDIS_URL
+
+
+logger = logging.getLogger(__name__)
+
+decoder = json.JSONDecoder()
+
+
+def encode_command(*args):
+    """
+    `encode_command` encodes a Redis command in the RESP protocol.
+    """
+    parts = [u'*{0}\r\n'.format(len(args)).encode('ascii')]
+    for arg in args:
+        arg = force_bytes(arg)
+        parts.append(u'${0}\r\n'.format(len(arg)).encode('ascii'))
+        parts.append(arg)
+        parts.append(b'\r\n')
+    return b''.join(parts)
+
+
+class RedisPublisher(object):
+    """
+    `RedisPublisher` publishes messages on a single connection per process.
+
+    Commands are pipelined: the connection doesn't wait for the replies, they
+    are read whenever available. This works the same with or without a
+    running IOLoop, e.g. in Django processes using `omnibus.api`.
+    """
+
+    def __init__(self, host, port, password=None, timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.connection = None
+        self.poller = None
+        self.pending = 0
+        self.buffer = b''
+
+    def connect(self):
+        self.connection = socket.create_connection((self.host, self.port), self.timeout)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.pending = 0
+        self.buffer = b''
+
+        # Unlike select(), poll() works with file descriptors beyond 1023,
+        # which busy omnibusd processes reach.
+        if hasattr(select, 'poll'):
+            self.poller = select.poll()
+            self.poller.register(self.connection, select.POLLIN)
+
+        if self.password:
+            self.execute('AUTH', self.password)
+
+    def execute(self, *args):
+        try:
+            if self.connection is None:
+                self.connect()
+
+            self.connection.sendall(encode_command(*args))
+            self.pending += 1
+            self.read_replies()
+        except Exception as e:
+            # The connection is in an unknown state, the next command
+            # reconnects.
+            self.close()
+            raise ex.OmnibusPublisherException(e)
+
+    def is_readable(self):
+        if self.poller is not None:
+            return bool(self.poller.poll(0))
+        return bool(select.select([self.connection], [], [], 0)[0])
+
+    def read_replies(self):
+        while self.pending and self.is_readable():
+            data = self.connection.recv(65536)
+            if not data:
+                raise socket.error('Connection closed by Redis')
+
+            self.buffer += data
+            # The replies of PUBLISH and AUTH are single lines.
+            while b'\r\n' in self.buffer:
+                line, self.buffer = self.buffer.split(b'\r\n', 1)
+                self.pending -= 1
+                if line.startswith(b'-'):
+                    logger.error(u'Redis error: {0}'.format(line[1:].decode('utf-8')))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.poller = None
+
+
+class RedisSubscriber(object):
+    def __init__(self, callback):
+        self.callback = callback
+        self.channels = []
+        self.topics = set()
+
+
+class RedisPubSub(BasePubSub):
+    """
+    `RedisPubSub` is a bus backend using Redis pub/sub, the Redis server takes
+    the role of the director.
+
+    Every process uses a single connection to publish and ``omnibusd``
+    processes a second one to subscribe. Redis channels are subscribed once
+    per process, with a reference count of the local subscribers. Channels
+    are matched exactly, unlike the prefix matching of zmq. The messages are
+    fanned out to the local subscribers in chunks, see `omnibus.fanout.FanOut`.
+    """
+    logger = logger
+
+    def __init__(self, loop=None, url=REDIS_URL):
+        self._loop = loop
+
+        url = urlparse(url)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 6379
+        self.password = url.password
+
+        self.publisher = RedisPublisher(self.host, self.port, self.password)
+        self.subscription = None
+        # Local subscribers per topic.
+        self.topics = {}
+        self.fanout = FanOut(loop=loop)
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            from tornado.ioloop import IOLoop
+            self.loop = IOLoop.current()
+        return self._loop
+
+    @loop.setter
+    def loop(self, loop):
+        self._loop = self.fanout.loop = loop
+
+    def get_topic(self, msg):
+        if msg.startswith(DIRECT_CHANNEL + ':'):
+            # Direct messages are published to the topic of the identifier.
+            identifier, _ = decoder.raw_decode(msg, len(DIRECT_CHANNEL) + 1)
+            return get_topic(identifier)
+        return msg[:msg.find(':')]
+
+    def send(self, msg):
+        try:
+            topic = self.get_topic(msg)
+        except ValueError as e:
+            raise ex.OmnibusDataException(e)
+
+        self.log('debug', u'send {0} to {1}'.format(msg, topic))
+        self.publisher.execute('PUBLISH', topic, msg)
+        metrics.published.inc()
+
+        return True
+
+    # SUBSCRIBING ------------------------------------------------------------
+
+    def get_subscriber(self, callback, address=None):
+        if self.subscription is None:
+            # Only omnibusd subscribes, publishing processes don't need tornado.
+            from .redissubscription import RedisSubscription
+            self.subscription = RedisSubscription(
+                self.host, self.port, self.password, self.loop, self.on_message)
+            self.subscription.start()
+
+        return RedisSubscriber(callback)
+
+    def close_subscriber(self, subscriber):
+        for topic in list(subscriber.topics):
+            self.unsubscribe_topic(subscriber, topic)
+        subscriber.channels = []
+
+        return True
+
+    def subscribe(self, subscriber, channel):
+        if channel in subscriber.channels:
+            return False
+
+        self.subscribe_topic(subscriber, channel)
+        subscriber.channels.append(channel)
+
+        return True
+
+    def unsubscribe(self, subscriber, channel):
+        if channel not in subscriber.channels:
+            return False
+
+        self.unsubscribe_topic(subscriber, channel)
+        subscriber.channels.remove(channel)
+
+        return True
+
+    def subscribe_topic(self, subscriber, topic):
+        topic = force_bytes(topic)
+        subscribers = self.topics.get(topic, None)
+        if subscribers is None:
+            subscribers = self.topics[topic] = set()
+            self.subscription.subscribe(topic)
+
+        subscribers.add(subscriber)
+        subscriber.topics.add(topic)
+
+    def unsubscribe_topic(self, subscriber, topic):
+        topic = force_bytes(topic)
+        subscribers = self.topics.get(topic, None)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscriber)
+        subscriber.topics.discard(topic)
+        if not subscribers:
+            del self.topics[topic]
+            self.subscription.unsubscribe(topic)
+
+    @monitored('RedisPubSub.on_message')
+    def on_message(self, topic, data):
+        if is_expired(data, 'subscriber'):
+            return
+
+        subscribers = self.topics.get(topic, None)
+        if subscribers:
+            self.fanout.deliver(self.deliver, list(subscribers), (topic, [data]))
+
+    def deliver(self, subscriber, message):
+        topic, msg = message
+        # The subscriber may have been closed while the fan-out was pending.
+        if topic in subscriber.topics:
+            subscriber.callback(msg)
+
+    def replay(self, channel, offset, callback):
+        # Redis doesn't store messages, the replay fails right away.
+        self.log('error', u'Unable to replay {0}, no durable log.'.format(channel))
+        self.loop.add_callback(callback, None, offset, False)
+
+    # BRIDGING ---------------------------------------------------------------
+
+    def init_director(self):
+        self.init_forwarder()
+
+    def init_forwarder(self):
+        if DURABLE_CHANNELS:
+            raise ex.OmnibusException(
+                'OMNIBUS_DURABLE_CHANNELS is not supported by the Redis backend')
+
+        self.log('info', u'Redis at {0}:{1} is the director'.format(self.host, self.port))
+
+    def close(self, linger=None):
+        self.fanout.clear()
+        if self.subscription is not None:
+            self.subscription.close()
+            self.subscription = None
+        self.publisher.close()
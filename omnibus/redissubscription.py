@@ -0,0 +1,130 @@
+import logging
+import socket
+
+from tornado import gen
+from tornado.iostream import IOStream, StreamClosedError
+
+from . import exceptions as ex
+from .redispubsub import encode_command
+
+
+logger = logging.getLogger(__name__)
+
+
+class RedisSubscription(object):
+    """
+    `RedisSubscription` is the subscribing connection of a process, it
+    subscribes the topics of all local subscribers. The connection is
+    re-established and the topics are subscribed again if it is lost.
+    """
+    reconnect_delay = 1
+
+    def __init__(self, host, port, password, loop, callback):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.loop = loop
+        self.callback = callback
+        self.topics = set()
+        self.stream = None
+        self.connected = False
+        self.closed = False
+
+    def start(self):
+        self.loop.add_callback(self.connect)
+
+    def connect(self):
+        if self.closed:
+            return
+
+        self.stream = IOStream(socket.socket(), max_buffer_size=None)
+        self.loop.add_future(self.stream.connect((self.host, self.port)), self.on_connect)
+
+    def on_connect(self, future):
+        try:
+            future.result()
+        except (StreamClosedError, socket.error) as e:
+            self.on_close(e)
+            return
+
+        self.connected = True
+        self.stream.set_nodelay(True)
+        if self.password:
+            self.write('AUTH', self.password)
+        if self.topics:
+            self.write('SUBSCRIBE', *self.topics)
+
+        self.loop.add_future(self.read(), self.on_read_done)
+
+    def on_read_done(self, future):
+        try:
+            future.result()
+        except StreamClosedError as e:
+            self.on_close(e)
+        except Exception as e:
+            logger.exception(u'Invalid reply from Redis.')
+            self.stream.close()
+            self.on_close(e)
+
+    def on_close(self, error):
+        self.connected = False
+        if self.closed:
+            return
+
+        logger.error(u'Redis subscription lost: {0}'.format(error))
+        self.stream = None
+        self.loop.call_later(self.reconnect_delay, self.connect)
+
+    def write(self, *args):
+        # Topics subscribed while connecting are subscribed once connected.
+        if self.connected:
+            self.stream.write(encode_command(*args))
+
+    def subscribe(self, topic):
+        self.topics.add(topic)
+        self.write('SUBSCRIBE', topic)
+
+    def unsubscribe(self, topic):
+        self.topics.discard(topic)
+        self.write('UNSUBSCRIBE', topic)
+
+    @gen.coroutine
+    def read(self):
+        while True:
+            reply = yield self.read_reply()
+            if isinstance(reply, list) and reply[0] == b'message':
+                self.callback(reply[1], reply[2])
+            elif isinstance(reply, ex.OmnibusException):
+                logger.error(u'Redis error: {0}'.format(reply))
+
+    @gen.coroutine
+    def read_reply(self):
+        line = yield self.stream.read_until(b'\r\n')
+        prefix, line = line[:1], line[1:-2]
+
+        if prefix == b'*':
+            reply = []
+            for _ in range(int(line)):
+                item = yield self.read_reply()
+                reply.append(item)
+        elif prefix == b'$':
+            length = int(line)
+            reply = None
+            if length >= 0:
+                data = yield self.stream.read_bytes(length + 2)
+                reply = data[:-2]
+        elif prefix == b':':
+            reply = int(line)
+        elif prefix == b'-':
+            reply = ex.OmnibusException(line.decode('utf-8'))
+        else:
+            reply = line
+
+        raise gen.Return(reply)
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
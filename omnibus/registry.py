@@ -0,0 +1,117 @@
+import logging
+import math
+import time
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from .settings import REAP_INTERVAL, DRAIN_TIMEOUT
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionRegistry(object):
+    """
+    `ConnectionRegistry` keeps track of the open client connections of the
+    ``omnibusd`` process.
+    """
+
+    def __init__(self):
+        self.connections = set()
+        # New connections are rejected while draining.
+        self.draining = False
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __contains__(self, connection):
+        return connection in self.connections
+
+    def __iter__(self):
+        # Iterate over a copy, connections may be removed while iterating.
+        return iter(list(self.connections))
+
+    def add(self, connection):
+        self.connections.add(connection)
+
+    def remove(self, connection):
+        self.connections.discard(connection)
+
+
+class Reaper(object):
+    """
+    `Reaper` periodically checks all registered connections and closes the
+    ones which failed to authenticate in time or went silent. A single timer
+    is used for all connections.
+    """
+
+    def __init__(self, registry, interval=REAP_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.callback = None
+
+    def start(self):
+        self.callback = PeriodicCallback(self.reap, self.interval * 1000)
+        self.callback.start()
+
+    def stop(self):
+        if self.callback is not None:
+            self.callback.stop()
+            self.callback = None
+
+    def reap(self):
+        now = time.time()
+        for connection in self.registry:
+            try:
+                connection.check_timeouts(now)
+            except Exception:
+                logger.exception(u'Unable to check connection timeouts.')
+
+
+class Drainer(object):
+    """
+    `Drainer` asks all registered connections to reconnect, spread over
+    `timeout` seconds to avoid a reconnect storm on the other ``omnibusd``
+    processes. `callback` is called once all connections are closed, or a
+    few seconds after the timeout.
+    """
+    interval = 0.1
+    grace = 5
+
+    def __init__(self, registry, timeout=DRAIN_TIMEOUT):
+        self.registry = registry
+        self.timeout = timeout
+        self.pending = []
+        self.chunk_size = 1
+        self.deadline = None
+        self.callback = None
+
+    def start(self, callback):
+        self.registry.draining = True
+        self.callback = callback
+        self.pending = list(self.registry)
+
+        steps = max(1, int(self.timeout / self.interval))
+        self.chunk_size = max(1, int(math.ceil(len(self.pending) / float(steps))))
+        self.deadline = time.time() + self.timeout + self.grace
+
+        logger.info(u'Draining {0} connections.'.format(len(self.pending)))
+        self.step()
+
+    def step(self):
+        chunk = self.pending[:self.chunk_size]
+        self.pending = self.pending[self.chunk_size:]
+
+        for connection in chunk:
+            try:
+                connection.drain()
+            except Exception:
+                logger.exception(u'Unable to drain connection.')
+
+        if (self.pending or len(self.registry)) and time.time() < self.deadline:
+            IOLoop.current().call_later(self.interval, self.step)
+        else:
+            self.callback()
+
+
+connections = ConnectionRegistry()
@@ -0,0 +1,111 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from django.db import close_old_connections
+except ImportError:
+    from django.db import close_connection as close_old_connections
+
+try:
+    from django.utils.module_loading import import_string
+except ImportError:
+    from django.utils.module_loading import import_by_path as import_string
+
+from tornado.ioloop import IOLoop
+
+from . import exceptions as ex
+from . import metrics
+from .settings import RPC_HANDLERS, RPC_WORKERS, RPC_QUEUE_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+class RPC(object):
+    """
+    `RPC` keeps the handlers of remote procedure calls made by clients and
+    runs them on a thread pool of `workers` threads, handlers are free to
+    block, e.g. on database queries. Calls are refused while `queue_size`
+    calls are pending.
+
+    Handlers are called with the authenticator of the calling connection and
+    the decoded parameters. The result needs to be JSON serializable, raise
+    `OmnibusRPCException` to respond with an error message.
+    """
+
+    def __init__(self, handlers=RPC_HANDLERS, workers=RPC_WORKERS, queue_size=RPC_QUEUE_SIZE):
+        # Handlers configured by path are imported on their first call.
+        self.handlers = dict(handlers)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = None
+        self.pending = 0
+
+    def register(self, method, handler=None):
+        """
+        `register` registers the handler of a method, can be used as decorator.
+        """
+        if handler is None:
+            def decorator(func):
+                self.register(method, func)
+                return func
+            return decorator
+
+        self.handlers[method] = handler
+        return handler
+
+    def get_handler(self, method):
+        handler = self.handlers.get(method, None)
+        if handler is None:
+            raise ex.OmnibusRPCException(u'Unknown method {0}'.format(method))
+
+        if not callable(handler):
+            handler = self.handlers[method] = import_string(handler)
+        return handler
+
+    def submit(self, method, authenticator, params, callback):
+        """
+        `submit` runs the handler of the method on the thread pool, `callback`
+        is called with the future on the IOLoop once the handler returned.
+        """
+        try:
+            handler = self.get_handler(method)
+        except ex.OmnibusRPCException:
+            metrics.rpc_calls.inc(label='unknown')
+            raise
+
+        if self.pending >= self.queue_size:
+            metrics.rpc_calls.inc(label='busy')
+            raise ex.OmnibusRPCException(u'Too many pending calls')
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers)
+
+        self.pending += 1
+        started = time.time()
+        future = self.executor.submit(self.run, handler, authenticator, params)
+        IOLoop.current().add_future(
+            future, lambda future: self.done(future, method, started, callback))
+
+    def run(self, handler, authenticator, params):
+        try:
+            return handler(authenticator, params)
+        finally:
+            # Database connections are per thread, don't let them go stale.
+            close_old_connections()
+
+    def done(self, future, method, started, callback):
+        # Metrics are only updated on the IOLoop thread.
+        self.pending -= 1
+        metrics.rpc_duration.observe(time.time() - started, label=method)
+        metrics.rpc_calls.inc(label='error' if future.exception() else 'success')
+        callback(future)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+rpc = RPC()
@@ -7,6 +7,9 @@ SERVER_HOST = getattr(settings, 'OMNIBUS_SERVER_HOST', None)
 SERVER_PORT = getattr(settings, 'OMNIBUS_SERVER_PORT', 4242)
 SERVER_BASE_URL = getattr(settings, 'OMNIBUS_SERVER_BASE_URL', '/ec')
 
+PUBSUB_BACKEND = getattr(settings, 'OMNIBUS_PUBSUB_BACKEND', 'omnibus.pubsub.PubSub')
+REDIS_URL = getattr(settings, 'OMNIBUS_REDIS_URL', 'redis://127.0.0.1:6379')
+
 DIRECTOR_ENABLED = getattr(settings, 'OMNIBUS_DIRECTOR_ENABLED', True)
 FORWARDER_ENABLED = getattr(settings, 'OMNIBUS_FORWARDER_ENABLED', False)
 
@@ -19,6 +22,77 @@ DIRECTOR_SUBSCRIBER_ADDRESS = getattr(
     settings, 'OMNIBUS_DIRECTOR_SUBSCRIBER_ADDRESS', None)
 DIRECTOR_PUBLISHER_ADDRESS = getattr(
     settings, 'OMNIBUS_DIRECTOR_PUBLISHER_ADDRESS', None)
+DIRECTOR_HEARTBEAT_INTERVAL = getattr(
+    settings, 'OMNIBUS_DIRECTOR_HEARTBEAT_INTERVAL', 1000)
+DIRECTOR_HEARTBEAT_TIMEOUT = getattr(
+    settings, 'OMNIBUS_DIRECTOR_HEARTBEAT_TIMEOUT', 3000)
+
+DIRECTOR_SHARDS = getattr(settings, 'OMNIBUS_DIRECTOR_SHARDS', ())
+DIRECTOR_SHARD = getattr(settings, 'OMNIBUS_DIRECTOR_SHARD', None)
+
+CONTROL_SUBSCRIBER_ADDRESS = getattr(settings, 'OMNIBUS_CONTROL_SUBSCRIBER_ADDRESS', None)
+CONTROL_PUBLISHER_ADDRESS = getattr(settings, 'OMNIBUS_CONTROL_PUBLISHER_ADDRESS', None)
+DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS = getattr(
+    settings, 'OMNIBUS_DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS', None)
+DIRECTOR_CONTROL_PUBLISHER_ADDRESS = getattr(
+    settings, 'OMNIBUS_DIRECTOR_CONTROL_PUBLISHER_ADDRESS', None)
+
+IPC_PERMISSIONS = getattr(settings, 'OMNIBUS_IPC_PERMISSIONS', None)
+INPROC_ENABLED = getattr(settings, 'OMNIBUS_INPROC_ENABLED', False)
+
+DURABLE_CHANNELS = getattr(settings, 'OMNIBUS_DURABLE_CHANNELS', ())
+DURABLE_PATH = getattr(settings, 'OMNIBUS_DURABLE_PATH', None)
+DURABLE_ADDRESS = getattr(settings, 'OMNIBUS_DURABLE_ADDRESS', 'tcp://127.0.0.1:4245')
+DURABLE_SEGMENT_SIZE = getattr(settings, 'OMNIBUS_DURABLE_SEGMENT_SIZE', 16 * 1024 * 1024)
+DURABLE_SEGMENTS = getattr(settings, 'OMNIBUS_DURABLE_SEGMENTS', 8)
+DURABLE_FLUSH_INTERVAL = getattr(settings, 'OMNIBUS_DURABLE_FLUSH_INTERVAL', 1000)
+DURABLE_REPLAY_LIMIT = getattr(settings, 'OMNIBUS_DURABLE_REPLAY_LIMIT', 1000)
+DURABLE_REPLAY_TIMEOUT = getattr(settings, 'OMNIBUS_DURABLE_REPLAY_TIMEOUT', 5)
+
+BINARY_ENCODINGS = getattr(
+    settings, 'OMNIBUS_BINARY_ENCODINGS', ('msgpack', 'cbor'))
+
+COMPRESSION_ENABLED = getattr(settings, 'OMNIBUS_COMPRESSION_ENABLED', False)
+COMPRESSION_LEVEL = getattr(settings, 'OMNIBUS_COMPRESSION_LEVEL', 6)
+COMPRESSION_MEM_LEVEL = getattr(settings, 'OMNIBUS_COMPRESSION_MEM_LEVEL', 8)
+COMPRESSION_WINDOW_BITS = getattr(settings, 'OMNIBUS_COMPRESSION_WINDOW_BITS', 15)
+COMPRESSION_MIN_SIZE = getattr(settings, 'OMNIBUS_COMPRESSION_MIN_SIZE', 256)
+COMPRESSION_EXEMPT_CHANNELS = getattr(
+    settings, 'OMNIBUS_COMPRESSION_EXEMPT_CHANNELS', ())
+
+SEND_BATCH_INTERVAL = getattr(settings, 'OMNIBUS_SEND_BATCH_INTERVAL', None)
+SEND_WINDOW = getattr(settings, 'OMNIBUS_SEND_WINDOW', None)
+FANOUT_CHUNK_SIZE = getattr(settings, 'OMNIBUS_FANOUT_CHUNK_SIZE', 1000)
+
+METRICS_URL = getattr(settings, 'OMNIBUS_METRICS_URL', None)
+METRICS_MAX_LABELS = getattr(settings, 'OMNIBUS_METRICS_MAX_LABELS', 1000)
+
+WATCHDOG_THRESHOLD = getattr(settings, 'OMNIBUS_WATCHDOG_THRESHOLD', None)
+
+PING_INTERVAL = getattr(settings, 'OMNIBUS_PING_INTERVAL', None)
+PING_TIMEOUT = getattr(settings, 'OMNIBUS_PING_TIMEOUT', None)
+HEARTBEAT_INTERVAL = getattr(settings, 'OMNIBUS_HEARTBEAT_INTERVAL', None)
+AUTHENTICATION_TIMEOUT = getattr(settings, 'OMNIBUS_AUTHENTICATION_TIMEOUT', None)
+IDLE_TIMEOUT = getattr(settings, 'OMNIBUS_IDLE_TIMEOUT', None)
+REAP_INTERVAL = getattr(settings, 'OMNIBUS_REAP_INTERVAL', 5)
+
+MAX_CONNECTIONS = getattr(settings, 'OMNIBUS_MAX_CONNECTIONS', None)
+CONNECTION_RATE_LIMIT = getattr(settings, 'OMNIBUS_CONNECTION_RATE_LIMIT', None)
+COMMAND_RATE_LIMIT = getattr(settings, 'OMNIBUS_COMMAND_RATE_LIMIT', None)
+PUBLISH_RATE_LIMIT = getattr(settings, 'OMNIBUS_PUBLISH_RATE_LIMIT', None)
+RETRY_AFTER = getattr(settings, 'OMNIBUS_RETRY_AFTER', 5)
+
+DRAIN_TIMEOUT = getattr(settings, 'OMNIBUS_DRAIN_TIMEOUT', 10)
+DRAIN_LINGER = getattr(settings, 'OMNIBUS_DRAIN_LINGER', 1000)
+REUSE_PORT = getattr(settings, 'OMNIBUS_REUSE_PORT', False)
+
+PRESENCE_CHANNELS = getattr(settings, 'OMNIBUS_PRESENCE_CHANNELS', ())
+PRESENCE_INTERVAL = getattr(settings, 'OMNIBUS_PRESENCE_INTERVAL', 1000)
+PRESENCE_MAX_MEMBERS = getattr(settings, 'OMNIBUS_PRESENCE_MAX_MEMBERS', 100)
+
+RPC_HANDLERS = getattr(settings, 'OMNIBUS_RPC_HANDLERS', {})
+RPC_WORKERS = getattr(settings, 'OMNIBUS_RPC_WORKERS', 4)
+RPC_QUEUE_SIZE = getattr(settings, 'OMNIBUS_RPC_QUEUE_SIZE', 100)
 
 AUTHENTICATOR_FACTORY = getattr(
     settings,
@@ -0,0 +1,48 @@
+import hashlib
+
+from django.utils.encoding import force_bytes
+
+
+class Shards(object):
+    """
+    `Shards` maps channels to director shards.
+
+    Every shard is a dict with the ``subscriber_address`` and the
+    ``publisher_address`` of its director. The shard of a channel is chosen by
+    rendezvous hashing: the shard with the highest hash of its subscriber
+    address and the channel wins. Adding or removing a shard only moves the
+    channels of this shard, all publishers and subscribers agree on the shard
+    of a channel without further coordination.
+    """
+    # Number of channels whose shard is remembered.
+    cache_size = 10000
+
+    def __init__(self, shards):
+        self.shards = [dict(shard) for shard in shards]
+        self.keys = [force_bytes(shard['subscriber_address']) for shard in self.shards]
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.shards)
+
+    def get_index(self, channel):
+        index = self.cache.get(channel, None)
+        if index is None:
+            channel_key = b':' + force_bytes(channel)
+            scores = [hashlib.md5(key + channel_key).digest() for key in self.keys]
+            index = scores.index(max(scores))
+
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[channel] = index
+
+        return index
+
+    def get_shard(self, channel):
+        return self.shards[self.get_index(channel)]
+
+    def get_subscriber_address(self, channel):
+        return self.get_shard(channel)['subscriber_address']
+
+    def get_publisher_address(self, channel):
+        return self.get_shard(channel)['publisher_address']
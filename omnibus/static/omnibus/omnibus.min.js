@@ -7,4 +7,4 @@
  * @author Stephan Jaekel <https://github.com/stephrdev>
  * @author Norman Rusch <https://github.com/schorfES>
  */
-!function(a,b){"function"==typeof define&&define.amd?define(b):"object"==typeof exports?module.exports=b():a.Omnibus=b()}(this,function(){function a(){var a,b,c=Array.prototype.shift.call(arguments);if("object"==typeof c&&arguments.length>0)for(;arguments.length>0;)if(a=Array.prototype.shift.call(arguments))for(b in a)c[b]=a[b];return c}function b(a,b){return function(){"function"==typeof a&&a.apply(b,arguments)}}var c={INDICATOR:"!",DELIMITER:":",AUTHENTICATE:"authenticate",SUBSCRIBE:"subscribe",UNSUBSCRIBE:"unsubscribe"},d=function(a,b,c){this.sender=a,this.name=b,this.data=c},e=function(){this._events={}};a(e.prototype,{on:function(a,b){return this._events[a]||(this._events[a]=[]),this._events[a].push(b),this},off:function(a,b){var c;if(void 0===a)for(c in this._events)this._events[c]=void 0,delete this._events[c];else if("object"==typeof this._events[a])if("function"==typeof b)for(c=0;c<this._events[a].length;c++)this._events[a][c]===b&&this._events[a].splice(c,1);else this._events[a]=void 0,delete this._events[a];return this},trigger:function(a,b){return this._trigger(a,b),"*"!==a&&this._trigger("*",b,a),this},_trigger:function(a,b,c){var e,f=new d(this,c||a,b);if("object"==typeof this._events[a])for(e=0;e<this._events[a].length;e++)this._events[a][e](f)}});var f={CHANNEL_SUBSCRIBED:"subscribed",CHANNEL_UNSUBSCRIBED:"unsubscribed",CHANNEL_CLOSE:"close",CHANNEL_DESTROY:"destroy",CONNECTION_CONNECTED:"connected",CONNECTION_DISCONNECTED:"disconnected",CONNECTION_AUTHENTICATED:"authenticated",CONNECTION_ERROR:"error"},g=function(a,b){e.call(this),this._closed=!0,this._subscribed=!1,this._name=a,this._connection=b,this._subscribe()};a(g.prototype,e.prototype,{_subscribe:function(){this.isSubscribed()||this._connection.sendCommandMessage(c.SUBSCRIBE,this._name)},getName:function(){return this._name},isSubscribed:function(){return this._subscribed||!1},_handleSubscribed:function(){this._subscribed||(this._closed=!1,this._subscribed=!0,this.trigger(f.CHANNEL_SUBSCRIBED))},_handleUnsubscribed:function(){this._subscribed&&(this._subscribed=!1,this.trigger(f.CHANNEL_UNSUBSCRIBED))},send:function(a,b){return this._subscribed?this._connection.sendChannelMessage(this._name,a,b):!1},close:function(){this.isDestroyed()||this._closed||this._connection.closeChannel(this)},_handleClose:function(){return this.isDestroyed()||this._closed?!1:(this._closed=!0,this.trigger(f.CHANNEL_CLOSE),!0)},_destroy:function(){return this.isDestroyed()?!1:(this._destroyCalledBefore=!0,this.trigger(f.CHANNEL_DESTROY),this._name=void 0,this._subscribed=void 0,this._connection=void 0,this.off(),delete this._name,delete this._subscribed,delete this._connection,!0)},isDestroyed:function(){return this._destroyCalledBefore||!1}});var h,i={ignoreSender:!0,debug:!1,autoReconnect:!0,autoReconnectTimeout:500};return h=function(b,c,d){e.call(this),this._socketOpen=!1,this._authenticated=!1,this._identifier=this._getUid(),this._transport=b,this._remote=c,this._options=a({},i,d),this._channels={},this._sendQueue=[],this._initializeConnection()},a(h.prototype,e.prototype,{_getUid:function(a){return a?(a^16*Math.random()>>a/4).toString(16):"10000000-1000-4000-8000-100000000000".replace(/[018]/g,this._getUid)},_log:function(a,b){this._options.debug&&window&&window.console&&"function"==typeof window.console.log&&window.console.log("["+(new Date).toISOString()+"|"+a+"] ",b)},_initializeConnection:function(){if(!(this._transport instanceof Object))throw new Error("Provide a Websocket API as constructor argument.");if(this._socket)throw new Error("Connection already initialized.");this._log("info","Connecting"),this._socket=new this._transport(this._remote),this._socket.onopen=b(this._onSocketOpen,this),this._socket.onclose=b(this._onSocketClose,this),this._socket.onmessage=b(this._onSocketMessage,this),this._socket.onerror=b(this._onSocketError,this)},getId:function(){return this._identifier},isConnected:function(){return this._socketOpen},isAuthenticated:function(){return this._authenticated},openChannel:function(a){return this.getChannel(a)||this._createChannel(a)},_createChannel:function(a){if("string"!=typeof a||0===a.length)throw new Error("Channel name must be a valid String.");if(a.indexOf(c.DELIMITER)>-1||a.indexOf(c.INDICATOR)>-1)throw new Error("Channel name contains invalid characters.");var b=new g(a,this);return this._channels[a]=b,b},closeChannel:function(a){var b=!1,d=a;if("string"!=typeof a&&!(d instanceof g))throw new Error("To close channel provide channel instance or channel name.");return"string"==typeof a&&(d=this.getChannel(a)),d instanceof g&&(b=d._handleClose(),this.sendCommandMessage(c.UNSUBSCRIBE,d.getName())),b},_removeChannel:function(a){"string"==typeof a&&this._channels[a]instanceof g&&(this._channels[a]._destroy(),this._channels[a]=null,delete this._channels[a])},getChannel:function(a){return this._channels[a]},sendCommandMessage:function(a,b,d){return this._send(c.INDICATOR+a+c.DELIMITER+b,d)},sendChannelMessage:function(a,b,d,e){var f=JSON.stringify({type:b,sender:this._identifier,payload:d});return this._send(a+c.DELIMITER+f,e)},_send:function(a,b){return this._log("debug","Out: "+a),this._socket&&this.isConnected()&&(this.isAuthenticated()||b)?this._socket.send(a):this._sendQueue.push(a),!!this._socket},_flushQueue:function(){for(;this._sendQueue.length>0;)this._send(this._sendQueue.shift())},_handleCommandMessage:function(a,b){switch(a){case c.AUTHENTICATE:this._handleCommandAuthenticate(b);break;case c.SUBSCRIBE:this._handleCommandSubscribe(b);break;case c.UNSUBSCRIBE:this._handleCommandUnsubscribe(b)}},_handleCommandAuthenticate:function(a){a.success&&(this._authenticated=!0,this.trigger(f.CONNECTION_AUTHENTICATED),this._flushQueue())},_handleCommandSubscribe:function(a){if(a.success&&"string"==typeof a.payload.channel){var b=this.getChannel(a.payload.channel);b&&b._handleSubscribed(a)}},_handleCommandUnsubscribe:function(a){if(a.success&&"string"==typeof a.payload.channel){var b=this.getChannel(a.payload.channel);b&&(b._handleUnsubscribed(a),this._removeChannel(b.getName()))}},_handleChannelMessage:function(a,b){if(!this._options.ignoreSender||b.sender!==this._identifier){var c=this.getChannel(a);c&&c.trigger(b.type,b)}},_handleReconnect:function(){var a,b;this._initializeConnection();for(b in this._channels)a=this._channels[b],a._subscribe()},_onSocketOpen:function(){this._log("info","Connected"),this._socketOpen=!0;var a=this._identifier;this._options.authToken&&(a=a+c.DELIMITER+this._options.authToken),this.trigger(f.CONNECTION_CONNECTED),this.sendCommandMessage(c.AUTHENTICATE,a,!0)},_onSocketClose:function(){var a,c;this._log("info","Disconnected"),this._socket=null,this._socketOpen=!1,this._authenticated=!1,this.trigger(f.CONNECTION_DISCONNECTED);for(c in this._channels)a=this._channels[c],a._handleUnsubscribed();this._options.autoReconnect&&window.setTimeout(b(this._handleReconnect,this),this._options.autoReconnectTimeout)},_onSocketMessage:function(a){this._log("debug","In: "+a.data);var b=a.data,d=b.indexOf(c.DELIMITER),e=b.substring(0,d),f=JSON.parse(b.substring(d+1));0===e.indexOf(c.INDICATOR)?(e=e.substr(1),this._handleCommandMessage(e,f)):this._handleChannelMessage(e,f)},_onSocketError:function(a){this.trigger(f.CONNECTION_ERROR,a)}}),h.events=a({},f),h.defaults=a({},i),h});
\ No newline at end of file
+(function(b,a){if(typeof define==='function'&&define.amd){define(a);}else if(typeof exports==='object'){module.exports=a();}else{b.Omnibus=a();}}(this,function(){function d(){var b=Array.prototype.shift.call(arguments),a,c;if(typeof b==='object'&&arguments.length>0){while(arguments.length>0){a=Array.prototype.shift.call(arguments);if(a){for(c in a){b[c]=a[c];}}}}return b;};function c(a,b){return function(){if(typeof a==='function'){a.apply(b,arguments);}};};var a={INDICATOR:'!',DELIMITER:':',AUTHENTICATE:'authenticate',SUBSCRIBE:'subscribe',UNSUBSCRIBE:'unsubscribe',ENCODING:'encoding',BATCH:'batch',HEARTBEAT:'heartbeat',RESUME:'resume',REPLAY:'replay',PRESENCE:'presence',DIRECT:'direct',CALL:'call',CLOSE_RETRY_AFTER:4429};var i=function(a,b,c){this.sender=a;this.name=b;this.data=c;};var e=function(){this._events={};};d(e.prototype,{on:function(a,b){if(!this._events[a]){this._events[a]=[];}this._events[a].push(b);return this;},off:function(b,c){var a;if(b===undefined){for(a in this._events){this._events[a]=undefined;delete this._events[a];}}else if(typeof this._events[b]==='object'){if(typeof c==='function'){for(a=0;a<this._events[b].length;a++){if(this._events[b][a]===c){this._events[b].splice(a,1);}}}else{this._events[b]=undefined;delete this._events[b];}}return this;},trigger:function(a,b){this._trigger(a,b);if(a!=='*'){this._trigger('*',b,a);}return this;},_trigger:function(a,c,d){var b,e=new i(this,d||a,c);if(typeof this._events[a]==='object'){for(b=0;b<this._events[a].length;b++){this._events[a][b](e);}}}});var b={CHANNEL_SUBSCRIBED:'subscribed',CHANNEL_UNSUBSCRIBED:'unsubscribed',CHANNEL_CLOSE:'close',CHANNEL_DESTROY:'destroy',CHANNEL_PRESENCE:'presence',CONNECTION_CONNECTED:'connected',CONNECTION_DISCONNECTED:'disconnected',CONNECTION_AUTHENTICATED:'authenticated',CONNECTION_ERROR:'error'};var f=function(a,b){e.call(this);this._closed=true;this._subscribed=false;this._name=a;this._connection=b;this._members={};this._memberCount=0;this._offset=null;this._subscribe();};d(f.prototype,e.prototype,{_subscribe:function(){if(!this.isSubscribed()){this._connection.sendCommandMessage(a.SUBSCRIBE,this._name);}},getName:function(){return this._name;},isSubscribed:function(){return this._subscribed||false;},_handleSubscribed:function(){if(!this._subscribed){this._closed=false;this._subscribed=true;this.trigger(b.CHANNEL_SUBSCRIBED);}},_handleUnsubscribed:function(){if(this._subscribed){this._subscribed=false;this.trigger(b.CHANNEL_UNSUBSCRIBED);}},getMembers:function(){var b=[],a;if(this._members===null){return null;}for(a in this._members){if(this._members.hasOwnProperty(a)){b.push(a);}}return b;},getOffset:function(){return this._offset;},getMemberCount:function(){return this._memberCount;},_handlePresence:function(a){var d=a.joined||[],e=a.left||[],c;if(a.members){this._members={};d=a.members;}else if(!a.joined&&!a.left){this._members=null;}if(this._members!==null){for(c=0;c<d.length;c++){this._members[d[c]]=true;}for(c=0;c<e.length;c++){delete this._members[e[c]];}}this._memberCount=a.count;this.trigger(b.CHANNEL_PRESENCE,{count:a.count,joined:a.joined||[],left:a.left||[],members:this.getMembers()});},send:function(a,b){if(this._subscribed){return this._connection.sendChannelMessage(this._name,a,b);}return false;},close:function(){if(!this.isDestroyed()&&!this._closed){this._connection.closeChannel(this);}},_handleClose:function(){if(!this.isDestroyed()&&!this._closed){this._closed=true;this.trigger(b.CHANNEL_CLOSE);return true;}return false;},_destroy:function(){if(!this.isDestroyed()){this._destroyCalledBefore=true;this.trigger(b.CHANNEL_DESTROY);this._name=undefined;this._subscribed=undefined;this._connection=undefined;this.off();delete this._name;delete this._subscribed;delete this._connection;return true;}return false;},isDestroyed:function(){return this._destroyCalledBefore||false;}});var h={ignoreSender:true,debug:false,autoReconnect:true,autoReconnectTimeout:500,autoReconnectMaxTimeout:30000,encoding:null,codec:null,batch:false,batchTimeout:null},g;g=function(a,b,c){e.call(this);this._socketOpen=false;this._authenticated=false;this._identifier=this._getUid();this._transport=a;this._remote=b;this._options=d({},h,c);this._channels={};this._sendQueue=[];this._batchQueue=[];this._reconnectAttempts=0;this._calls={};this._callId=0;this._initializeConnection();};d(g.prototype,e.prototype,{_getUid:function(a){if(a){return(a^Math.random()*16>>a/4).toString(16);}else{return'10000000-1000-4000-8000-100000000000'.replace(/[018]/g,this._getUid);}},_log:function(a,b){if(this._options.debug&&window&&window.console&&typeof window.console.log==='function'){window.console.log('['+new Date().toISOString()+'|'+a+'] ',b);}},_initializeConnection:function(){if(!(this._transport instanceof Object)){throw new Error('Provide a Websocket API as constructor argument.');}if(this._socket){throw new Error('Connection already initialized.');}if(this._options.encoding&&!this._options.codec){throw new Error('Provide a codec to decode the '+this._options.encoding+' encoding.');}this._log('info','Connecting');this._socket=new this._transport(this._remote);if(this._options.encoding){this._socket.binaryType='arraybuffer';}this._socket.onopen=c(this._onSocketOpen,this);this._socket.onclose=c(this._onSocketClose,this);this._socket.onmessage=c(this._onSocketMessage,this);this._socket.onerror=c(this._onSocketError,this);},getId:function(){return this._identifier;},isConnected:function(){return this._socketOpen;},isAuthenticated:function(){return this._authenticated;},openChannel:function(a){return this.getChannel(a)||this._createChannel(a);},_createChannel:function(b){if(typeof b!=='string'||b.length===0){throw new Error('Channel name must be a valid String.');}if(b.indexOf(a.DELIMITER)>-1||b.indexOf(a.INDICATOR)>-1){throw new Error('Channel name contains invalid characters.');}var c=new f(b,this);this._channels[b]=c;return c;},closeChannel:function(c){var d=false,b=c;if(typeof c!=='string'&&!(b instanceof f)){throw new Error('To close channel provide channel instance or channel name.');}if(typeof c==='string'){b=this.getChannel(c);}if(b instanceof f){d=b._handleClose();this.sendCommandMessage(a.UNSUBSCRIBE,b.getName());}return d;},_removeChannel:function(a){if(typeof a==='string'&&this._channels[a]instanceof f){this._channels[a]._destroy();this._channels[a]=null;delete this._channels[a];}},getChannel:function(a){return this._channels[a];},sendCommandMessage:function(b,c,d){return this._send(a.INDICATOR+b+a.DELIMITER+c,d);},sendChannelMessage:function(b,c,d,e){var f=JSON.stringify({type:c,sender:this._identifier,payload:d});return this._send(b+a.DELIMITER+f,e);},call:function(e,b,f){var c=String(++this._callId),d=a.INDICATOR+a.CALL+a.DELIMITER+c+a.DELIMITER+e+a.DELIMITER+JSON.stringify(b===undefined?null:b);this._calls[c]={callback:f,message:d};return this._send(d);},_send:function(a,b){this._log('debug','Out: '+a);if(this._socket&&this.isConnected()&&(this.isAuthenticated()||b)){if(this._options.batch&&!b){this._batch(a);}else{this._socket.send(a);}}else{this._sendQueue.push(a);}return!!this._socket;},_batch:function(a){this._batchQueue.push(a);if(this._batchQueue.length>1){return;}if(typeof this._options.batchTimeout!=='number'&&typeof window.requestAnimationFrame==='function'){window.requestAnimationFrame(c(this._flushBatch,this));}else{window.setTimeout(c(this._flushBatch,this),this._options.batchTimeout||0);}},_flushBatch:function(){var b=this._batchQueue;this._batchQueue=[];if(b.length===0){return;}if(!this._socket||!this.isConnected()){this._sendQueue=b.concat(this._sendQueue);}else if(b.length===1){this._socket.send(b[0]);}else{this._socket.send(a.INDICATOR+a.BATCH+a.DELIMITER+JSON.stringify(b));}},_flushQueue:function(){while(this._sendQueue.length>0){this._send(this._sendQueue.shift());}},_handleCommandMessage:function(c,b){switch(c){case a.AUTHENTICATE:this._handleCommandAuthenticate(b);break;case a.SUBSCRIBE:this._handleCommandSubscribe(b);break;case a.UNSUBSCRIBE:this._handleCommandUnsubscribe(b);break;case a.ENCODING:this._handleCommandEncoding(b);break;case a.BATCH:this._handleCommandBatch(b);break;case a.HEARTBEAT:this._handleCommandHeartbeat(b);break;case a.RESUME:this._handleCommandResume(b);break;case a.REPLAY:this._handleCommandReplay(b);break;case a.PRESENCE:this._handleCommandPresence(b);break;case a.DIRECT:this._handleCommandDirect(b);break;case a.CALL:this._handleCommandCall(b);break;}},_handleCommandResume:function(a){var b,c;for(c in this._channels){b=this._channels[c];if(!a.success||!a.payload){b._subscribe();}else if(a.payload.channels[c]===true){b._handleSubscribed(a);}}},_handleCommandReplay:function(a){var b;if(!a.success||!a.payload){return;}b=this.getChannel(a.payload.channel);if(b&&b._offset!==null&&a.payload.offset<=b._offset){b._offset=a.payload.offset-1;}},_handleCommandCall:function(a){var b;if(!a.payload||!this._calls.hasOwnProperty(a.payload.id)){this._log('error','Unexpected call response');return;}b=this._calls[a.payload.id];delete this._calls[a.payload.id];b.callback(a.success?null:a.payload.error,a.payload.result);},_failCalls:function(){var a,b;for(b in this._calls){a=this._calls[b];if(this._sendQueue.indexOf(a.message)===-1&&this._batchQueue.indexOf(a.message)===-1){delete this._calls[b];a.callback('Disconnected',null);}}},_handleCommandDirect:function(a){if(a.success&&a.payload){this.trigger(a.payload.type,a.payload);}},_handleCommandPresence:function(a){if(a.success&&typeof a.payload.channel==='string'){var b=this.getChannel(a.payload.channel);if(b){b._handlePresence(a.payload);}}},_handleCommandHeartbeat:function(b){this.sendCommandMessage(a.HEARTBEAT,'',true);},_handleCommandBatch:function(b){var a;if(Object.prototype.toString.call(b)!=='[object Array]'){return;}for(a=0;a<b.length;a++){this._onSocketMessage({data:b[a]});}},_handleCommandEncoding:function(a){if(!a.success){this._log('info','Encoding '+this._options.encoding+' refused, using JSON');}},_handleCommandAuthenticate:function(a){if(a.success){this._authenticated=true;this._reconnectAttempts=0;this.trigger(b.CONNECTION_AUTHENTICATED);this._flushQueue();}},_handleCommandSubscribe:function(a){if(a.success&&typeof a.payload.channel==='string'){var b=this.getChannel(a.payload.channel);if(b){b._handleSubscribed(a);}}},_handleCommandUnsubscribe:function(a){if(a.success&&typeof a.payload.channel==='string'){var b=this.getChannel(a.payload.channel);if(b){b._handleUnsubscribed(a);this._removeChannel(b.getName());}}},_handleChannelMessage:function(d,a){var c;if(Object.prototype.toString.call(a)==='[object Array]'){for(c=0;c<a.length;c++){this._handleChannelMessage(d,a[c]);}return;}var b=this.getChannel(d);if(!b){return;}if(typeof a.offset==='number'){if(b._offset!==null&&a.offset<=b._offset){return;}b._offset=a.offset;}if(this._options.ignoreSender&&a.sender===this._identifier){return;}b.trigger(a.type,a);},_handleReconnect:function(){var c=[],d={},e=false,b;this._initializeConnection();for(b in this._channels){if(!this._channels[b].isSubscribed()){c.push(b);d[b]=this._channels[b].getOffset();e=e||d[b]!==null;}}if(c.length>0){this.sendCommandMessage(a.RESUME,JSON.stringify(e?d:c));}},_onSocketOpen:function(){this._log('info','Connected');this._socketOpen=true;var c=this._identifier;if(this._options.authToken){c=c+a.DELIMITER+this._options.authToken;}this.trigger(b.CONNECTION_CONNECTED);if(this._options.encoding){this.sendCommandMessage(a.ENCODING,this._options.encoding,true);}this.sendCommandMessage(a.AUTHENTICATE,c,true);},_getReconnectTimeout:function(c){var b,d;if(c&&c.code===a.CLOSE_RETRY_AFTER){b=parseInt(c.reason,10)*1000;if(b>0){return b+Math.random()*b;}}d=Math.min(this._options.autoReconnectMaxTimeout,this._options.autoReconnectTimeout*Math.pow(2,this._reconnectAttempts));return Math.random()*d;},_onSocketClose:function(e){var a,d;this._log('info','Disconnected');this._socket=null;this._socketOpen=false;this._authenticated=false;this.trigger(b.CONNECTION_DISCONNECTED);this._failCalls();for(d in this._channels){a=this._channels[d];a._handleUnsubscribed();}if(this._options.autoReconnect){window.setTimeout(c(this._handleReconnect,this),this._getReconnectTimeout(e));this._reconnectAttempts++;}},_onSocketMessage:function(f){this._log('debug','In: '+f.data);var b=f.data,d,c,e;if(typeof b==='string'){d=b.indexOf(a.DELIMITER);c=b.substring(0,d);e=JSON.parse(b.substring(d+1));}else{b=new Uint8Array(b);d=this._indexOfDelimiter(b);c=decodeURIComponent(escape(String.fromCharCode.apply(null,b.subarray(0,d))));e=this._options.codec.decode(b.subarray(d+1));}if(c.indexOf(a.INDICATOR)===0){c=c.substr(1);this._handleCommandMessage(c,e);}else{this._handleChannelMessage(c,e);}},_indexOfDelimiter:function(c){var d=a.DELIMITER.charCodeAt(0),b;for(b=0;b<c.length;b++){if(c[b]===d){return b;}}return-1;},_onSocketError:function(a){this.trigger(b.CONNECTION_ERROR,a);}});g.events=d({},b);g.defaults=d({},h);return g;}));
\ No newline at end of file
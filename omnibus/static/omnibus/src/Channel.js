@@ -21,6 +21,9 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		this._subscribed = false;
 		this._name = name;
 		this._connection = connection;
+		this._members = {};
+		this._memberCount = 0;
+		this._offset = null;
 		this._subscribe();
 	};
 
@@ -107,6 +110,111 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			}
 		},
 
+		/**
+		 * Returns the identifiers of the members of this channel. Returns null
+		 * if the channel has too many members to be delivered by the remote.
+		 * Members are only tracked for channels configured at the remote.
+		 *
+		 * @instance
+		 * @function getMembers
+		 * @memberof Channel
+		 * @returns {Array|null}
+		 *		is the list of member identifiers
+		 */
+		getMembers: function() {
+			var
+				members = [],
+				identifier
+			;
+
+			if (this._members === null) {
+				return null;
+			}
+
+			for (identifier in this._members) {
+				if (this._members.hasOwnProperty(identifier)) {
+					members.push(identifier);
+				}
+			}
+
+			return members;
+		},
+
+		/**
+		 * Returns the offset of the last message received on this channel.
+		 * Only messages of durable channels have an offset, it is used to
+		 * replay missed messages after reconnecting.
+		 *
+		 * @instance
+		 * @function getOffset
+		 * @memberof Channel
+		 * @returns {Number|null}
+		 *		is the offset of the last message or null
+		 */
+		getOffset: function() {
+			return this._offset;
+		},
+
+		/**
+		 * Returns the number of members of this channel.
+		 *
+		 * @instance
+		 * @function getMemberCount
+		 * @memberof Channel
+		 * @returns {Number}
+		 *		is the number of members
+		 */
+		getMemberCount: function() {
+			return this._memberCount;
+		},
+
+		/**
+		 * Handles the members of the channel or their changes, sent by the
+		 * remote after subscribing and when members join or leave.
+		 *
+		 * Will be called by connection.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handlePresence
+		 * @memberof Channel
+		 * @fires CHANNEL_PRESENCE
+		 * @param {Object} payload
+		 *		contains the member count and either all members, the joined
+		 *		and left members or none of them for large channels
+		 */
+		_handlePresence: function(payload) {
+			var
+				joined = payload.joined || [],
+				left = payload.left || [],
+				index
+			;
+
+			if (payload.members) {
+				this._members = {};
+				joined = payload.members;
+			} else if (!payload.joined && !payload.left) {
+				this._members = null;
+			}
+
+			if (this._members !== null) {
+				for (index = 0; index < joined.length; index++) {
+					this._members[joined[index]] = true;
+				}
+				for (index = 0; index < left.length; index++) {
+					delete(this._members[left[index]]);
+				}
+			}
+
+			this._memberCount = payload.count;
+			this.trigger(EventTypes.CHANNEL_PRESENCE, {
+				count: payload.count,
+				joined: payload.joined || [],
+				left: payload.left || [],
+				members: this.getMembers()
+			});
+		},
+
 		/**
 		 * Sends a message containing type and optional data through this
 		 * channel instance.
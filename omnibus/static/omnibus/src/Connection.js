@@ -5,7 +5,12 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			ignoreSender: true,
 			debug: false,
 			autoReconnect: true,
-			autoReconnectTimeout: 500
+			autoReconnectTimeout: 500,
+			autoReconnectMaxTimeout: 30000,
+			encoding: null,
+			codec: null,
+			batch: false,
+			batchTimeout: null
 		},
 		Connection
 	;
@@ -38,6 +43,10 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		this._options = extend({}, Defaults, options);
 		this._channels = {};
 		this._sendQueue = [];
+		this._batchQueue = [];
+		this._reconnectAttempts = 0;
+		this._calls = {};
+		this._callId = 0;
 		this._initializeConnection();
 	};
 
@@ -96,8 +105,15 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 				throw new Error('Connection already initialized.');
 			}
 
+			if (this._options.encoding && !this._options.codec) {
+				throw new Error('Provide a codec to decode the ' + this._options.encoding + ' encoding.');
+			}
+
 			this._log('info', 'Connecting');
 			this._socket = new this._transport(this._remote);
+			if (this._options.encoding) {
+				this._socket.binaryType = 'arraybuffer';
+			}
 			this._socket.onopen = proxy(this._onSocketOpen, this);
 			this._socket.onclose = proxy(this._onSocketClose, this);
 			this._socket.onmessage = proxy(this._onSocketMessage, this);
@@ -315,6 +331,36 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			return this._send(channel + Constants.DELIMITER + dumped, force);
 		},
 
+		/**
+		 * Calls a method at the remote. The callback is called with an error
+		 * message (or null) and the result once the remote responded. Calls
+		 * made before the connection is authenticated are queued.
+		 *
+		 * @instance
+		 * @function call
+		 * @memberof Connection
+		 * @param {String} method
+		 *		is the name of the method registered at the remote
+		 * @param {*} params
+		 *		are the parameters passed to the method
+		 * @param {Function} callback
+		 *		is called with the error message and the result
+		 * @returns {Boolean}
+		 *		describes if the call was send or is queued to be send
+		 *		in the future.
+		 */
+		call: function(method, params, callback) {
+			var
+				id = String(++this._callId),
+				message = Constants.INDICATOR + Constants.CALL + Constants.DELIMITER +
+					id + Constants.DELIMITER + method + Constants.DELIMITER +
+					JSON.stringify(params === undefined ? null : params)
+			;
+
+			this._calls[id] = {callback: callback, message: message};
+			return this._send(message);
+		},
+
 		/**
 		 * Sends a predefined message (command-message or channel-message) to
 		 * the remote. It finally ensures if the connection is created,
@@ -335,13 +381,68 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		_send: function(message, force) {
 			this._log('debug', 'Out: ' + message);
 			if (this._socket && this.isConnected() && (this.isAuthenticated() || force)) {
-				this._socket.send(message);
+				if (this._options.batch && !force) {
+					this._batch(message);
+				} else {
+					this._socket.send(message);
+				}
 			} else {
 				this._sendQueue.push(message);
 			}
 			return !!this._socket;
 		},
 
+		/**
+		 * Adds a message to the current batch. The batch is send with the
+		 * next animation frame or after the 'batchTimeout' option.
+		 *
+		 * @private
+		 * @instance
+		 * @function _batch
+		 * @memberof Connection
+		 * @param {String} message
+		 *		is the message to be send.
+		 */
+		_batch: function(message) {
+			this._batchQueue.push(message);
+			if (this._batchQueue.length > 1) {
+				return;
+			}
+
+			if (typeof this._options.batchTimeout !== 'number' && typeof window.requestAnimationFrame === 'function') {
+				window.requestAnimationFrame(proxy(this._flushBatch, this));
+			} else {
+				window.setTimeout(proxy(this._flushBatch, this), this._options.batchTimeout || 0);
+			}
+		},
+
+		/**
+		 * Sends all batched messages as a single batch command message.
+		 * When the connection was lost in the meantime, the messages are
+		 * queued up to be send after reconnecting.
+		 *
+		 * @private
+		 * @instance
+		 * @function _flushBatch
+		 * @memberof Connection
+		 */
+		_flushBatch: function() {
+			var messages = this._batchQueue;
+			this._batchQueue = [];
+
+			if (messages.length === 0) {
+				return;
+			}
+
+			if (!this._socket || !this.isConnected()) {
+				this._sendQueue = messages.concat(this._sendQueue);
+			} else if (messages.length === 1) {
+				this._socket.send(messages[0]);
+			} else {
+				this._socket.send(Constants.INDICATOR + Constants.BATCH + Constants.DELIMITER + JSON.stringify(messages));
+			}
+		},
+
 		/**
 		 * Flushes the send queue when messages previously couldn't be send.
 		 *
@@ -382,6 +483,221 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 				case Constants.UNSUBSCRIBE:
 					this._handleCommandUnsubscribe(message);
 					break;
+				case Constants.ENCODING:
+					this._handleCommandEncoding(message);
+					break;
+				case Constants.BATCH:
+					this._handleCommandBatch(message);
+					break;
+				case Constants.HEARTBEAT:
+					this._handleCommandHeartbeat(message);
+					break;
+				case Constants.RESUME:
+					this._handleCommandResume(message);
+					break;
+				case Constants.REPLAY:
+					this._handleCommandReplay(message);
+					break;
+				case Constants.PRESENCE:
+					this._handleCommandPresence(message);
+					break;
+				case Constants.DIRECT:
+					this._handleCommandDirect(message);
+					break;
+				case Constants.CALL:
+					this._handleCommandCall(message);
+					break;
+			}
+		},
+
+		/**
+		 * Handles the response to the resubscription of all channels after
+		 * a reconnect. If the remote doesn't support resuming, each channel
+		 * is subscribed on its own.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandResume
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandResume: function(message) {
+			var
+				channel,
+				channelName
+			;
+
+			for (channelName in this._channels) {
+				channel = this._channels[channelName];
+				if (!message.success || !message.payload) {
+					channel._subscribe();
+				} else if (message.payload.channels[channelName] === true) {
+					channel._handleSubscribed(message);
+				}
+			}
+		},
+
+		/**
+		 * Handles the end of the replay of a durable channel. If the remote
+		 * lost the messages of the channel, the offsets start over.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandReplay
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandReplay: function(message) {
+			var channel;
+
+			if (!message.success || !message.payload) {
+				return;
+			}
+
+			channel = this.getChannel(message.payload.channel);
+			if (channel && channel._offset !== null && message.payload.offset <= channel._offset) {
+				channel._offset = message.payload.offset - 1;
+			}
+		},
+
+		/**
+		 * Passes the response of a remote procedure call to its callback.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandCall
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandCall: function(message) {
+			var call;
+
+			if (!message.payload || !this._calls.hasOwnProperty(message.payload.id)) {
+				this._log('error', 'Unexpected call response');
+				return;
+			}
+
+			call = this._calls[message.payload.id];
+			delete(this._calls[message.payload.id]);
+			call.callback(message.success ? null : message.payload.error, message.payload.result);
+		},
+
+		/**
+		 * Fails the remote procedure calls which were sent but not answered
+		 * before the connection was lost. Queued calls are sent after
+		 * reconnecting.
+		 *
+		 * @private
+		 * @instance
+		 * @function _failCalls
+		 * @memberof Connection
+		 */
+		_failCalls: function() {
+			var
+				call,
+				id
+			;
+
+			for (id in this._calls) {
+				call = this._calls[id];
+				if (this._sendQueue.indexOf(call.message) === -1 && this._batchQueue.indexOf(call.message) === -1) {
+					delete(this._calls[id]);
+					call.callback('Disconnected', null);
+				}
+			}
+		},
+
+		/**
+		 * Handles a message sent directly to this connection. The message is
+		 * triggered on the connection itself using its type as event name.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandDirect
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandDirect: function(message) {
+			if (message.success && message.payload) {
+				this.trigger(message.payload.type, message.payload);
+			}
+		},
+
+		/**
+		 * Delegates the members of a channel and their changes to the channel.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandPresence
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandPresence: function(message) {
+			if (message.success && typeof message.payload.channel === 'string') {
+				var channel = this.getChannel(message.payload.channel);
+				if (channel) {
+					channel._handlePresence(message.payload);
+				}
+			}
+		},
+
+		/**
+		 * Answers the heartbeat of the remote, otherwise the remote closes
+		 * the connection after a while of silence.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandHeartbeat
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandHeartbeat: function(message) {
+			this.sendCommandMessage(Constants.HEARTBEAT, '', true);
+		},
+
+		/**
+		 * Handles a batch of messages send by the remote. Each message is
+		 * handled as if it was received on its own.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandBatch
+		 * @memberof Connection
+		 * @param {Array|Object} message
+		 *		is the list of messages or the response to a refused batch
+		 */
+		_handleCommandBatch: function(message) {
+			var index;
+
+			if (Object.prototype.toString.call(message) !== '[object Array]') {
+				return;
+			}
+
+			for (index = 0; index < message.length; index++) {
+				this._onSocketMessage({data: message[index]});
+			}
+		},
+
+		/**
+		 * Handles the encoding command message. When the remote refuses the
+		 * requested encoding, the connection keeps using JSON text frames.
+		 *
+		 * @private
+		 * @instance
+		 * @function _handleCommandEncoding
+		 * @memberof Connection
+		 * @param {Object} message
+		 *		is the command message to be handled
+		 */
+		_handleCommandEncoding: function(message) {
+			if (!message.success) {
+				this._log('info', 'Encoding ' + this._options.encoding + ' refused, using JSON');
 			}
 		},
 
@@ -399,6 +715,7 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		_handleCommandAuthenticate: function(message) {
 			if (message.success) {
 				this._authenticated = true;
+				this._reconnectAttempts = 0;
 				this.trigger(EventTypes.CONNECTION_AUTHENTICATED);
 				this._flushQueue();
 			}
@@ -452,24 +769,47 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		 * @memberof Connection
 		 * @param {String} channelName
 		 *		is the name of the channel which receives the message.
-		 * @param {Object} message
+		 * @param {Object|Array} message
 		 *		is the message object which contains all relevant data
-		 *		of the message send by the remote
+		 *		of the message send by the remote, or a list of them
 		 */
 		_handleChannelMessage: function(channelName, message) {
-			if (this._options.ignoreSender && message.sender === this._identifier) {
+			var index;
+
+			// The remote may publish several messages as a single list.
+			if (Object.prototype.toString.call(message) === '[object Array]') {
+				for (index = 0; index < message.length; index++) {
+					this._handleChannelMessage(channelName, message[index]);
+				}
 				return;
 			}
 
 			var channel = this.getChannel(channelName);
-			if (channel) {
-				channel.trigger(message.type, message);
+			if (!channel) {
+				return;
+			}
+
+			// Messages of durable channels have an offset. After resuming,
+			// the remote may deliver messages which were received already.
+			if (typeof message.offset === 'number') {
+				if (channel._offset !== null && message.offset <= channel._offset) {
+					return;
+				}
+				channel._offset = message.offset;
+			}
+
+			if (this._options.ignoreSender && message.sender === this._identifier) {
+				return;
 			}
+
+			channel.trigger(message.type, message);
 		},
 
 		/**
 		 * This performs the reconnection when a connection was closed before.
-		 * All registered channels will be subscribed again.
+		 * All registered channels will be subscribed again using a single
+		 * resume command. If durable channels received messages, the offsets
+		 * of all channels are sent to replay the missed messages.
 		 *
 		 * @private
 		 * @instance
@@ -478,16 +818,25 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 		 */
 		_handleReconnect: function() {
 			var
-				channel,
+				channelNames = [],
+				offsets = {},
+				durable = false,
 				channelName
 			;
 
 			this._initializeConnection();
 
-			// Handle re-subscribtion on each channel:
 			for (channelName in this._channels) {
-				channel = this._channels[channelName];
-				channel._subscribe();
+				if (!this._channels[channelName].isSubscribed()) {
+					channelNames.push(channelName);
+					offsets[channelName] = this._channels[channelName].getOffset();
+					durable = durable || offsets[channelName] !== null;
+				}
+			}
+
+			if (channelNames.length > 0) {
+				this.sendCommandMessage(
+					Constants.RESUME, JSON.stringify(durable ? offsets : channelNames));
 			}
 		},
 
@@ -513,22 +862,69 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			}
 
 			this.trigger(EventTypes.CONNECTION_CONNECTED);
+
+			// Request a binary encoding before authentication, so the
+			// authentication response already uses the negotiated encoding.
+			if (this._options.encoding) {
+				this.sendCommandMessage(Constants.ENCODING, this._options.encoding, true);
+			}
+
 			this.sendCommandMessage(Constants.AUTHENTICATE, authData, true);
 		},
 
+		/**
+		 * Returns the time in milliseconds to wait before reconnecting. The
+		 * time grows exponentially with each failed attempt, starting at
+		 * 'autoReconnectTimeout' and limited by 'autoReconnectMaxTimeout'.
+		 * A random time up to this limit is used ("full jitter"), so the
+		 * reconnects of all clients are spread when the remote restarts.
+		 * When the remote rejected the connection and asked to retry later,
+		 * the requested time is used and randomly extended by up to the
+		 * same amount.
+		 *
+		 * @private
+		 * @instance
+		 * @function _getReconnectTimeout
+		 * @memberof Connection
+		 * @param {CloseEvent} [event]
+		 *		is the close event of the socket connection
+		 * @returns {Number}
+		 */
+		_getReconnectTimeout: function(event) {
+			var
+				retryAfter,
+				timeout
+			;
+
+			if (event && event.code === Constants.CLOSE_RETRY_AFTER) {
+				retryAfter = parseInt(event.reason, 10) * 1000;
+				if (retryAfter > 0) {
+					return retryAfter + Math.random() * retryAfter;
+				}
+			}
+
+			timeout = Math.min(
+				this._options.autoReconnectMaxTimeout,
+				this._options.autoReconnectTimeout * Math.pow(2, this._reconnectAttempts)
+			);
+			return Math.random() * timeout;
+		},
+
 		/**
 		 * Is the eventhandler which is executed when the socket connection
 		 * closes, accidentally or not. When the 'autoReconnect' option is
-		 * enabled, the reconnect will be performed with the defined
-		 * 'autoReconnectTimeout'.
+		 * enabled, the reconnect will be performed after a randomized,
+		 * growing timeout or the time requested by the remote.
 		 *
 		 * @private
 		 * @instance
 		 * @function _onSocketClose
 		 * @memberof Connection
+		 * @param {CloseEvent} [event]
+		 *		is the close event of the socket connection
 		 * @fires CONNECTION_DISCONNECTED
 		 */
-		_onSocketClose: function() {
+		_onSocketClose: function(event) {
 			var
 				channel,
 				channelName
@@ -540,6 +936,7 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			this._authenticated = false;
 
 			this.trigger(EventTypes.CONNECTION_DISCONNECTED);
+			this._failCalls();
 
 			// Handle unsubscribtion on each channel:
 			for (channelName in this._channels) {
@@ -551,8 +948,9 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 				// Perform auto reconnect:
 				window.setTimeout(
 					proxy(this._handleReconnect, this),
-					this._options.autoReconnectTimeout
+					this._getReconnectTimeout(event)
 				);
+				this._reconnectAttempts++;
 			}
 		},
 
@@ -573,11 +971,22 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			this._log('debug', 'In: ' + message.data);
 			var
 				data = message.data,
-				delimiter = data.indexOf(Constants.DELIMITER),
-				name = data.substring(0, delimiter),
-				payload = JSON.parse(data.substring(delimiter + 1))
+				delimiter,
+				name,
+				payload
 			;
 
+			if (typeof data === 'string') {
+				delimiter = data.indexOf(Constants.DELIMITER);
+				name = data.substring(0, delimiter);
+				payload = JSON.parse(data.substring(delimiter + 1));
+			} else {
+				data = new Uint8Array(data);
+				delimiter = this._indexOfDelimiter(data);
+				name = decodeURIComponent(escape(String.fromCharCode.apply(null, data.subarray(0, delimiter))));
+				payload = this._options.codec.decode(data.subarray(delimiter + 1));
+			}
+
 			if (name.indexOf(Constants.INDICATOR) === 0) {
 				name = name.substr(1);
 				this._handleCommandMessage(name, payload);
@@ -586,6 +995,34 @@ define(['./utils/extend', './utils/proxy', './Constants', './EventBus', './Event
 			}
 		},
 
+		/**
+		 * Returns the position of the first delimiter in a binary frame. The
+		 * bytes before the delimiter contain the channel or command name.
+		 *
+		 * @private
+		 * @instance
+		 * @function _indexOfDelimiter
+		 * @memberof Connection
+		 * @param {Uint8Array} data
+		 *		is the binary frame send by the remote
+		 * @returns {Number}
+		 *		is the index of the delimiter
+		 */
+		_indexOfDelimiter: function(data) {
+			var
+				code = Constants.DELIMITER.charCodeAt(0),
+				index
+			;
+
+			for (index = 0; index < data.length; index++) {
+				if (data[index] === code) {
+					return index;
+				}
+			}
+
+			return -1;
+		},
+
 		/**
 		 * Is the eventhandler for occurring errors through the websocket
 		 * implementation. It just sends an event for external handlers.
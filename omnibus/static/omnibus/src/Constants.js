@@ -56,7 +56,104 @@ define(function() {
 		 * @default
 		 * @memberof Constants
 		 */
-		UNSUBSCRIBE: 'unsubscribe'
+		UNSUBSCRIBE: 'unsubscribe',
+
+		/**
+		 * Is the commandname that negotiates a binary encoding.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		ENCODING: 'encoding',
+
+		/**
+		 * Is the commandname that specifies a batch of messages.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		BATCH: 'batch',
+
+		/**
+		 * Is the commandname of the heartbeat send by the remote to
+		 * silent connections.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		HEARTBEAT: 'heartbeat',
+
+		/**
+		 * Is the commandname that resubscribes all channels of a
+		 * reconnected connection at once.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		RESUME: 'resume',
+
+		/**
+		 * Is the commandname that marks the end of the messages of a durable
+		 * channel replayed after resuming.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		REPLAY: 'replay',
+
+		/**
+		 * Is the commandname that delivers the members of a channel and
+		 * their changes.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		PRESENCE: 'presence',
+
+		/**
+		 * Is the commandname of messages sent by the remote directly to
+		 * this connection.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		DIRECT: 'direct',
+
+		/**
+		 * Is the commandname of remote procedure calls and their responses.
+		 *
+		 * @constant
+		 * @type {String}
+		 * @default
+		 * @memberof Constants
+		 */
+		CALL: 'call',
+
+		/**
+		 * Is the close code used by the remote to reject a connection. The
+		 * close reason contains the number of seconds to wait before
+		 * reconnecting.
+		 *
+		 * @constant
+		 * @type {Number}
+		 * @default
+		 * @memberof Constants
+		 */
+		CLOSE_RETRY_AFTER: 4429
 	};
 
 	return Constants;
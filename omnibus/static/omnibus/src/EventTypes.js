@@ -47,6 +47,16 @@ define(function() {
 		 */
 		CHANNEL_DESTROY: 'destroy',
 
+		/**
+		 * Notifies about joined and left members of the channel.
+		 *
+		 * @constant
+		 * @event CHANNEL_PRESENCE
+		 * @type Event
+		 * @memberof EventTypes
+		 */
+		CHANNEL_PRESENCE: 'presence',
+
 		/**
 		 * Notifies about an established connenction.
 		 *
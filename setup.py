@@ -25,7 +25,7 @@ test_requires = [
 install_requires = [
     'Django>=1.4',
     'pyzmq==14.1.1',
-    'tornado==3.1.1',
+    'tornado>=5.1,<7',
     'sockjs-tornado>=1.0.0',
 ]
 
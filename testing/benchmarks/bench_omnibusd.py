@@ -0,0 +1,444 @@
+"""
+Load-testing and benchmark harness for omnibusd.
+
+Runs a director and omnibusd in one process, the websocket clients in a second
+process and the publishers (using `omnibus.api.publish`) in further processes.
+All traffic stays on the loopback interface.
+
+The bus transport is selected with `--transport`: loopback tcp (the default),
+ipc sockets, or inproc, which runs the publishers as threads of the server
+process sharing its zmq context. The ``redis`` transport uses the Redis bus
+backend with the server given by `--redis-url` instead of a director.
+
+Usage (from the repository root):
+
+    python -m testing.benchmarks.bench_omnibusd --clients 10,100,1000 \\
+        --payloads 64,4096 --publishers 2 --messages 500
+
+    python -m testing.benchmarks.bench_omnibusd --idle --clients 1000,10000
+
+    python -m testing.benchmarks.bench_omnibusd --transport tcp,ipc,inproc
+
+    python -m testing.benchmarks.bench_omnibusd --transport tcp,redis \\
+        --redis-url redis://127.0.0.1:6379
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def configure(options):
+    """
+    `configure` sets up Django before any omnibus module is imported, the
+    omnibus settings are read at import time.
+    """
+    from django.conf import settings
+
+    backend = {}
+    if options['transport'] == 'redis':
+        backend = {
+            'OMNIBUS_PUBSUB_BACKEND': 'omnibus.redispubsub.RedisPubSub',
+            'OMNIBUS_REDIS_URL': options['redis_url'],
+        }
+
+    settings.configure(
+        SECRET_KEY='benchmark',
+        INSTALLED_APPS=('omnibus',),
+        OMNIBUS_SERVER_PORT=options['server_port'],
+        OMNIBUS_SUBSCRIBER_ADDRESS=options['subscriber_address'],
+        OMNIBUS_PUBLISHER_ADDRESS=options['publisher_address'],
+        OMNIBUS_SEND_BATCH_INTERVAL=options['batch_interval'],
+        OMNIBUS_COMPRESSION_ENABLED=options['compression'],
+        OMNIBUS_INPROC_ENABLED=options['transport'] == 'inproc',
+        **backend
+    )
+
+    import django
+    if hasattr(django, 'setup'):
+        django.setup()
+
+
+def process_stats(pid):
+    """
+    `process_stats` returns the resident memory in bytes and the consumed cpu
+    time in seconds of a process. Only available on Linux, returns None values
+    on other platforms.
+    """
+    try:
+        with open('/proc/{0}/statm'.format(pid)) as fp:
+            rss = int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        with open('/proc/{0}/stat'.format(pid)) as fp:
+            fields = fp.read().rsplit(')', 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / float(
+                os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError):
+        return None, None
+
+    return rss, cpu
+
+
+def transport_options(options, transport):
+    """
+    `transport_options` returns the options with the bus addresses of the
+    transport. Inproc uses tcp addresses, the director binds the inproc
+    addresses in addition.
+    """
+    options = dict(options, transport=transport)
+
+    if transport == 'ipc':
+        directory = tempfile.mkdtemp(prefix='omnibus-bench-')
+        options['subscriber_address'] = 'ipc://{0}/sub.sock'.format(directory)
+        options['publisher_address'] = 'ipc://{0}/pub.sock'.format(directory)
+    else:
+        options['subscriber_address'] = 'tcp://127.0.0.1:{0}'.format(free_port())
+        options['publisher_address'] = 'tcp://127.0.0.1:{0}'.format(free_port())
+
+    return options
+
+
+# SERVER ---------------------------------------------------------------------
+
+def run_server(options, ready, publish=None):
+    configure(options)
+
+    from omnibus import factories
+    from omnibus.backend import get_pubsub
+
+    pubsub = get_pubsub()
+    pubsub.init_director()
+
+    connection = factories.websocket_connection_factory(
+        factories.noopauthenticator_factory(), pubsub)
+    app = factories.websocket_webapp_factory(connection)
+    app.listen(options['server_port'], '127.0.0.1')
+
+    if publish is not None:
+        # Publishers of the inproc transport, (messages, payload size, start).
+        for _ in range(options['publishers']):
+            thread = threading.Thread(
+                target=run_inproc_publisher, args=(options, pubsub) + publish)
+            thread.daemon = True
+            thread.start()
+
+    pubsub.loop.add_callback(ready.set)
+    pubsub.loop.start()
+
+
+# CLIENTS --------------------------------------------------------------------
+
+def run_clients(options, count, expected, events, results):
+    from tornado import gen, ioloop, websocket
+
+    url = 'ws://127.0.0.1:{0}/ec'.format(options['server_port'])
+    latencies = []
+
+    @gen.coroutine
+    def connect(index):
+        conn = yield websocket.websocket_connect(url)
+        conn.write_message('!authenticate:bench-{0}'.format(index))
+        conn.write_message('!subscribe:bench')
+
+        # Wait for the subscribe acknowledgement.
+        while True:
+            msg = yield conn.read_message()
+            if msg.startswith('!subscribe:'):
+                break
+        raise gen.Return(conn)
+
+    def handle(msg, now):
+        if msg.startswith('!batch:'):
+            for item in json.loads(msg[7:]):
+                handle(item, now)
+        elif msg.startswith('bench:'):
+            payload = json.loads(msg[6:])['payload']
+            latencies.append(now - payload['ts'])
+
+    @gen.coroutine
+    def receive(conn):
+        received = 0
+        while received < expected:
+            msg = yield gen.with_timeout(
+                time.time() + options['timeout'], conn.read_message())
+            if msg is None:
+                break
+            before = len(latencies)
+            handle(msg, time.time())
+            received += len(latencies) - before
+        conn.close()
+
+    @gen.coroutine
+    def main():
+        conns = []
+        # Connect in small groups to avoid overflowing the listen backlog.
+        for offset in range(0, count, 50):
+            group = yield [connect(i) for i in range(offset, min(offset + 50, count))]
+            conns.extend(group)
+        events['connected'].set()
+
+        # Keep the connections open until the server was measured.
+        while not events['release'].is_set():
+            yield gen.sleep(0.05)
+
+        try:
+            yield [receive(conn) for conn in conns]
+        except gen.TimeoutError:
+            pass
+
+        results.put({'latencies': latencies, 'finished': time.time()})
+
+    ioloop.IOLoop.current().run_sync(main)
+
+
+# PUBLISHERS -----------------------------------------------------------------
+
+def run_publisher(options, messages, payload_size, start):
+    configure(options)
+
+    from omnibus import api
+
+    if options['transport'] != 'redis':
+        import zmq
+        from omnibus.settings import PUBLISHER_ADDRESS
+
+        # Connect early to let zmq establish the connection before publishing.
+        api.pubsub.get_connection(zmq.PUB, PUBLISHER_ADDRESS)
+    data = 'x' * payload_size
+
+    start.wait()
+    interval = 1.0 / options['rate'] if options['rate'] else 0
+    for _ in range(messages):
+        api.publish('bench', 'bench', {'ts': time.time(), 'data': data})
+        if interval:
+            time.sleep(interval)
+
+    # Give zmq some time to deliver the remaining messages.
+    time.sleep(0.5)
+
+
+def run_inproc_publisher(options, pubsub, messages, payload_size, start):
+    import zmq
+
+    # zmq sockets are not thread safe, every publisher thread uses its own
+    # socket of the server's context.
+    publisher = pubsub.context.socket(zmq.PUB)
+    publisher.connect(pubsub.publisher_address)
+    data = 'x' * payload_size
+
+    start.wait()
+    interval = 1.0 / options['rate'] if options['rate'] else 0
+    for _ in range(messages):
+        payload = {'ts': time.time(), 'data': data}
+        publisher.send_unicode(u'bench:{0}'.format(json.dumps(
+            pubsub.get_message('bench', payload))))
+        if interval:
+            time.sleep(interval)
+
+
+# SCENARIO -------------------------------------------------------------------
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(options, clients, payload_size):
+    messages = options['messages']
+    expected = messages * options['publishers']
+    inproc = options['transport'] == 'inproc'
+
+    start = multiprocessing.Event()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(options, ready, (messages, payload_size, start) if inproc else None))
+    server.start()
+    ready.wait(10)
+    idle_rss, _ = process_stats(server.pid)
+
+    events = {
+        'connected': multiprocessing.Event(),
+        'release': multiprocessing.Event(),
+    }
+    results = multiprocessing.Queue()
+    client = multiprocessing.Process(
+        target=run_clients, args=(options, clients, expected, events, results))
+    client.start()
+    events['connected'].wait(options['timeout'])
+    connected_rss, start_cpu = process_stats(server.pid)
+    events['release'].set()
+
+    publishers = [
+        multiprocessing.Process(
+            target=run_publisher, args=(options, messages, payload_size, start))
+        for _ in range(0 if inproc else options['publishers'])
+    ]
+    for publisher in publishers:
+        publisher.start()
+
+    # Wait for the publishers to connect, then start publishing.
+    time.sleep(1)
+    started = time.time()
+    start.set()
+
+    result = results.get(timeout=options['timeout'] + 30)
+    _, end_cpu = process_stats(server.pid)
+
+    for process in publishers + [client, server]:
+        process.terminate()
+        process.join()
+
+    latencies = sorted(result['latencies'])
+    duration = max(result['finished'] - started, 1e-9)
+    delivered = len(latencies)
+
+    report = {
+        'transport': options['transport'],
+        'clients': clients,
+        'payload': payload_size,
+        'delivered': delivered,
+        'expected': expected * clients,
+        'rate': delivered / duration,
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'memory': None,
+        'cpu': None,
+    }
+
+    if idle_rss is not None:
+        report['memory'] = (connected_rss - idle_rss) / float(clients)
+        report['cpu'] = (end_cpu - start_cpu) / max(delivered, 1) * 1e6
+
+    return report
+
+
+def run_idle_scenario(options, clients):
+    """
+    `run_idle_scenario` measures the server memory of authenticated and
+    subscribed connections which don't receive any messages.
+    """
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(options, ready))
+    server.start()
+    ready.wait(10)
+    idle_rss, _ = process_stats(server.pid)
+
+    events = {
+        'connected': multiprocessing.Event(),
+        'release': multiprocessing.Event(),
+    }
+    client = multiprocessing.Process(
+        target=run_clients,
+        args=(options, clients, 0, events, multiprocessing.Queue()))
+    client.start()
+    events['connected'].wait(options['timeout'])
+    # Let the server settle, e.g. finish pending writes.
+    time.sleep(1)
+    connected_rss, _ = process_stats(server.pid)
+
+    for process in (client, server):
+        process.terminate()
+        process.join()
+
+    return {
+        'clients': clients,
+        'rss': connected_rss,
+        'memory': (connected_rss - idle_rss) / float(clients),
+    }
+
+
+def format_report(report):
+    line = (
+        u'{transport:<9} {clients:>7} {payload:>8} {delivered:>9}/{expected:<9} {rate:>10.0f} '
+        u'{p50:>8.2f} {p99:>8.2f}')
+    extra = u' {memory:>10.0f} {cpu:>8.2f}' if report['memory'] is not None else u''
+    return (line + extra).format(**report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark omnibusd.')
+    parser.add_argument(
+        '--clients', default='10,100',
+        help='Comma separated numbers of websocket clients (fan-out).')
+    parser.add_argument(
+        '--payloads', default='64,1024',
+        help='Comma separated payload sizes in bytes.')
+    parser.add_argument(
+        '--publishers', type=int, default=1, help='Number of publisher processes.')
+    parser.add_argument(
+        '--messages', type=int, default=200, help='Messages per publisher.')
+    parser.add_argument(
+        '--rate', type=float, default=0,
+        help='Messages per second per publisher, 0 publishes as fast as possible.')
+    parser.add_argument(
+        '--batch-interval', type=int, default=None,
+        help='OMNIBUS_SEND_BATCH_INTERVAL for the server.')
+    parser.add_argument(
+        '--compression', action='store_true', help='Enable permessage-deflate.')
+    parser.add_argument(
+        '--timeout', type=float, default=30, help='Seconds to wait for messages.')
+    parser.add_argument(
+        '--transport', default='tcp',
+        help='Comma separated bus transports: tcp, ipc, inproc or redis.')
+    parser.add_argument(
+        '--redis-url', default='redis://127.0.0.1:6379',
+        help='Redis server of the redis transport.')
+    parser.add_argument(
+        '--idle', action='store_true',
+        help='Only measure the server memory per idle connection.')
+    args = parser.parse_args(argv)
+
+    options = {
+        'server_port': free_port(),
+        'publishers': args.publishers,
+        'messages': args.messages,
+        'rate': args.rate,
+        'batch_interval': args.batch_interval,
+        'compression': args.compression,
+        'timeout': args.timeout,
+        'redis_url': args.redis_url,
+    }
+
+    transports = args.transport.split(',')
+    for transport in transports:
+        if transport not in ('tcp', 'ipc', 'inproc', 'redis'):
+            parser.error(u'Invalid transport {0}'.format(transport))
+
+    if args.idle:
+        options = transport_options(options, transports[0])
+        print(u'clients   server rss  bytes/conn')
+        for clients in [int(c) for c in args.clients.split(',')]:
+            print(u'{clients:>7} {rss:>12} {memory:>11.0f}'.format(
+                **run_idle_scenario(options, clients)))
+            sys.stdout.flush()
+        return
+
+    print(
+        u'transport clients  payload  delivered/expected    msgs/s   p50 ms   p99 ms'
+        u'  bytes/conn  cpu us/msg')
+    for clients in [int(c) for c in args.clients.split(',')]:
+        for payload_size in [int(p) for p in args.payloads.split(',')]:
+            for transport in transports:
+                print(format_report(run_scenario(
+                    transport_options(options, transport), clients, payload_size)))
+                sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
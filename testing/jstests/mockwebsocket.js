@@ -45,6 +45,76 @@ define(dependencies,function(Constants) {
 			case Constants.INDICATOR + Constants.UNSUBSCRIBE:
 				this._handleCommandUnsubscribeResponse(message);
 				break;
+			case Constants.INDICATOR + Constants.BATCH:
+				this._handleCommandBatch(message);
+				break;
+			case Constants.INDICATOR + Constants.RESUME:
+				this._handleCommandResumeResponse(message);
+				break;
+			case Constants.INDICATOR + Constants.CALL:
+				this._handleCommandCallResponse(message);
+				break;
+		}
+	};
+
+	MockWebSocket.prototype._handleCommandCallResponse = function(message) {
+		var
+			parts = message.split(Constants.DELIMITER),
+			echo = (parts[1] === 'echo')
+		;
+
+		this.onmessage({
+			data: Constants.INDICATOR + Constants.CALL + Constants.DELIMITER + JSON.stringify({
+				type: Constants.CALL,
+				success: echo,
+				payload: {
+					id: parts[0],
+					result: echo ? JSON.parse(parts.slice(2).join(Constants.DELIMITER)) : null,
+					error: echo ? null : 'Unknown method ' + parts[1]
+				}
+			})
+		});
+	};
+
+	MockWebSocket.prototype._handleCommandResumeResponse = function(message) {
+		var
+			channels = JSON.parse(message),
+			result = {},
+			channel,
+			index
+		;
+
+		// Clients with durable channels send the offset per channel.
+		if (Object.prototype.toString.call(channels) !== '[object Array]') {
+			channels = [];
+			for (channel in JSON.parse(message)) {
+				channels.push(channel);
+			}
+		}
+
+		for (index = 0; index < channels.length; index++) {
+			result[channels[index]] = (channels[index] !== 'no-privileges');
+		}
+
+		this.onmessage({
+			data: Constants.INDICATOR + Constants.RESUME + Constants.DELIMITER + JSON.stringify({
+				type: Constants.RESUME,
+				success: true,
+				payload: {
+					channels: result
+				}
+			})
+		});
+	};
+
+	MockWebSocket.prototype._handleCommandBatch = function(message) {
+		var
+			messages = JSON.parse(message),
+			index
+		;
+
+		for (index = 0; index < messages.length; index++) {
+			MockWebSocket.prototype.send.call(this, messages[index]);
 		}
 	};
 
@@ -165,5 +165,46 @@ define(dependencies, function(getConnection, Channel, Connection) {
 				// which is send through the channel...
 			});
 		});
+
+		it('should track its members.', function() {
+			var	handlers = {onpresence: function() {}};
+
+			spyOn(handlers, 'onpresence');
+			channel.on(Connection.events.CHANNEL_PRESENCE, handlers.onpresence);
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				connection._onSocketMessage({data: '!presence:' + JSON.stringify({
+					type: 'presence',
+					success: true,
+					payload: {channel: 'test', count: 2, members: ['alice', 'bob']}
+				})});
+
+				expect(channel.getMembers()).toEqual(['alice', 'bob']);
+				expect(channel.getMemberCount()).toBe(2);
+
+				connection._onSocketMessage({data: '!presence:' + JSON.stringify({
+					type: 'presence',
+					success: true,
+					payload: {channel: 'test', count: 2, joined: ['carol'], left: ['alice']}
+				})});
+
+				expect(channel.getMembers()).toEqual(['bob', 'carol']);
+				expect(handlers.onpresence.calls.length).toBe(2);
+				expect(handlers.onpresence.calls[1].args[0].sender).toBe(channel);
+				expect(handlers.onpresence.calls[1].args[0].data.joined).toEqual(['carol']);
+				expect(handlers.onpresence.calls[1].args[0].data.left).toEqual(['alice']);
+
+				// Large channels only deliver the number of members.
+				connection._onSocketMessage({data: '!presence:' + JSON.stringify({
+					type: 'presence',
+					success: true,
+					payload: {channel: 'test', count: 500}
+				})});
+
+				expect(channel.getMembers()).toBe(null);
+				expect(channel.getMemberCount()).toBe(500);
+			});
+		});
 	});
 });
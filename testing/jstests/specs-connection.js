@@ -2,10 +2,11 @@
 
 var dependencies = [
 	'./factory',
+	'./mockwebsocket',
 	'../../omnibus/static/omnibus/src/Connection'
 ];
 
-define(dependencies, function(getConnection, Connection) {
+define(dependencies, function(getConnection, MockWebSocket, Connection) {
 	describe('connection', function() {
 		var connection;
 
@@ -261,5 +262,304 @@ define(dependencies, function(getConnection, Connection) {
 				connection.closeChannel(null);
 			}).toThrow();
 		});
+
+		it('should throw an error when an encoding is requested without codec.', function() {
+			expect(function() {
+				new Connection(MockWebSocket, 'http://fakedomain:1234', {encoding: 'msgpack'});
+			}).toThrow();
+		});
+
+		it('should request a binary encoding before authentication.', function() {
+			var encoded = new Connection(MockWebSocket, 'http://fakedomain:1234', {
+				encoding: 'msgpack',
+				codec: {decode: function() {}}
+			});
+			spyOn(encoded, 'sendCommandMessage').andCallThrough();
+
+			expect(encoded._socket.binaryType).toBe('arraybuffer');
+
+			waits(encoded._socket.timeout + 10);
+			runs(function() {
+				expect(encoded.sendCommandMessage.calls[0].args[0]).toBe('encoding');
+				expect(encoded.sendCommandMessage.calls[0].args[1]).toBe('msgpack');
+				expect(encoded.sendCommandMessage.calls[1].args[0]).toBe('authenticate');
+			});
+		});
+
+		it('should decode binary frames with the configured codec.', function() {
+			var
+				codec = {decode: function() { return {type: 'bar', payload: {}}; }},
+				encoded = new Connection(MockWebSocket, 'http://fakedomain:1234', {
+					encoding: 'msgpack',
+					codec: codec
+				}),
+				handlers = {onbar: function() {}},
+				frame = new Uint8Array([102, 111, 111, 58, 1, 2, 3])
+			;
+
+			spyOn(codec, 'decode').andCallThrough();
+			spyOn(handlers, 'onbar');
+			encoded.openChannel('foo').on('bar', handlers.onbar);
+
+			encoded._onSocketMessage({data: frame.buffer});
+
+			expect(codec.decode.calls.length).toBe(1);
+			expect(Array.prototype.slice.call(codec.decode.calls[0].args[0])).toEqual([1, 2, 3]);
+			expect(handlers.onbar.calls.length).toBe(1);
+		});
+
+		it('should send batched messages as a single frame.', function() {
+			var batched = new Connection(MockWebSocket, 'http://fakedomain:1234', {
+				batch: true,
+				batchTimeout: 10
+			});
+
+			waits(batched._socket.timeout + 10);
+			runs(function() {
+				spyOn(batched._socket, 'send').andCallThrough();
+
+				batched.openChannel('test1');
+				batched.openChannel('test2');
+				expect(batched._socket.send.calls.length).toBe(0);
+			});
+
+			waits(20);
+			runs(function() {
+				expect(batched._socket.send.calls.length).toBe(1);
+				expect(batched._socket.send.calls[0].args[0]).toBe('!batch:["!subscribe:test1","!subscribe:test2"]');
+				expect(batched.getChannel('test1').isSubscribed()).toBe(true);
+				expect(batched.getChannel('test2').isSubscribed()).toBe(true);
+			});
+		});
+
+		it('should handle batched messages from the remote.', function() {
+			var
+				handlers = {onbar: function() {}, onbaz: function() {}},
+				channel = connection.openChannel('foo')
+			;
+
+			spyOn(handlers, 'onbar');
+			spyOn(handlers, 'onbaz');
+			channel.on('bar', handlers.onbar);
+			channel.on('baz', handlers.onbaz);
+
+			connection._onSocketMessage({data: '!batch:' + JSON.stringify([
+				'foo:' + JSON.stringify({type: 'bar', payload: {}}),
+				'foo:' + JSON.stringify({type: 'baz', payload: {}})
+			])});
+
+			expect(handlers.onbar.calls.length).toBe(1);
+			expect(handlers.onbaz.calls.length).toBe(1);
+		});
+
+		it('should wait the time requested by the remote before reconnecting.', function() {
+			var timeout;
+
+			timeout = connection._getReconnectTimeout({code: 4429, reason: '5'});
+			expect(timeout).not.toBeLessThan(5000);
+			expect(timeout).not.toBeGreaterThan(10000);
+		});
+
+		it('should increase the reconnect timeout with each attempt.', function() {
+			var index;
+
+			for (index = 0; index < 100; index++) {
+				connection._reconnectAttempts = 0;
+				expect(connection._getReconnectTimeout()).not.toBeGreaterThan(500);
+				expect(connection._getReconnectTimeout({code: 1006, reason: ''})).not.toBeGreaterThan(500);
+
+				connection._reconnectAttempts = 3;
+				expect(connection._getReconnectTimeout()).not.toBeGreaterThan(4000);
+
+				connection._reconnectAttempts = 20;
+				expect(connection._getReconnectTimeout()).not.toBeGreaterThan(30000);
+			}
+		});
+
+		it('should resume all channels with a single command after reconnecting.', function() {
+			var
+				first = connection.openChannel('test1'),
+				second = connection.openChannel('test2')
+			;
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				expect(first.isSubscribed()).toBe(true);
+				expect(second.isSubscribed()).toBe(true);
+
+				connection._options.autoReconnect = false;
+				connection._socket.close();
+				expect(first.isSubscribed()).toBe(false);
+
+				connection._handleReconnect();
+				spyOn(connection._socket, 'send').andCallThrough();
+			});
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				expect(connection._socket.send.calls[1].args[0]).toBe('!resume:["test1","test2"]');
+				expect(first.isSubscribed()).toBe(true);
+				expect(second.isSubscribed()).toBe(true);
+			});
+		});
+
+		it('should subscribe each channel if the remote refuses to resume.', function() {
+			var channel = connection.openChannel('test1');
+
+			spyOn(channel, '_subscribe');
+			connection._onSocketMessage({data: '!resume:' + JSON.stringify({
+				type: 'resume',
+				success: false,
+				payload: null
+			})});
+
+			expect(channel._subscribe.calls.length).toBe(1);
+		});
+
+		it('should answer heartbeats of the remote.', function() {
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				spyOn(connection._socket, 'send');
+
+				connection._onSocketMessage({data: '!heartbeat:' + JSON.stringify({
+					type: 'heartbeat',
+					success: true,
+					payload: null
+				})});
+
+				expect(connection._socket.send.calls.length).toBe(1);
+				expect(connection._socket.send.calls[0].args[0]).toBe('!heartbeat:');
+			});
+		});
+
+		it('should trigger direct messages on the connection.', function() {
+			var handlers = {onhello: function() {}};
+
+			spyOn(handlers, 'onhello');
+			connection.on('hello', handlers.onhello);
+
+			connection._onSocketMessage({data: '!direct:' + JSON.stringify({
+				type: 'direct',
+				success: true,
+				payload: {sender: 'server', type: 'hello', payload: {text: 'Hello'}}
+			})});
+
+			expect(handlers.onhello.calls.length).toBe(1);
+			expect(handlers.onhello.calls[0].args[0].sender).toBe(connection);
+			expect(handlers.onhello.calls[0].args[0].data.payload.text).toBe('Hello');
+		});
+
+		it('should correlate call responses by id.', function() {
+			var handlers = {onecho: function() {}, onunknown: function() {}};
+
+			spyOn(handlers, 'onecho');
+			spyOn(handlers, 'onunknown');
+
+			// Calls are queued until the connection is authenticated.
+			connection.call('echo', {value: 1}, handlers.onecho);
+			connection.call('unknown', null, handlers.onunknown);
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				expect(handlers.onecho.calls.length).toBe(1);
+				expect(handlers.onecho.calls[0].args[0]).toBe(null);
+				expect(handlers.onecho.calls[0].args[1]).toEqual({value: 1});
+
+				expect(handlers.onunknown.calls.length).toBe(1);
+				expect(handlers.onunknown.calls[0].args[0]).toBe('Unknown method unknown');
+				expect(connection._calls).toEqual({});
+			});
+		});
+
+		it('should fail unanswered calls when disconnected.', function() {
+			var handlers = {oncall: function() {}};
+
+			spyOn(handlers, 'oncall');
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				connection._options.autoReconnect = false;
+				spyOn(connection._socket, 'send');
+				connection.call('echo', 1, handlers.oncall);
+				connection._onSocketClose({});
+
+				expect(handlers.oncall.calls.length).toBe(1);
+				expect(handlers.oncall.calls[0].args[0]).toBe('Disconnected');
+				expect(connection._calls).toEqual({});
+			});
+		});
+
+		it('should handle lists of channel messages.', function() {
+			var
+				handlers = {onchange: function() {}},
+				channel = connection.openChannel('models')
+			;
+
+			spyOn(handlers, 'onchange');
+			channel.on('article.updated', handlers.onchange);
+
+			connection._onSocketMessage({data: 'models:' + JSON.stringify([
+				{sender: null, type: 'article.updated', payload: {pk: 1}},
+				{sender: null, type: 'article.updated', payload: {pk: 2}}
+			])});
+
+			expect(handlers.onchange.calls.length).toBe(2);
+			expect(handlers.onchange.calls[1].args[0].data.payload.pk).toBe(2);
+		});
+
+		it('should drop messages of durable channels received already.', function() {
+			var
+				handlers = {onstatus: function() {}},
+				channel = connection.openChannel('orders')
+			;
+
+			spyOn(handlers, 'onstatus');
+			channel.on('status', handlers.onstatus);
+
+			connection._onSocketMessage({data: 'orders:' + JSON.stringify(
+				{offset: 4, sender: null, type: 'status', payload: {}})});
+			connection._onSocketMessage({data: 'orders:' + JSON.stringify(
+				{offset: 4, sender: null, type: 'status', payload: {}})});
+			connection._onSocketMessage({data: 'orders:' + JSON.stringify(
+				{offset: 5, sender: null, type: 'status', payload: {}})});
+
+			expect(handlers.onstatus.calls.length).toBe(2);
+			expect(channel.getOffset()).toBe(5);
+
+			// The remote lost the messages, offsets start over.
+			connection._onSocketMessage({data: '!replay:' + JSON.stringify({
+				type: 'replay',
+				success: true,
+				payload: {channel: 'orders', offset: 2}
+			})});
+			expect(channel.getOffset()).toBe(1);
+		});
+
+		it('should resume durable channels from their offsets.', function() {
+			var
+				first = connection.openChannel('orders'),
+				second = connection.openChannel('news')
+			;
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				connection._onSocketMessage({data: 'orders:' + JSON.stringify(
+					{offset: 7, sender: null, type: 'status', payload: {}})});
+
+				connection._options.autoReconnect = false;
+				connection._socket.close();
+
+				connection._handleReconnect();
+				spyOn(connection._socket, 'send').andCallThrough();
+			});
+
+			waits(connection._socket.timeout + 10);
+			runs(function() {
+				expect(connection._socket.send.calls[1].args[0]).toBe(
+					'!resume:{"orders":7,"news":null}');
+				expect(first.isSubscribed()).toBe(true);
+				expect(second.isSubscribed()).toBe(true);
+			});
+		});
 	});
 });
@@ -0,0 +1,125 @@
+"""
+A local stand-in for a Redis server, implementing the pub/sub commands used
+by `omnibus.redispubsub` on the RESP protocol.
+"""
+import socket
+import threading
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+
+def encode(reply):
+    if isinstance(reply, int):
+        return u':{0}\r\n'.format(reply).encode('ascii')
+    if isinstance(reply, list):
+        return u'*{0}\r\n'.format(len(reply)).encode('ascii') + b''.join(
+            encode(item) for item in reply)
+    return u'${0}\r\n'.format(len(reply)).encode('ascii') + reply + b'\r\n'
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        lock = threading.Lock()
+        self.channels = set()
+
+        def write(data):
+            with lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+
+        self.write = write
+        with server.lock:
+            server.clients.append(self)
+
+        try:
+            while True:
+                command = self.read_command()
+                if command is None:
+                    break
+                server.commands.append(command)
+                self.execute(command[0].upper(), command[1:])
+        except (socket.error, ValueError):
+            pass
+        finally:
+            with server.lock:
+                server.clients.remove(self)
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def execute(self, command, args):
+        server = self.server
+
+        if server.password and command != b'AUTH' and not getattr(self, 'authenticated', False):
+            self.write(b'-NOAUTH Authentication required.\r\n')
+        elif command == b'AUTH':
+            self.authenticated = args[0].decode('utf-8') == server.password
+            self.write(b'+OK\r\n' if self.authenticated else b'-ERR invalid password\r\n')
+        elif command == b'PING':
+            self.write(b'+PONG\r\n')
+        elif command == b'PUBLISH':
+            with server.lock:
+                receivers = [c for c in server.clients if args[0] in c.channels]
+            for client in receivers:
+                client.write(encode([b'message', args[0], args[1]]))
+            self.write(encode(len(receivers)))
+        elif command in (b'SUBSCRIBE', b'UNSUBSCRIBE'):
+            for channel in args:
+                if command == b'SUBSCRIBE':
+                    self.channels.add(channel)
+                else:
+                    self.channels.discard(channel)
+                self.write(encode([command.lower(), channel, len(self.channels)]))
+        else:
+            self.write(b'-ERR unknown command\r\n')
+
+
+class FakeRedis(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    `FakeRedis` listens on a free port of localhost in a background thread.
+    The received commands are kept in `commands`.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0), FakeRedisHandler)
+        self.password = password
+        self.lock = threading.Lock()
+        self.clients = []
+        self.commands = []
+
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        if self.password:
+            return u'redis://:{0}@{1}:{2}'.format(self.password, host, port)
+        return u'redis://{0}:{1}'.format(host, port)
+
+    def get_subscriptions(self):
+        with self.lock:
+            return set().union(*[client.channels for client in self.clients])
+
+    def stop(self):
+        self.shutdown()
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.connection.shutdown(socket.SHUT_RDWR)
+        self.server_close()
@@ -1,6 +1,25 @@
+import os
+import subprocess
+import sys
+
 import mock
 
-from omnibus.api import publish
+from omnibus.api import publish, send_to
+
+# Publishes without tornado, which is blocked from being imported.
+PUBLISHER_SCRIPT = """
+import sys
+sys.modules['tornado'] = None
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+from omnibus import api
+assert 'zmq' not in sys.modules
+assert api.publish('mychan', 'thetype') is True
+assert 'zmq' in sys.modules
+"""
 
 
 @mock.patch('omnibus.api.pubsub.publish')
@@ -9,3 +28,24 @@ def test_publish(publish_mock):
 
     assert result == publish_mock.return_value
     assert publish_mock.call_args[0] == ('mychan', 'thetype', {1: 2}, 'snd')
+    assert publish_mock.call_args[1] == {'ttl': None}
+
+
+@mock.patch('omnibus.api.pubsub.publish')
+def test_publish_ttl(publish_mock):
+    publish('mychan', 'thetype', ttl=30)
+    assert publish_mock.call_args[1] == {'ttl': 30}
+
+
+@mock.patch('omnibus.api.pubsub.send_to')
+def test_send_to(send_to_mock):
+    result = send_to('alice', 'thetype', payload={1: 2}, sender='snd')
+
+    assert result == send_to_mock.return_value
+    assert send_to_mock.call_args[0] == ('alice', 'thetype', {1: 2}, 'snd')
+
+
+def test_publish_without_tornado():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'testing.pytests.settings')
+    subprocess.check_call([sys.executable, '-c', PUBLISHER_SCRIPT], env=env)
@@ -1,7 +1,7 @@
 import pytest
 from django.contrib.auth.models import User
 
-from omnibus.authenticators import NoOpAuthenticator, UserAuthenticator
+from omnibus.authenticators import NoOpAuthenticator, UserAuthenticator, UserInfo
 
 
 class TestNoOpAuthenticator:
@@ -68,7 +68,14 @@ class TestUserAuthenticator:
             self.user.pk, UserAuthenticator.get_auth_token(self.user.pk)))
 
         assert obj.identifier == 'test123'
-        assert obj.user == self.user
+        assert obj.user == UserInfo(self.user.pk, False)
+
+    def test_init_user(self):
+        obj = UserAuthenticator('test123', self.user)
+
+        assert obj.user.pk == self.user.pk
+        assert obj.user.is_staff is False
+        assert not hasattr(obj, '__dict__')
 
     def test_get_auth_token(self, settings):
         settings.SECRET_KEY = 'test123key'
@@ -112,4 +119,5 @@ class TestUserAuthenticator:
 
         # Now as staff user
         self.user.is_staff = True
-        assert self.authed_instance.can_publish('anychannel') is True
+        staff_instance = UserAuthenticator('test123', self.user)
+        assert staff_instance.can_publish('anychannel') is True
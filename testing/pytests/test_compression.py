@@ -0,0 +1,158 @@
+import zlib
+
+import mock
+import pytest
+from tornado.iostream import StreamClosedError
+from tornado.websocket import WebSocketClosedError
+
+from omnibus.compression import FrameCompressor, OPCODE_TEXT, OPCODE_BINARY
+
+
+def get_handler(persistent=False):
+    handler = mock.Mock()
+    handler.ws_connection.is_closing.return_value = False
+    handler.ws_connection._compressor._max_wbits = 15
+    if not persistent:
+        handler.ws_connection._compressor._compressor = None
+    return handler
+
+
+def test_get_compression_options_disabled():
+    assert FrameCompressor(enabled=False).get_compression_options() is None
+
+
+def test_get_compression_options():
+    compressor = FrameCompressor(enabled=True, level=9, mem_level=4)
+    assert compressor.get_compression_options() == {
+        'compression_level': 9, 'mem_level': 4}
+
+
+def test_should_compress():
+    compressor = FrameCompressor(min_size=10, exempt_channels=['mouse'])
+    assert compressor.should_compress(b'chan:{"a":12345}') is True
+    assert compressor.should_compress(b'chan:{}') is False
+    assert compressor.should_compress(b'mousemoves:{"a":12345}') is False
+    assert compressor.should_compress(b'!subscribe:{"a":12345}') is True
+
+
+def test_compress_roundtrip():
+    compressor = FrameCompressor()
+    msg = b'chan:' + b'{"value":1234567890}' * 20
+
+    data = compressor.compress(msg, 15)
+    assert len(data) < len(msg)
+
+    decompressor = zlib.decompressobj(-15)
+    assert decompressor.decompress(data + b'\x00\x00\xff\xff') == msg
+
+
+def test_compress_cached():
+    compressor = FrameCompressor()
+    msg = b'chan:' + b'x' * 100
+
+    assert compressor.compress(msg, 15) is compressor.compress(msg, 15)
+    assert compressor.compress(msg, 10) is not compressor.compress(msg, 15)
+    assert len(compressor.cache) == 2
+
+
+def test_limit_window():
+    from tornado.websocket import _PerMessageDeflateCompressor
+
+    compressor = FrameCompressor(window_bits=9)
+    handler = mock.Mock()
+    handler.ws_connection._compressor = deflate = _PerMessageDeflateCompressor(True, 15)
+
+    compressor.limit_window(handler)
+    assert deflate._max_wbits == 9
+
+    # The client decompresses with the negotiated window.
+    decompressor = zlib.decompressobj(-15)
+    msg = b'chan:' + b'abcdefgh' * 200
+    for _ in range(2):
+        data = deflate.compress(msg)
+        assert decompressor.decompress(data + b'\x00\x00\xff\xff') == msg
+
+
+def test_limit_window_unchanged():
+    compressor = FrameCompressor(window_bits=15)
+    handler = get_handler(persistent=True)
+    handler.ws_connection._compressor._max_wbits = 10
+    context = handler.ws_connection._compressor._compressor
+
+    # Smaller windows negotiated by the client are kept.
+    compressor.limit_window(handler)
+    assert handler.ws_connection._compressor._max_wbits == 10
+    assert handler.ws_connection._compressor._compressor is context
+
+    # Without context takeover or negotiated compression, nothing to do.
+    compressor.window_bits = 9
+    handler = get_handler()
+    compressor.limit_window(handler)
+    assert handler.ws_connection._compressor._max_wbits == 15
+
+    handler.ws_connection._compressor = None
+    compressor.limit_window(handler)
+
+
+def test_write_message_not_negotiated():
+    compressor = FrameCompressor()
+    handler = mock.Mock()
+    handler.ws_connection._compressor = None
+
+    compressor.write_message(handler, 'chan:{}', binary=True)
+    assert handler.write_message.call_args == mock.call('chan:{}', binary=True)
+
+
+def test_write_message_unknown_internals():
+    compressor = FrameCompressor(min_size=100)
+    handler = get_handler()
+    del handler.ws_connection._write_frame
+
+    compressor.write_message(handler, 'chan:{}')
+    assert handler.write_message.call_args == mock.call('chan:{}', binary=False)
+
+    handler = get_handler()
+    del handler.ws_connection._compressor._max_wbits
+
+    compressor.write_message(handler, 'chan:{}')
+    assert handler.write_message.call_args == mock.call('chan:{}', binary=False)
+
+
+def test_write_message_small():
+    compressor = FrameCompressor(min_size=100)
+    handler = get_handler()
+
+    compressor.write_message(handler, 'chan:{}')
+    assert handler.write_message.called is False
+    assert handler.ws_connection._write_frame.call_args == mock.call(
+        True, OPCODE_TEXT, b'chan:{}', flags=0)
+
+
+def test_write_message_shared():
+    compressor = FrameCompressor(min_size=10)
+    handler = get_handler()
+    msg = b'chan:' + b'x' * 100
+
+    compressor.write_message(handler, msg, binary=True)
+    assert handler.ws_connection._write_frame.call_args == mock.call(
+        True, OPCODE_BINARY, compressor.compress(msg, 15),
+        flags=handler.ws_connection.RSV1)
+
+
+def test_write_message_context_takeover():
+    compressor = FrameCompressor(min_size=10)
+    handler = get_handler(persistent=True)
+    msg = b'chan:' + b'x' * 100
+
+    compressor.write_message(handler, msg)
+    assert handler.ws_connection._write_frame.called is False
+    assert handler.write_message.call_args == mock.call(msg, binary=False)
+
+
+def test_write_message_closed():
+    compressor = FrameCompressor(min_size=100)
+    handler = get_handler()
+    handler.ws_connection._write_frame.side_effect = StreamClosedError
+
+    with pytest.raises(WebSocketClosedError):
+        compressor.write_message(handler, 'chan:{}')
@@ -1,9 +1,16 @@
 import json
+import time
 
 import mock
+from concurrent.futures import Future
 
 from omnibus.authenticators import NoOpAuthenticator
-from omnibus.connection import MessageConnection, LOG_LEVELS
+from omnibus.connection import MessageConnection, LOG_LEVELS, CLOSE_RETRY_AFTER
+from omnibus.direct import DirectRouter
+from omnibus.exceptions import OmnibusRPCException
+from omnibus.presence import Presence
+from omnibus.ratelimit import RateLimiter
+from omnibus.registry import ConnectionRegistry
 
 
 class MockConnection(object):
@@ -12,9 +19,16 @@ class MockConnection(object):
         self.send_mock = mock.Mock()
         self.pubsub = mock.Mock()
         self.command_testcommand = mock.Mock()
+        self.registry = ConnectionRegistry()
+        self.presence = Presence(channels=('room',))
+        self.presence.enabled = True
+        self.router = DirectRouter()
+        self.rpc = mock.Mock()
+        self.close = mock.Mock()
+        self.close_transport = mock.Mock()
 
     def send(self, *args, **kwargs):
-        self.send_mock(*args, **kwargs)
+        return self.send_mock(*args, **kwargs)
 
 
 class MockedMessageConnection(MessageConnection, MockConnection):
@@ -29,6 +43,12 @@ class TestConnection:
     def test_init(self):
         assert self.con.authenticator is None
         assert self.con.subscriber is None
+        assert self.con.encoding is None
+
+    def test_slots(self):
+        # Slots are used for the connection state, not the instance dict.
+        assert 'subscriber' not in self.con.__dict__
+        assert 'authenticator' not in self.con.__dict__
 
     def test_log(self):
         LOG_LEVELS['debug'] = mock.Mock()
@@ -50,18 +70,30 @@ class TestConnection:
         assert self.con.subscriber == self.con.pubsub.get_subscriber.return_value
 
     def test_on_close(self):
-        self.con.subscriber = mock.Mock()
+        subscriber = self.con.subscriber = mock.Mock()
+        subscriber.channels = []
+        self.con.send_buffer = [('test123:test', None)]
         self.con.on_close()
+        assert self.con.send_buffer == []
         assert self.con.pubsub.close_subscriber.called is True
         assert self.con.pubsub.close_subscriber.call_args[0] == (
-            self.con.subscriber,)
+            subscriber,)
+        assert self.con.subscriber is None
 
     def test_on_error(self):
-        self.con.subscriber = mock.Mock()
+        subscriber = self.con.subscriber = mock.Mock()
+        subscriber.channels = []
         self.con.on_error(Exception())
         assert self.con.pubsub.close_subscriber.called is True
         assert self.con.pubsub.close_subscriber.call_args[0] == (
-            self.con.subscriber,)
+            subscriber,)
+
+    def test_on_error_and_close(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.on_error(Exception())
+        self.con.on_close()
+        assert self.con.pubsub.close_subscriber.call_count == 1
 
     @mock.patch('omnibus.connection.MessageConnection.on_channel_message')
     @mock.patch('omnibus.connection.MessageConnection.on_command_message')
@@ -86,6 +118,39 @@ class TestConnection:
         assert self.con.send_mock.call_count == 1
         assert self.con.send_mock.call_args[0] == ('test123:test',)
 
+    @mock.patch('omnibus.connection.metrics')
+    def test_on_subscriber_message_metrics(self, metrics_mock):
+        self.con.on_subscriber_message([b'test123:{}'])
+        assert metrics_mock.messages_sent.inc.call_args == mock.call(label=u'test123')
+
+    def test_on_subscriber_message_internal(self):
+        self.con.on_subscriber_message([b'!direct:"alice":{"type":"secret"}'])
+        self.con.on_subscriber_message([b'!director:{}'])
+        assert self.con.send_mock.call_count == 0
+
+    def test_on_subscriber_message_encoded(self):
+        self.con.encoding = mock.Mock()
+        self.con.encoding.transcode.return_value = b'test123:\x80'
+        self.con.on_subscriber_message([b'test123:{}'])
+        assert self.con.encoding.transcode.call_args[0] == (b'test123:{}',)
+        assert self.con.send_mock.call_args[0] == (
+            self.con.encoding.transcode.return_value,)
+
+    @mock.patch('omnibus.expiry.metrics')
+    def test_on_subscriber_message_expired(self, metrics_mock):
+        self.con.encoding = mock.Mock()
+        self.con.on_subscriber_message([u'test123:{{"expires":{0},"type":"t"}}'.format(
+            time.time() - 1).encode('utf-8')])
+        assert self.con.encoding.transcode.called is False
+        assert self.con.send_mock.called is False
+        assert metrics_mock.expired.inc.call_args == mock.call(label='subscriber')
+
+    def test_on_subscriber_message_encoding_error(self):
+        self.con.encoding = mock.Mock()
+        self.con.encoding.transcode.side_effect = ValueError
+        self.con.on_subscriber_message([b'test123:invalid'])
+        assert self.con.send_mock.call_count == 0
+
     def test_on_command_message_unkown(self):
         self.con.on_command_message('nocommand', 'test')
         assert self.con.send_mock.call_count == 1
@@ -161,6 +226,75 @@ class TestConnection:
         assert command == 'authenticate'
         assert json.loads(args) == {'success': True, 'type': 'authenticate', 'payload': None}  # noqa
 
+    def test_authenticate_router(self):
+        self.con.command_authenticate('alice')
+        assert self.con.router.connections == {'alice': set([self.con])}
+
+        # Authenticating again replaces the identifier.
+        self.con.command_authenticate('bob')
+        assert self.con.router.connections == {'bob': set([self.con])}
+
+        self.con.close_connection()
+        assert self.con.router.connections == {}
+
+    def get_call_response(self):
+        command, args = self.con.send_mock.call_args[0][0][1:].split(':', 1)
+        assert command == 'call'
+        return json.loads(args)
+
+    def test_call(self):
+        self.con.subscriber = mock.Mock()
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.command_call('1:add:{"a": 1}')
+
+        method, authenticator, params, callback = self.con.rpc.submit.call_args[0]
+        assert (method, authenticator, params) == ('add', self.con.authenticator, {'a': 1})
+
+        future = Future()
+        future.set_result(2)
+        callback(future)
+        assert self.get_call_response() == {'type': 'call', 'success': True, 'payload': {
+            'id': '1', 'result': 2, 'error': None}}
+
+    def test_call_errors(self):
+        self.con.subscriber = mock.Mock()
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.command_call('1:add:{}')
+        callback = self.con.rpc.submit.call_args[0][3]
+
+        future = Future()
+        future.set_exception(OmnibusRPCException('Invalid'))
+        callback(future)
+        assert self.get_call_response()['payload']['error'] == 'Invalid'
+
+        # Other exceptions are not exposed.
+        future = Future()
+        future.set_exception(KeyError('secret'))
+        callback(future)
+        assert self.get_call_response()['payload']['error'] == 'Internal error'
+
+        future = Future()
+        future.set_result(object())
+        callback(future)
+        assert self.get_call_response()['payload']['error'] == 'Invalid result'
+
+        # Closed connections don't get a response.
+        self.con.subscriber = None
+        callback(future)
+        assert self.con.send_mock.call_count == 3
+
+    def test_call_refused(self):
+        self.con.command_call('invalid')
+        assert self.get_call_response() == {'type': 'call', 'success': False, 'payload': None}
+
+        self.con.command_call('1:add:{}')
+        assert self.get_call_response()['payload']['error'] == 'Not authenticated'
+
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.rpc.submit.side_effect = OmnibusRPCException('Unknown method add')
+        self.con.command_call('1:add:{}')
+        assert self.get_call_response()['payload']['error'] == 'Unknown method add'
+
     def test_subscribe_already_subscribed(self):
         self.con.subscriber = mock.Mock()
         self.con.subscriber.channels = ['mychan']
@@ -201,6 +335,191 @@ class TestConnection:
         assert self.con.pubsub.subscribe.call_args[0] == (
             self.con.subscriber, 'mychan',)
 
+    def test_subscribe_internal(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.can_subscribe.return_value = True
+
+        self.con.command_subscribe('!presence')
+        assert self.con.pubsub.subscribe.call_count == 0
+
+    def test_subscribe_empty(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.can_subscribe.return_value = True
+
+        self.con.command_subscribe('')
+        assert self.con.pubsub.subscribe.call_count == 0
+        assert json.loads(self.con.send_mock.call_args[0][0].split(':', 1)[1])[
+            'success'] is False
+
+    def test_subscribe_presence(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.pubsub.subscribe.return_value = True
+        self.con.presence.members['room1'] = {'bob': set(['node'])}
+
+        self.con.command_subscribe('room1')
+        assert self.con.presence.subscribers == {'room1': {self.con: 'alice'}}
+        assert self.con.presence.pending == {'room1': {'alice': True}}
+
+        # The snapshot is sent after subscribing.
+        command, args = self.con.send_mock.call_args_list[0][0][0][1:].split(':', 1)
+        assert command == 'presence'
+        assert json.loads(args)['payload'] == {
+            'channel': 'room1', 'count': 1, 'members': ['bob']}
+        assert self.con.send_mock.call_args_list[1][0][0].startswith('!subscribe:')
+
+        # Channels without presence tracking.
+        self.con.command_subscribe('other')
+        assert 'other' not in self.con.presence.subscribers
+        assert self.con.send_mock.call_count == 3
+
+    def test_unsubscribe_presence(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.pubsub.subscribe.return_value = True
+        self.con.pubsub.unsubscribe.return_value = True
+
+        self.con.command_subscribe('room1')
+        self.con.subscriber.channels = ['room1']
+        self.con.command_unsubscribe('room1')
+        assert self.con.presence.subscribers == {}
+        assert self.con.presence.pending == {'room1': {'alice': False}}
+
+    def test_close_presence(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.pubsub.subscribe.return_value = True
+
+        self.con.command_subscribe('room1')
+        self.con.subscriber.channels = ['room1']
+        self.con.close_connection()
+        assert self.con.presence.subscribers == {}
+        assert self.con.presence.local == {}
+
+    def test_resume(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.can_subscribe.side_effect = lambda c: c != 'private'
+        self.con.pubsub.subscribe.return_value = True
+
+        self.con.command_resume(json.dumps(['chan1', 'private', 'chan2', 42]))
+        assert [c[0][1] for c in self.con.pubsub.subscribe.call_args_list] == [
+            'chan1', 'chan2']
+
+        # A single response for all channels.
+        assert self.con.send_mock.call_count == 1
+        command, args = self.con.send_mock.call_args[0][0][1:].split(':', 1)
+        assert command == 'resume'
+        assert json.loads(args) == {'success': True, 'type': 'resume', 'payload': {
+            'channels': {'chan1': True, 'private': False, 'chan2': True}}}
+
+    def test_resume_invalid(self):
+        for args in ('invalid', '"chan"'):
+            self.con.command_resume(args)
+            assert json.loads(self.con.send_mock.call_args[0][0][8:]) == {
+                'success': False, 'type': 'resume', 'payload': None}
+        assert self.con.pubsub.subscribe.called is False
+
+    def prepare_replay(self):
+        self.con.durable_channels = ('orders',)
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.can_subscribe.return_value = True
+
+        def subscribe(subscriber, channel):
+            subscriber.channels.append(channel)
+            return True
+
+        self.con.pubsub.subscribe.side_effect = subscribe
+
+    def test_resume_offsets(self):
+        self.prepare_replay()
+
+        self.con.command_resume(json.dumps({
+            'orders-1': 41, 'orders-2': None, 'news': 3, 'orders-3': 'x'}))
+        assert sorted(self.con.subscriber.channels) == ['news', 'orders-1', 'orders-2', 'orders-3']
+        assert self.con.send_mock.call_args[0][0].startswith('!resume:')
+
+        # Only durable channels with a valid offset are replayed.
+        assert self.con.pubsub.replay.call_count == 1
+        assert self.con.pubsub.replay.call_args[0][:2] == ('orders-1', 42)
+        assert self.con.replaying == {b'orders-1': []}
+
+    def test_replay(self):
+        self.prepare_replay()
+        self.con.command_resume(json.dumps({'orders-1': 41}))
+        callback = self.con.pubsub.replay.call_args[0][2]
+        self.con.send_mock.reset_mock()
+
+        # Live messages are held back during the replay.
+        self.con.on_subscriber_message([b'orders-1:{"offset":44}'])
+        self.con.on_subscriber_message([b'news:{}'])
+        assert self.con.send_mock.call_args_list == [mock.call(b'news:{}')]
+
+        callback([b'orders-1:{"offset":42}'], 43, True)
+        assert self.con.pubsub.replay.call_args[0][:2] == ('orders-1', 43)
+        callback = self.con.pubsub.replay.call_args[0][2]
+
+        callback([b'orders-1:{"offset":43}', b'orders-1:{"offset":44}'], 45, False)
+        sent = [c[0][0] for c in self.con.send_mock.call_args_list[1:]]
+        assert sent[:3] == [
+            b'orders-1:{"offset":42}', b'orders-1:{"offset":43}', b'orders-1:{"offset":44}']
+        assert json.loads(sent[3].split(':', 1)[1]) == {
+            'type': 'replay', 'success': True, 'payload': {'channel': 'orders-1', 'offset': 45}}
+        assert sent[4] == b'orders-1:{"offset":44}'
+        assert self.con.replaying == {}
+
+        self.con.on_subscriber_message([b'orders-1:{"offset":45}'])
+        assert self.con.send_mock.call_args[0][0] == b'orders-1:{"offset":45}'
+
+    def test_replay_failed(self):
+        self.prepare_replay()
+        self.con.command_resume(json.dumps({'orders-1': 41}))
+        self.con.on_subscriber_message([b'orders-1:{"offset":44}'])
+
+        self.con.pubsub.replay.call_args[0][2](None, 42, False)
+        response = self.con.send_mock.call_args_list[-2][0][0]
+        assert json.loads(response.split(':', 1)[1])['success'] is False
+        assert self.con.send_mock.call_args[0][0] == b'orders-1:{"offset":44}'
+
+    def test_replay_closed(self):
+        self.prepare_replay()
+        self.con.command_resume(json.dumps({'orders-1': 41}))
+        self.con.send_mock.reset_mock()
+
+        self.con.subscriber = None
+        self.con.pubsub.replay.call_args[0][2]([b'orders-1:{"offset":42}'], 43, False)
+        assert self.con.send_mock.called is False
+
+    def test_subscribe_interned(self):
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.can_subscribe.return_value = True
+        self.con.pubsub.subscribe.return_value = True
+
+        self.con.command_subscribe(''.join(['my', 'chan']))
+        other = MockedMessageConnection()
+        other.prepare_mock()
+        other.pubsub.subscribe.return_value = True
+        other.subscriber = mock.Mock()
+        other.subscriber.channels = []
+        other.authenticator = self.con.authenticator
+
+        other.command_subscribe(''.join(['my', 'chan']))
+        assert (
+            self.con.pubsub.subscribe.call_args[0][1]
+            is other.pubsub.subscribe.call_args[0][1])
+
     def test_unsubscribe_not_subscribed(self):
         self.con.subscriber = mock.Mock()
         self.con.subscriber.channels = ['mychan2']
@@ -240,3 +559,408 @@ class TestConnection:
         assert self.con.pubsub.unsubscribe.call_count == 1
         assert self.con.pubsub.unsubscribe.call_args[0] == (
             self.con.subscriber, 'mychan',)
+
+    def test_respond_command_encoded(self):
+        self.con.encoding = mock.Mock()
+        self.con.encoding.encode.return_value = b'!subscribe:\x80'
+        self.con.respond_command('subscribe', True, {'channel': 'mychan'})
+
+        assert self.con.encoding.encode.call_args[0] == ('!subscribe', {
+            'type': 'subscribe', 'success': True, 'payload': {'channel': 'mychan'}})
+        assert self.con.send_mock.call_args[0] == (
+            self.con.encoding.encode.return_value,)
+
+    def test_send_command_frame(self):
+        self.con.send_command_frame('!presence:{}', 'presence', {'count': 1})
+        assert self.con.send_mock.call_args[0] == ('!presence:{}',)
+
+    def test_send_command_frame_encoded(self):
+        self.con.encoding = mock.Mock()
+        self.con.encoding.encode.return_value = b'!presence:\x80'
+        self.con.send_command_frame('!presence:{}', 'presence', {'count': 1})
+
+        assert self.con.encoding.encode.call_args[0] == ('!presence', {
+            'type': 'presence', 'success': True, 'payload': {'count': 1}})
+        assert self.con.send_mock.call_args[0] == (b'!presence:\x80',)
+
+    def test_encoding_not_supported(self):
+        self.con.command_encoding('msgpack')
+        assert self.con.encoding is None
+
+        msg = self.con.send_mock.call_args[0]
+        command, args = msg[0][1:].split(':', 1)
+        assert command == 'encoding'
+        assert json.loads(args) == {'success': False, 'type': 'encoding', 'payload': {'encoding': 'msgpack'}}  # noqa
+
+    @mock.patch('omnibus.connection.get_encoding')
+    def test_encoding_unknown(self, get_mock):
+        get_mock.return_value = None
+        self.con.binary_supported = True
+        self.con.command_encoding('unknown')
+        assert self.con.encoding is None
+        assert get_mock.call_args[0] == ('unknown',)
+
+    @mock.patch('omnibus.connection.get_encoding')
+    def test_encoding(self, get_mock):
+        self.con.binary_supported = True
+        self.con.command_encoding('msgpack')
+        assert self.con.encoding == get_mock.return_value
+
+        # The response is sent before switching the encoding.
+        msg = self.con.send_mock.call_args[0]
+        command, args = msg[0][1:].split(':', 1)
+        assert command == 'encoding'
+        assert json.loads(args)['success'] is True
+
+    @mock.patch('omnibus.connection.MessageConnection.on_message')
+    def test_batch(self, message_mock):
+        self.con.command_batch(json.dumps([
+            '!subscribe:mychan', 'mychan:{}', '!batch:[]', '', 1]))
+
+        assert message_mock.call_count == 2
+        assert message_mock.call_args_list[0][0] == ('!subscribe:mychan',)
+        assert message_mock.call_args_list[1][0] == ('mychan:{}',)
+        assert self.con.send_mock.call_count == 0
+
+    @mock.patch('omnibus.connection.MessageConnection.on_message')
+    def test_batch_invalid(self, message_mock):
+        self.con.command_batch('{"invalid": true}')
+        self.con.command_batch('invalid')
+
+        assert message_mock.call_count == 0
+        assert self.con.send_mock.call_count == 2
+
+        msg = self.con.send_mock.call_args[0]
+        command, args = msg[0][1:].split(':', 1)
+        assert command == 'batch'
+        assert json.loads(args) == {'success': False, 'type': 'batch', 'payload': None}  # noqa
+
+    def test_batch_on_message(self):
+        self.con.command_subscribe = mock.Mock()
+        self.con.on_message('!batch:["!subscribe:a", "!subscribe:b"]')
+
+        assert self.con.command_subscribe.call_count == 2
+        assert self.con.command_subscribe.call_args[0] == ('b',)
+
+    def test_send_batched_next_iteration(self):
+        self.con.send_batch_interval = 0
+
+        self.con.send('test1:{}')
+        self.con.send(b'test2:{}')
+        assert self.con.send_mock.call_count == 0
+        assert self.con.pubsub.loop.add_callback.call_args[0] == (
+            self.con.flush_send_buffer,)
+        assert self.con.pubsub.loop.add_callback.call_count == 1
+
+        self.con.flush_send_buffer()
+        assert self.con.send_mock.call_count == 1
+
+        msg = self.con.send_mock.call_args[0]
+        command, args = msg[0][1:].split(':', 1)
+        assert command == 'batch'
+        assert json.loads(args) == ['test1:{}', 'test2:{}']
+
+    def test_send_batched_interval(self):
+        self.con.send_batch_interval = 20
+
+        self.con.send('test1:{}')
+        assert self.con.pubsub.loop.call_later.call_args[0] == (
+            0.02, self.con.flush_send_buffer)
+
+        self.con.flush_send_buffer()
+        assert self.con.send_mock.call_args[0] == ('test1:{}',)
+
+        # Nothing left to flush.
+        self.con.flush_send_buffer()
+        assert self.con.send_mock.call_count == 1
+
+    def test_send_batched_expired(self):
+        self.con.send_batch_interval = 20
+
+        self.con.send_message(
+            u'test1:{{"expires":{0}}}'.format(time.time() + 0.01).encode('utf-8'))
+        self.con.send_message(b'test2:{}')
+        time.sleep(0.02)
+
+        self.con.flush_send_buffer()
+        assert self.con.send_mock.call_args_list == [mock.call(b'test2:{}')]
+
+    def test_send_batched_encoded(self):
+        self.con.send_batch_interval = 0
+        self.con.encoding = mock.Mock()
+
+        self.con.send(b'test1:binary')
+        assert self.con.send_mock.call_args[0] == (b'test1:binary',)
+        assert self.con.pubsub.loop.add_callback.called is False
+
+    def test_respond_command_priority(self):
+        self.con.send_batch_interval = 0
+
+        self.con.send('test1:{}')
+        self.con.respond_command('subscribe', True, {'channel': 'test2'})
+        self.con.respond_command('replay', True, {'channel': 'test1', 'offset': 1})
+
+        # Control responses jump the queue, other responses keep their order.
+        assert self.con.send_mock.call_count == 1
+        assert self.con.send_mock.call_args[0][0].startswith('!subscribe:')
+        assert self.con.send_buffer[0] == ('test1:{}', None)
+        assert self.con.send_buffer[1][0].startswith('!replay:')
+
+    def get_write_futures(self):
+        futures = []
+
+        def send(msg):
+            futures.append(Future())
+            return futures[-1]
+
+        self.con.send_mock.side_effect = send
+        return futures
+
+    def test_send_window(self):
+        self.con.send_window = 2
+        futures = self.get_write_futures()
+
+        for index in range(4):
+            self.con.send(u'test{0}:{{}}'.format(index))
+        assert self.con.send_mock.call_count == 2
+        assert self.con.send_buffer == [('test2:{}', None), ('test3:{}', None)]
+
+        self.con.respond_command('heartbeat', True)
+        assert self.con.send_mock.call_count == 3
+        assert self.con.pending_frames == 2
+
+        # Waiting messages are sent as a batch, once a frame was sent.
+        futures[0].set_result(None)
+        assert self.con.send_buffer == []
+        assert self.con.pending_frames == 2
+        command, args = self.con.send_mock.call_args[0][0][1:].split(':', 1)
+        assert command == 'batch'
+        assert json.loads(args) == ['test2:{}', 'test3:{}']
+
+        futures[1].set_exception(IOError())
+        futures[3].set_result(None)
+        assert self.con.pending_frames == 0
+
+    def test_send_window_encoded(self):
+        self.con.send_window = 2
+        self.con.encoding = mock.Mock()
+        futures = self.get_write_futures()
+
+        for index in range(5):
+            self.con.send(u'test{0}:binary'.format(index).encode('utf-8'))
+        assert self.con.send_buffer == [
+            (b'test2:binary', None), (b'test3:binary', None), (b'test4:binary', None)]
+
+        # Binary frames are sent one by one, as the window allows.
+        futures[0].set_result(None)
+        assert self.con.send_mock.call_args[0] == (b'test2:binary',)
+        assert self.con.send_buffer == [(b'test3:binary', None), (b'test4:binary', None)]
+
+        self.con.drain()
+        assert self.con.send_mock.call_count == 5
+        assert self.con.send_buffer == []
+
+    def test_send_window_encoded_expired(self):
+        self.con.send_window = 1
+        self.con.encoding = mock.Mock()
+        self.con.encoding.transcode.side_effect = lambda frame: frame.split(b':')[0] + b':binary'
+        futures = self.get_write_futures()
+
+        self.con.send_message(b'test1:{}')
+        self.con.send_message(
+            u'test2:{{"expires":{0}}}'.format(time.time() + 0.01).encode('utf-8'))
+        self.con.send_message(b'test3:{}')
+        assert self.con.send_buffer == [
+            (b'test2:binary', mock.ANY), (b'test3:binary', None)]
+        time.sleep(0.02)
+
+        # The expiry of encoded frames is kept next to them.
+        futures[0].set_result(None)
+        assert self.con.send_mock.call_args_list == [
+            mock.call(b'test1:binary'), mock.call(b'test3:binary')]
+        assert self.con.send_buffer == []
+
+    @mock.patch('omnibus.connection.metrics')
+    def test_metrics(self, metrics_mock):
+        self.con.on_open(None)
+        assert metrics_mock.connections.inc.call_count == 1
+
+        self.con.authenticator_class = mock.Mock()
+        self.con.command_authenticate('test')
+        assert metrics_mock.authentications.inc.call_args[1] == {'label': 'success'}
+
+        self.con.subscriber.channels = []
+        self.con.pubsub.subscribe.return_value = True
+        self.con.command_subscribe('mychan')
+        assert metrics_mock.subscriptions.inc.call_args[1] == {'label': 'mychan'}
+        assert metrics_mock.messages_sent.inc.call_args_list == [
+            mock.call(label='!authenticate'), mock.call(label='!subscribe')]
+        assert metrics_mock.bytes_sent.inc.call_count == 2
+
+        self.con.subscriber.channels = ['mychan']
+        self.con.on_channel_message('mychan', 'mychan:{}')
+        assert metrics_mock.messages_received.inc.call_args[1] == {'label': 'mychan'}
+
+        self.con.on_close()
+        assert metrics_mock.subscriptions.dec.call_args[1] == {'label': 'mychan'}
+        assert metrics_mock.connections.dec.call_count == 1
+
+    @mock.patch('omnibus.connection.watchdog')
+    def test_on_command_message_monitored(self, watchdog_mock):
+        watchdog_mock.enabled = True
+        self.con.on_command_message('testcommand', 'test')
+        assert watchdog_mock.call.call_args[0] == (
+            'command_testcommand', self.con.command_testcommand, 'test')
+
+    def test_registry(self):
+        self.con.on_open(None)
+        assert self.con in self.con.registry
+        assert self.con.opened is not None
+        assert self.con.last_activity == self.con.opened
+
+        self.con.subscriber.channels = []
+        self.con.on_close()
+        assert self.con not in self.con.registry
+
+    def test_on_message_activity(self):
+        self.con.last_activity = 0
+        self.con.on_message('!testcommand:test')
+        assert self.con.last_activity > 0
+
+    def test_check_timeouts_authentication(self):
+        self.con.on_open(None)
+        self.con.authentication_timeout = 10
+
+        self.con.check_timeouts(self.con.opened + 5)
+        assert self.con.close.called is False
+
+        self.con.check_timeouts(self.con.opened + 11)
+        assert self.con.close.call_count == 1
+        assert self.con not in self.con.registry
+
+    def test_check_timeouts_authenticated(self):
+        self.con.on_open(None)
+        self.con.authentication_timeout = 10
+        self.con.authenticator = mock.Mock()
+
+        self.con.check_timeouts(self.con.opened + 11)
+        assert self.con.close.called is False
+
+    def test_check_timeouts_idle(self):
+        self.con.on_open(None)
+        self.con.idle_timeout = 60
+
+        self.con.check_timeouts(self.con.last_activity + 30)
+        assert self.con.close.called is False
+
+        self.con.check_timeouts(self.con.last_activity + 61)
+        assert self.con.close.call_count == 1
+
+    def test_check_timeouts_heartbeat(self):
+        self.con.on_open(None)
+        self.con.heartbeat_interval = 20
+
+        self.con.check_timeouts(self.con.last_activity + 10)
+        assert self.con.send_mock.called is False
+
+        self.con.check_timeouts(self.con.last_activity + 21)
+        msg = self.con.send_mock.call_args[0][0]
+        assert msg.startswith('!heartbeat:')
+        assert self.con.close.called is False
+
+        # The answer of the client counts as activity.
+        self.con.on_message('!heartbeat:')
+        assert self.con.send_mock.call_count == 1
+        assert time.time() - self.con.last_activity < 1
+
+    @mock.patch('omnibus.connection.metrics')
+    def test_reap(self, metrics_mock):
+        self.con.on_open(None)
+        self.con.reap('idle')
+        assert metrics_mock.reaped.inc.call_args[1] == {'label': 'idle'}
+        assert self.con.close.call_count == 1
+
+    def test_on_open_max_connections(self):
+        self.con.max_connections = 1
+        self.con.registry.add(mock.Mock())
+
+        self.con.on_open(mock.Mock(ip='127.0.0.1'))
+        assert self.con.pubsub.get_subscriber.called is False
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '5')
+        assert self.con.rejected is True
+
+        # Messages are ignored until the connection is closed.
+        self.con.on_message('!testcommand:test')
+        assert self.con.command_testcommand.called is False
+
+    def test_on_open_rate_limited(self):
+        self.con.connection_limiter = RateLimiter(0.01, 1)
+        other = MockedMessageConnection()
+        other.prepare_mock()
+        other.connection_limiter = self.con.connection_limiter
+
+        other.on_open(mock.Mock(ip='127.0.0.1'))
+        assert other.close_transport.called is False
+        assert other.address == '127.0.0.1'
+
+        self.con.on_open(mock.Mock(ip='127.0.0.1'))
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '100')
+
+    def test_on_message_command_rate_limited(self):
+        self.con.address = '127.0.0.1'
+        self.con.command_limiter = RateLimiter(1, 1)
+
+        self.con.on_message('!testcommand:test')
+        assert self.con.command_testcommand.call_count == 1
+
+        self.con.on_message('!testcommand:test')
+        assert self.con.command_testcommand.call_count == 1
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '5')
+
+    def test_resume_rate_limited(self):
+        self.con.authenticator = NoOpAuthenticator('alice')
+        self.con.command_limiter = RateLimiter(1, 3)
+        self.con.subscriber = mock.Mock()
+        self.con.subscriber.channels = []
+        self.con.pubsub.subscribe.return_value = True
+
+        self.con.on_message('!resume:' + json.dumps(['chan1', 'chan2', 'chan3', 'chan4']))
+        assert [c[0][1] for c in self.con.pubsub.subscribe.call_args_list] == [
+            'chan1', 'chan2', 'chan3']
+        assert self.con.send_mock.called is False
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '5')
+
+    def test_on_message_batch_rate_limited(self):
+        self.con.address = '127.0.0.1'
+        self.con.command_limiter = RateLimiter(1, 2)
+
+        self.con.on_message('!batch:' + json.dumps(['!testcommand:1', '!testcommand:2']))
+        assert self.con.command_testcommand.call_count == 2
+        assert self.con.close_transport.called is False
+
+    @mock.patch('omnibus.connection.MessageConnection.on_channel_message')
+    def test_on_message_publish_rate_limited(self, channel_mock):
+        self.con.authenticator = mock.Mock()
+        self.con.authenticator.get_identifier.return_value = 'test123'
+        self.con.publish_limiter = RateLimiter(1, 1)
+
+        self.con.on_message('mychan:{}')
+        self.con.on_message('mychan:{}')
+        assert channel_mock.call_count == 1
+        assert list(self.con.publish_limiter.buckets.keys()) == ['test123']
+        assert self.con.close_transport.called is False
+
+    def test_on_open_draining(self):
+        self.con.registry.draining = True
+
+        self.con.on_open(mock.Mock(ip='127.0.0.1'))
+        assert self.con.pubsub.get_subscriber.called is False
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '5')
+
+    def test_drain(self):
+        self.con.send_buffer = [('test1:{}', None), ('test2:{}', None)]
+
+        self.con.drain()
+        assert self.con.send_buffer == []
+        assert self.con.send_mock.call_args[0][0].startswith('!batch:')
+        assert self.con.close_transport.call_args[0] == (CLOSE_RETRY_AFTER, '5')
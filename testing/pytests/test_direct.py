@@ -0,0 +1,78 @@
+import json
+
+import mock
+
+from omnibus.direct import DirectRouter, get_topic
+
+
+def get_connection():
+    connection = mock.Mock()
+    return connection
+
+
+def get_message(identifier, payload_type, payload):
+    return [u'{0}{1}'.format(get_topic(identifier), json.dumps({
+        'sender': None, 'type': payload_type, 'payload': payload})).encode('utf-8')]
+
+
+class TestDirectRouter:
+    def setup(self):
+        self.router = DirectRouter()
+        self.pubsub = mock.Mock()
+        self.router.start(self.pubsub)
+        self.subscriber = self.pubsub.get_subscriber.return_value
+
+    def test_get_topic(self):
+        assert get_topic('alice') == '!direct:"alice":'
+        # Topics of identifiers aren't prefixes of each other.
+        assert not get_topic('al:"ice').startswith(get_topic('al'))
+
+    def test_start(self):
+        router = DirectRouter()
+        router.add(get_connection(), 'alice')
+
+        router.start(self.pubsub)
+        assert self.pubsub.get_subscriber.call_args[0] == (router.on_message,)
+        assert self.pubsub.subscribe_topic.call_args[0] == (
+            self.subscriber, '!direct:"alice":')
+
+    def test_add_remove(self):
+        first, second = get_connection(), get_connection()
+
+        self.router.add(first, 'alice')
+        self.router.add(second, 'alice')
+        assert self.pubsub.subscribe_topic.call_count == 1
+        assert self.pubsub.subscribe_topic.call_args[0] == (
+            self.subscriber, '!direct:"alice":')
+
+        self.router.remove(first, 'alice')
+        assert self.pubsub.unsubscribe_topic.called is False
+
+        self.router.remove(second, 'alice')
+        assert self.router.connections == {}
+        assert self.pubsub.unsubscribe_topic.call_args[0] == (
+            self.subscriber, '!direct:"alice":')
+
+        # Removing twice is fine.
+        self.router.remove(second, 'alice')
+
+    def test_on_message(self):
+        alice, bob = get_connection(), get_connection()
+        self.router.add(alice, 'alice')
+        self.router.add(bob, 'al')
+
+        self.router.on_message(get_message('alice', 'hello', {'text': 'Hi'}))
+        assert bob.send_command_frame.called is False
+        assert alice.send_command_frame.call_count == 1
+
+        frame, command, payload = alice.send_command_frame.call_args[0]
+        assert command == 'direct'
+        assert payload == {'sender': None, 'type': 'hello', 'payload': {'text': 'Hi'}}
+
+        command, args = frame.split(':', 1)
+        assert command == '!direct'
+        assert json.loads(args) == {'type': 'direct', 'success': True, 'payload': payload}
+
+    def test_on_message_unknown(self):
+        self.router.on_message(get_message('alice', 'hello', {}))
+        self.router.on_message([b'!direct:invalid'])
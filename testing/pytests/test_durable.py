@@ -0,0 +1,188 @@
+import json
+import os
+
+import pytest
+
+from omnibus.durable import ChannelLog, DurableLog, Segment, ENTRY
+from omnibus.exceptions import OmnibusException
+
+
+class TestSegment:
+    def test_append_read(self, tmpdir):
+        segment = Segment(str(tmpdir.join('0')), 10, 1024)
+        assert segment.next_offset == 10
+
+        assert segment.append(b'first') == 10
+        assert segment.append(b'second') == 11
+        assert segment.read(10, 10) == [b'first', b'second']
+        assert segment.read(11, 10) == [b'second']
+        assert segment.read(10, 1) == [b'first']
+        assert segment.read(12, 10) == []
+
+    def test_full(self, tmpdir):
+        segment = Segment(str(tmpdir.join('0')), 0, 64)
+        assert segment.append(b'x' * 50) == 0
+        assert segment.append(b'x' * 10) is None
+
+        # The index is full as well.
+        segment = Segment(str(tmpdir.join('1')), 0, 64)
+        assert segment.capacity == 2
+        assert segment.append(b'') == 0
+        assert segment.append(b'') == 1
+        assert segment.append(b'') is None
+
+    def test_recover(self, tmpdir):
+        path = str(tmpdir.join('0'))
+        segment = Segment(path, 0, 1024)
+        for index in range(5):
+            segment.append(u'message {0}'.format(index).encode('utf-8'))
+        segment.close()
+
+        segment = Segment(path, 0, 1024)
+        assert segment.count == 5
+        segment.append(b'message 5')
+        assert segment.read(4, 10) == [b'message 4', b'message 5']
+
+    def test_recover_incomplete(self, tmpdir):
+        path = str(tmpdir.join('0'))
+        segment = Segment(path, 0, 1024)
+        segment.append(b'first')
+        segment.append(b'second')
+        # An index entry without its record.
+        ENTRY.pack_into(segment.index, 2 * ENTRY.size, 100)
+        segment.close()
+
+        segment = Segment(path, 0, 1024)
+        assert segment.count == 2
+        assert segment.get_end(2) == 0
+
+
+class TestChannelLog:
+    def test_rotate(self, tmpdir):
+        directory = str(tmpdir.join('chan'))
+        log = ChannelLog(directory, 64, 3)
+
+        for index in range(10):
+            assert log.append(b'x' * 20) == index
+
+        assert [segment.base for segment in log.segments] == [4, 6, 8]
+        assert sorted(os.listdir(directory))[0] == '{0:020d}.index'.format(4)
+        assert len(os.listdir(directory)) == 6
+
+        # Deleted offsets are skipped, reads span segments.
+        frames, next_offset = log.read(0, 100)
+        assert len(frames) == 6
+        assert next_offset == 10
+        assert log.read(5, 2) == ([b'x' * 20] * 2, 7)
+
+    def test_reopen(self, tmpdir):
+        directory = str(tmpdir.join('chan'))
+        log = ChannelLog(directory, 64, 3)
+        for index in range(5):
+            log.append(u'{0}'.format(index).encode('utf-8'))
+        log.close()
+
+        log = ChannelLog(directory, 64, 3)
+        assert log.next_offset == 5
+        assert log.read(3, 10) == ([b'3', b'4'], 5)
+
+    def test_read_beyond_end(self, tmpdir):
+        log = ChannelLog(str(tmpdir.join('chan')), 64, 3)
+        log.append(b'first')
+        assert log.read(100, 10) == ([], 1)
+
+    def test_too_large(self, tmpdir):
+        log = ChannelLog(str(tmpdir.join('chan')), 64, 3)
+        assert log.append(b'x' * 64) is None
+        assert len(log.segments) == 1
+
+
+class TestDurableLog:
+    def get_log(self, tmpdir, **kwargs):
+        return DurableLog(path=str(tmpdir), channels=('orders',), **kwargs)
+
+    def test_path_required(self):
+        with pytest.raises(OmnibusException):
+            DurableLog(path=None, channels=('orders',))
+
+    def test_append(self, tmpdir):
+        log = self.get_log(tmpdir)
+
+        frame = log.append(b'orders-1:{"type":"created"}')
+        assert frame == b'orders-1:{"offset":0,"type":"created"}'
+        assert json.loads(log.append(b'orders-1:{}').decode('utf-8').split(':', 1)[1]) == {
+            'offset': 1}
+        assert log.append(b'orders-2:{ }') == b'orders-2:{"offset":0 }'
+
+        assert log.read(b'orders-1', 0, 10) == ([
+            b'orders-1:{"offset":0,"type":"created"}', b'orders-1:{"offset":1}'], 2, False)
+        assert log.read(b'orders-1', 0, 1)[1:] == (1, True)
+
+    def test_append_not_durable(self, tmpdir):
+        log = self.get_log(tmpdir)
+
+        for frame in (b'news:{}', b'news:[{}]', b'orders-1:"text"', b'orders-1'):
+            assert log.append(frame) is frame
+        assert log.read(b'news', 0, 10) == ([], 0, False)
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_read_unknown(self, tmpdir):
+        log = self.get_log(tmpdir)
+
+        # Reading doesn't create logs, only appending does.
+        for index in range(3):
+            assert log.read(u'orders-{0}'.format(index).encode('utf-8'), 5, 10) == (
+                [], 5, False)
+        assert log.logs == {}
+        assert os.listdir(str(tmpdir)) == []
+
+        log.append(b'orders-1:{}')
+        assert log.read(b'orders-1', 0, 10)[1:] == (1, False)
+        assert list(log.logs) == [b'orders-1']
+
+    def test_read_existing(self, tmpdir):
+        log = self.get_log(tmpdir)
+        log.append(b'orders-1:{}')
+        log.close()
+
+        # Logs of an earlier run are opened for reading.
+        log = self.get_log(tmpdir)
+        assert log.read(b'orders-1', 0, 10) == ([b'orders-1:{"offset":0}'], 1, False)
+
+    def test_append_list(self, tmpdir):
+        log = self.get_log(tmpdir)
+        log.append(b'orders-1:{}')
+
+        frame = log.append(b'orders-1:[{"type": "created"}, {"type": "updated"}, 1]')
+        assert json.loads(frame.decode('utf-8').split(':', 1)[1]) == [
+            {'offset': 1, 'type': 'created'}, {'offset': 2, 'type': 'updated'}, 1]
+
+        # Every message is a record of its own, replayed as a single message.
+        frames = log.read(b'orders-1', 1, 10)[0]
+        assert [json.loads(f.decode('utf-8').split(':', 1)[1]) for f in frames] == [
+            {'offset': 1, 'type': 'created'}, {'offset': 2, 'type': 'updated'}]
+
+    def test_append_list_invalid(self, tmpdir):
+        log = self.get_log(tmpdir)
+        frame = b'orders-1:[invalid'
+        assert log.append(frame) is frame
+        assert log.read(b'orders-1', 0, 10) == ([], 0, False)
+
+    def test_append_too_large(self, tmpdir):
+        log = self.get_log(tmpdir, segment_size=64)
+        frame = b'orders-1:{"data":"' + b'x' * 64 + b'"}'
+        assert log.append(frame) is frame
+
+    def test_channel_directory(self, tmpdir):
+        log = DurableLog(path=str(tmpdir), channels=('',))
+        log.append(b'..:{}')
+        log.append(b'a/b:{}')
+        assert sorted(os.listdir(str(tmpdir))) == ['%2E%2E', 'a%2Fb']
+
+    def test_reopen(self, tmpdir):
+        log = self.get_log(tmpdir)
+        log.append(b'orders-1:{}')
+        log.close()
+
+        log = self.get_log(tmpdir)
+        assert log.append(b'orders-1:{}') == b'orders-1:{"offset":1}'
@@ -0,0 +1,67 @@
+import json
+
+import mock
+
+from omnibus import encoding
+
+
+class JSONBytesEncoding(encoding.Encoding):
+    name = 'jsonbytes'
+
+    def dumps(self, data):
+        return json.dumps(data, sort_keys=True).encode('utf-8')
+
+
+def test_encode():
+    enc = JSONBytesEncoding()
+    assert enc.encode('!subscribe', {'success': True}) == (
+        b'!subscribe:{"success": true}')
+
+
+def test_transcode():
+    enc = JSONBytesEncoding()
+    frame = enc.transcode(b'mychan:{"type":"test","payload":{"a":1}}')
+    assert frame == b'mychan:{"payload": {"a": 1}, "type": "test"}'
+
+
+def test_transcode_cached():
+    enc = JSONBytesEncoding()
+    enc.dumps = mock.Mock(return_value=b'{}')
+
+    enc.transcode(b'mychan:{}')
+    enc.transcode(b'mychan:{}')
+    assert enc.dumps.call_count == 1
+
+    enc.cache_size = 1
+    enc.transcode(b'otherchan:{}')
+    assert enc.dumps.call_count == 2
+    assert list(enc.cache.keys()) == [b'otherchan:{}']
+
+
+def test_transcode_cached_text():
+    enc = JSONBytesEncoding()
+    enc.dumps = mock.Mock(return_value=b'{}')
+
+    # Text frames are cached by their bytes.
+    enc.transcode(u'mychan:{}')
+    enc.transcode(u'mychan:{}')
+    enc.transcode(b'mychan:{}')
+    assert enc.dumps.call_count == 1
+    assert list(enc.cache.keys()) == [b'mychan:{}']
+
+
+def test_get_encoding_unknown():
+    assert encoding.get_encoding('unknown') is None
+
+
+@mock.patch('omnibus.encoding.BINARY_ENCODINGS', ())
+def test_get_encoding_disabled():
+    assert encoding.get_encoding('msgpack') is None
+
+
+@mock.patch.dict('omnibus.encoding.ENCODINGS', {'jsonbytes': JSONBytesEncoding})
+@mock.patch('omnibus.encoding.BINARY_ENCODINGS', ('jsonbytes',))
+def test_get_encoding():
+    enc = encoding.get_encoding('jsonbytes')
+    assert isinstance(enc, JSONBytesEncoding)
+    assert encoding.get_encoding('jsonbytes') is enc
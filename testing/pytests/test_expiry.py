@@ -0,0 +1,41 @@
+import time
+
+import mock
+
+from omnibus.expiry import get_expiry, has_expired, is_expired
+
+
+def test_get_expiry():
+    assert get_expiry(b'chan:{"expires":12.5,"sender":null}') == 12.5
+    assert get_expiry(b'chan:{"expires":12}') == 12
+    # Durable channels put the offset first.
+    assert get_expiry(b'chan:{"offset":3,"expires":12.5,"sender":null}') == 12.5
+    assert get_expiry(u'chan:{"expires":12.5}') == 12.5
+
+
+def test_get_expiry_none():
+    for frame in (
+        b'chan:{"sender":null,"expires":12.5}', b'chan:{}', b'chan:[]', b'chan',
+        b'chan:{"expires":soon}', b'chan:{"offset":3}', b'!direct:"id":{"expires":1}'
+    ):
+        assert get_expiry(frame) is None
+
+
+@mock.patch('omnibus.expiry.metrics')
+def test_is_expired(metrics_mock):
+    assert is_expired(u'chan:{{"expires":{0}}}'.format(time.time() - 1).encode(), 'bridge')
+    assert metrics_mock.expired.inc.call_args == mock.call(label='bridge')
+
+    assert not is_expired(u'chan:{{"expires":{0}}}'.format(time.time() + 60).encode(), 'bridge')
+    assert not is_expired(b'chan:{}', 'bridge')
+    assert metrics_mock.expired.inc.call_count == 1
+
+
+@mock.patch('omnibus.expiry.metrics')
+def test_has_expired(metrics_mock):
+    assert has_expired(time.time() - 1, 'send_buffer')
+    assert metrics_mock.expired.inc.call_args == mock.call(label='send_buffer')
+
+    assert not has_expired(time.time() + 60, 'send_buffer')
+    assert not has_expired(None, 'send_buffer')
+    assert metrics_mock.expired.inc.call_count == 1
@@ -27,6 +27,48 @@ def test_websocket_connection_factory():
 
     assert hasattr(conn_class, 'open') is True
     assert hasattr(conn_class, 'send') is True
+    assert hasattr(conn_class, 'send_frame') is True
+    assert conn_class.binary_supported is True
+
+
+def test_websocket_connection_factory_compression():
+    conn_class = factories.websocket_connection_factory(mock.Mock(), mock.Mock())
+    conn = conn_class.__new__(conn_class)
+
+    conn.compressor = mock.Mock()
+    assert conn.get_compression_options() == (
+        conn.compressor.get_compression_options.return_value)
+
+
+def test_websocket_connection_factory_open():
+    conn_class = factories.websocket_connection_factory(mock.Mock(), mock.Mock())
+    conn = conn_class.__new__(conn_class)
+    conn.compressor = mock.Mock()
+    conn.on_open = mock.Mock()
+
+    conn.open()
+    assert conn.compressor.limit_window.call_args == mock.call(conn)
+    assert conn.on_open.call_args == mock.call(None)
+
+
+def test_websocket_connection_factory_close_transport():
+    conn_class = factories.websocket_connection_factory(mock.Mock(), mock.Mock())
+    conn = conn_class.__new__(conn_class)
+    conn.close = mock.Mock()
+    conn.request = mock.Mock(remote_ip='127.0.0.1')
+
+    conn.close_transport(4429, '5')
+    assert conn.close.call_args[0] == (4429, '5')
+    assert conn.get_remote_address(None) == '127.0.0.1'
+
+
+def test_websocket_connection_factory_pong():
+    conn_class = factories.websocket_connection_factory(mock.Mock(), mock.Mock())
+    conn = conn_class.__new__(conn_class)
+
+    conn.last_activity = 0
+    conn.on_pong(b'')
+    assert conn.last_activity > 0
 
 
 def test_websocket_webapp_factory():
@@ -36,6 +78,16 @@ def test_websocket_webapp_factory():
 
     assert isinstance(webapp, web.Application)
     assert webapp.handlers[0][1][0].handler_class == conn_class
+    assert webapp.settings['websocket_ping_interval'] is None
+
+
+@mock.patch('omnibus.factories.PING_INTERVAL', 30)
+@mock.patch('omnibus.factories.PING_TIMEOUT', 10)
+def test_websocket_webapp_factory_ping():
+    webapp = factories.websocket_webapp_factory(mock.Mock())
+
+    assert webapp.settings['websocket_ping_interval'] == 30
+    assert webapp.settings['websocket_ping_timeout'] == 10
 
 
 def test_sockjs_connection_factory():
@@ -49,6 +101,15 @@ def test_sockjs_connection_factory():
     assert conn_class.pubsub == pubsub_instance
 
 
+def test_sockjs_connection_factory_close_transport():
+    conn_class = factories.sockjs_connection_factory(mock.Mock(), mock.Mock())
+    conn = conn_class(mock.Mock())
+
+    conn.close_transport(4429, '5')
+    assert conn.session.close.call_args[0] == (4429, '5')
+    assert conn.get_remote_address(mock.Mock(ip='127.0.0.1')) == '127.0.0.1'
+
+
 def test_sockjs_webapp_factory():
     conn_class = mock.Mock()
 
@@ -57,3 +118,22 @@ def test_sockjs_webapp_factory():
     assert isinstance(webapp, web.Application)
     assert webapp.handlers[0][1][0].kwargs[
         'server'].get_connection_class() == conn_class
+
+
+def test_metrics_handlers_disabled():
+    assert factories.metrics_handlers() == []
+
+
+@mock.patch('omnibus.factories.METRICS_URL', '/metrics')
+def test_metrics_handlers():
+    assert factories.metrics_handlers() == [('/metrics', factories.MetricsHandler)]
+
+
+@mock.patch('omnibus.factories.metrics')
+def test_metrics_handler(metrics_mock):
+    metrics_mock.registry.render.return_value = u'test_total 1\n'
+    handler = mock.Mock()
+
+    factories.MetricsHandler.get(handler)
+    assert handler.write.call_args[0] == (u'test_total 1\n',)
+    assert handler.set_header.call_args[0][0] == 'Content-Type'
@@ -0,0 +1,62 @@
+import mock
+
+from omnibus import metrics
+from omnibus.fanout import FanOut
+
+
+class TestFanOut:
+    def setup(self):
+        self.loop = mock.Mock()
+        self.fanout = FanOut(chunk_size=3, loop=self.loop)
+        self.delivered = []
+
+    def callback(self, receiver, msg):
+        self.delivered.append((receiver, msg))
+
+    def test_deliver_small(self):
+        self.fanout.deliver(self.callback, [1, 2, 3], 'msg')
+        assert self.delivered == [(1, 'msg'), (2, 'msg'), (3, 'msg')]
+        assert self.loop.add_callback.called is False
+
+        self.fanout.deliver(self.callback, [], 'msg')
+        assert len(self.delivered) == 3
+
+    def test_deliver_chunked(self):
+        self.fanout.deliver(self.callback, [1, 2, 3, 4, 5], 'first')
+        self.fanout.deliver(self.callback, [1, 2], 'second')
+        assert self.delivered == []
+        assert self.loop.add_callback.call_args[0] == (self.fanout.run,)
+        assert len(self.fanout) == 7
+        assert metrics.fanout_queue.get() == 7
+
+        self.fanout.run()
+        assert self.delivered == [(1, 'first'), (2, 'first'), (3, 'first')]
+        assert self.loop.add_callback.call_count == 2
+
+        # Later messages never overtake the pending receivers.
+        self.fanout.deliver(self.callback, [1], 'third')
+        self.fanout.run()
+        assert self.delivered[3:] == [(4, 'first'), (5, 'first'), (1, 'second')]
+
+        self.fanout.run()
+        assert self.delivered[6:] == [(2, 'second'), (1, 'third')]
+        assert len(self.fanout) == 0
+        assert metrics.fanout_queue.get() == 0
+        assert self.loop.add_callback.call_count == 3
+
+    def test_deliver_unchunked(self):
+        self.fanout.chunk_size = None
+        self.fanout.deliver(self.callback, list(range(10)), 'msg')
+        assert len(self.delivered) == 10
+
+    def test_deliver_error(self):
+        callback = mock.Mock(side_effect=[ValueError, None, None])
+        self.fanout.deliver(callback, [1, 2, 3], 'msg')
+        assert callback.call_count == 3
+
+    def test_clear(self):
+        self.fanout.deliver(self.callback, [1, 2, 3, 4], 'msg')
+        self.fanout.clear()
+        self.fanout.run()
+        assert self.delivered == []
+        assert metrics.fanout_queue.get() == 0
@@ -0,0 +1,157 @@
+import json
+import time
+
+import mock
+import pytest
+import zmq
+
+from omnibus.exceptions import OmnibusException
+from omnibus.forwarder import Forwarder, get_heartbeat
+
+
+class TestForwarder:
+    def setup(self):
+        self.pubsub = mock.Mock()
+        self.pubsub.context.socket.side_effect = lambda mode: mock.Mock()
+        self.forwarder = Forwarder(
+            self.pubsub, ['tcp://d1:4243', 'tcp://d2:4243'],
+            ['tcp://d1:4244', 'tcp://d2:4244'], interval=100, timeout=300)
+        self.director1, self.director2 = self.forwarder.directors
+
+    @mock.patch('omnibus.forwarder.PeriodicCallback')
+    @mock.patch('omnibus.forwarder.ZMQStream')
+    def start(self, stream_mock, callback_mock):
+        self.streams = stream_mock
+        return self.forwarder.start('tcp://*:4244', 'tcp://*:4243')
+
+    def test_addresses_mismatch(self):
+        with pytest.raises(AssertionError):
+            Forwarder(self.pubsub, ['tcp://d1:4243', 'tcp://d2:4243'], ['tcp://d1:4244'])
+
+    def test_get_heartbeat(self):
+        channel, data = get_heartbeat('d1').split(b':', 1)
+        assert channel == b'!director'
+        assert json.loads(data.decode('utf-8'))['director'] == 'd1'
+
+    def test_start(self):
+        pub_forwarder, sub_forwarder = self.start()
+
+        assert self.pubsub.bind.call_args_list == [
+            mock.call(pub_forwarder['in'], 'tcp://*:4244'),
+            mock.call(sub_forwarder['out'], 'tcp://*:4243')]
+
+        # One subscriber per director and the local publisher input.
+        assert self.streams.call_count == 3
+        subscriber = self.streams.call_args_list[0][0][0]
+        assert subscriber.connect.call_args[0] == ('tcp://d1:4243',)
+        assert subscriber.setsockopt.call_args[0] == (zmq.SUBSCRIBE, b'')
+        assert self.director2['publisher'].connect.call_args[0] == ('tcp://d2:4244',)
+        assert self.streams.call_args_list[2][0][0] == pub_forwarder['in']
+        assert self.forwarder.callback.start.called is True
+
+    def test_start_error(self):
+        self.pubsub.context.socket.side_effect = zmq.ZMQError
+        with pytest.raises(OmnibusException):
+            self.start()
+
+    def test_close(self):
+        self.start()
+        callback = self.forwarder.callback
+
+        self.forwarder.close()
+        assert callback.stop.called is True
+        assert self.streams.return_value.close.call_count == 3
+        assert self.forwarder.streams == []
+
+    def test_publish(self):
+        self.start()
+        self.director1['healthy'] = True
+
+        self.forwarder.publish([b'chan:{}'])
+        frame, message_id = self.director1['publisher'].send_multipart.call_args[0][0]
+        assert frame == b'chan:{}'
+        assert message_id.startswith(self.forwarder.node.encode('utf-8'))
+        # Unhealthy directors are skipped.
+        assert self.director2['publisher'].send_multipart.called is False
+
+        # Ids are unique.
+        self.forwarder.publish([b'chan:{}'])
+        assert self.director1['publisher'].send_multipart.call_args[0][0][1] != message_id
+
+    def test_publish_expired(self):
+        self.start()
+
+        self.forwarder.publish([b'chan:{"expires":1.0}'])
+        assert self.director1['publisher'].send_multipart.called is False
+
+    def test_publish_keep_id(self):
+        self.start()
+        self.director1['healthy'] = True
+
+        self.forwarder.publish([b'chan:{}', b'id'])
+        assert self.director1['publisher'].send_multipart.call_args[0][0] == [
+            b'chan:{}', b'id']
+
+    def test_publish_no_healthy(self):
+        self.start()
+
+        self.forwarder.publish([b'chan:{}'])
+        assert self.director1['publisher'].send_multipart.called is True
+        assert self.director2['publisher'].send_multipart.called is True
+
+    @mock.patch('omnibus.forwarder.metrics')
+    def test_receive_deduplicate(self, metrics_mock):
+        _, sub_forwarder = self.start()
+        out = sub_forwarder['out']
+
+        self.forwarder.receive(self.director1, [b'chan:{}', b'id1'])
+        self.forwarder.receive(self.director2, [b'chan:{}', b'id1'])
+        assert out.send_multipart.call_count == 1
+        assert out.send_multipart.call_args[0] == ([b'chan:{}', b'id1'],)
+        assert metrics_mock.director_duplicates.inc.call_count == 1
+
+        # Messages without id (published to a director directly) pass.
+        self.forwarder.receive(self.director1, [b'chan:{}'])
+        self.forwarder.receive(self.director2, [b'chan:{}'])
+        assert out.send_multipart.call_count == 3
+
+    def test_receive_expired(self):
+        _, sub_forwarder = self.start()
+
+        self.forwarder.receive(self.director1, [b'chan:{"expires":1.0}', b'id1'])
+        assert sub_forwarder['out'].send_multipart.called is False
+        assert self.director1['healthy'] is True
+
+    def test_receive_dedup_size(self):
+        self.start()
+        self.forwarder.dedup_size = 2
+
+        for message_id in (b'id1', b'id2', b'id3'):
+            self.forwarder.receive(self.director1, [b'chan:{}', message_id])
+        assert list(self.forwarder.seen) == [b'id2', b'id3']
+
+    def test_receive_heartbeat(self):
+        _, sub_forwarder = self.start()
+
+        self.forwarder.receive(self.director1, [get_heartbeat('d1')])
+        assert self.director1['healthy'] is True
+        assert self.director1['seen'] is not None
+        assert sub_forwarder['out'].send_multipart.called is False
+
+    @mock.patch('omnibus.forwarder.metrics')
+    def test_check(self, metrics_mock):
+        self.start()
+        self.forwarder.receive(self.director1, [get_heartbeat('d1')])
+        self.forwarder.receive(self.director2, [get_heartbeat('d2')])
+        assert metrics_mock.director_healthy.set.call_args == mock.call(
+            1, label='tcp://d2:4243')
+
+        self.forwarder.check()
+        assert self.director1['healthy'] is True
+
+        self.director1['seen'] = time.time() - 1
+        self.forwarder.check()
+        assert self.director1['healthy'] is False
+        assert self.director2['healthy'] is True
+        assert metrics_mock.director_healthy.set.call_args == mock.call(
+            0, label='tcp://d1:4243')
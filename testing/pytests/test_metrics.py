@@ -0,0 +1,140 @@
+import mock
+
+from omnibus import metrics
+
+
+def test_counter():
+    counter = metrics.Counter('test_total', 'Test counter.')
+    counter.inc()
+    counter.inc(2)
+    assert counter.get() == 3
+    assert counter.render() == (
+        '# HELP test_total Test counter.\n'
+        '# TYPE test_total counter\n'
+        'test_total 3')
+
+
+def test_counter_labeled():
+    counter = metrics.Counter('test_total', 'Test counter.', 'channel')
+    counter.inc(label='b')
+    counter.inc(label=b'a"1')
+    assert counter.get('b') == 1
+    assert counter.get('c') == 0
+    assert sorted(counter.render().split('\n')[2:]) == [
+        'test_total{channel="a\\"1"} 1',
+        'test_total{channel="b"} 1',
+    ]
+
+
+def test_counter_max_labels():
+    counter = metrics.Counter('test_total', 'Test counter.', 'channel', max_labels=2)
+    for label in ('a', 'b', 'c', 'd', 'a'):
+        counter.inc(label=label)
+    assert counter.values == {'a': 2, 'b': 1, 'other': 2}
+
+
+def test_gauge_max_labels():
+    gauge = metrics.Gauge('test', 'Test gauge.', 'channel', max_labels=1)
+    gauge.inc(label='a')
+    gauge.inc(label='b')
+    gauge.inc(label='c')
+    assert gauge.values == {'a': 1, 'other': 2}
+
+    gauge.dec(label='a')
+    gauge.dec(label='b')
+    assert gauge.values == {'other': 1}
+
+
+def test_gauge_max_labels_freed():
+    gauge = metrics.Gauge('test', 'Test gauge.', 'channel', max_labels=3)
+    for label in ('a', 'b', 'c', 'd'):
+        gauge.inc(label=label)
+    assert gauge.values == {'a': 1, 'b': 1, 'c': 1, 'other': 1}
+
+    # The slot of a is free, d was counted as "other" nevertheless.
+    for label in ('a', 'b', 'd'):
+        gauge.dec(label=label)
+    assert gauge.values == {'c': 1}
+
+
+def test_gauge():
+    gauge = metrics.Gauge('test', 'Test gauge.')
+    gauge.inc(3)
+    gauge.dec()
+    assert gauge.get() == 2
+    gauge.set(0.5)
+    assert gauge.get() == 0.5
+
+
+def test_gauge_labeled_drops_zero():
+    gauge = metrics.Gauge('test', 'Test gauge.', 'channel')
+    gauge.inc(label='mychan')
+    gauge.dec(label='mychan')
+    assert gauge.values == {}
+
+
+def test_registry():
+    registry = metrics.Registry()
+    registry.counter('test_total', 'Test counter.')
+    registry.gauge('test', 'Test gauge.')
+
+    output = registry.render()
+    assert '# TYPE test_total counter\ntest_total 0\n' in output
+    assert output.endswith('# TYPE test gauge\ntest 0\n')
+
+
+@mock.patch('omnibus.metrics.ioloop_lag')
+def test_loop_lag_sampler(lag_mock):
+    loop = mock.Mock()
+    loop.time.return_value = 10.0
+
+    sampler = metrics.LoopLagSampler(loop, 0.5)
+    sampler.start()
+    assert loop.call_later.call_args[0] == (0.5, sampler.sample)
+
+    loop.time.return_value = 10.75
+    sampler.sample()
+    assert lag_mock.set.call_args[0] == (0.25,)
+    assert loop.call_later.call_count == 2
+
+
+@mock.patch('omnibus.metrics.ioloop_lag_histogram')
+def test_loop_lag_sampler_callback(histogram_mock):
+    loop = mock.Mock()
+    loop.time.return_value = 10.0
+    callback = mock.Mock()
+
+    sampler = metrics.LoopLagSampler(loop, 1.0, callback)
+    sampler.start()
+    loop.time.return_value = 11.5
+    sampler.sample()
+
+    assert histogram_mock.observe.call_args[0] == (0.5,)
+    assert callback.call_args[0] == (0.5,)
+
+
+def test_histogram():
+    histogram = metrics.Histogram('test_seconds', 'Test.', buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    assert histogram.get() == 2
+    assert histogram.render().split('\n')[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 2',
+        'test_seconds_sum 0.55',
+        'test_seconds_count 2',
+    ]
+
+
+def test_histogram_labeled():
+    histogram = metrics.Histogram('test_seconds', 'Test.', 'callback', (1,))
+    assert histogram.get('cb') == 0
+    histogram.observe(2, label='cb')
+    assert histogram.get('cb') == 1
+    assert histogram.render().split('\n')[2:] == [
+        'test_seconds_bucket{callback="cb",le="1"} 0',
+        'test_seconds_bucket{callback="cb",le="+Inf"} 1',
+        'test_seconds_sum{callback="cb"} 2',
+        'test_seconds_count{callback="cb"} 1',
+    ]
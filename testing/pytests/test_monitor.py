@@ -0,0 +1,81 @@
+import threading
+import time
+
+import mock
+
+from omnibus import monitor
+
+
+class TestWatchdog:
+    def setup(self):
+        self.watchdog = monitor.Watchdog(threshold=0.05)
+        self.watchdog.thread_id = threading.current_thread().ident
+
+    @mock.patch('omnibus.monitor.metrics')
+    def test_call(self, metrics_mock):
+        func = mock.Mock()
+        assert self.watchdog.call('test', func, 1, a=2) == func.return_value
+        assert func.call_args == mock.call(1, a=2)
+        assert self.watchdog.current is None
+
+        name = metrics_mock.callback_duration.observe.call_args[1]['label']
+        assert name == 'test'
+
+    @mock.patch('omnibus.monitor.logger')
+    def test_call_slow(self, logger_mock):
+        def slow():
+            time.sleep(0.06)
+            self.watchdog.check_current()
+
+        self.watchdog.call('slow', slow)
+
+        assert logger_mock.warning.call_count == 1
+        message = logger_mock.warning.call_args[0][0]
+        assert message.startswith('Slow callback slow took')
+        assert 'in slow' in message
+
+    @mock.patch('omnibus.monitor.logger')
+    def test_call_nested(self, logger_mock):
+        inner = mock.Mock()
+        self.watchdog.call('outer', self.watchdog.call, 'inner', inner)
+        assert inner.call_count == 1
+        assert self.watchdog.current is None
+
+    def test_check_current_fast(self):
+        self.watchdog.current = ('test', time.time())
+        self.watchdog.check_current()
+        assert self.watchdog.sample is None
+
+    @mock.patch('omnibus.monitor.logger')
+    def test_check_lag(self, logger_mock):
+        self.watchdog.check_lag(0.01)
+        assert logger_mock.warning.called is False
+
+        self.watchdog.check_lag(0.1)
+        assert logger_mock.warning.called is True
+
+    @mock.patch('omnibus.monitor.metrics.LoopLagSampler')
+    @mock.patch('omnibus.monitor.threading.Thread')
+    def test_start(self, thread_mock, sampler_mock):
+        loop = mock.Mock()
+        self.watchdog.start(loop)
+
+        assert self.watchdog.enabled is True
+        assert thread_mock.return_value.start.called is True
+        assert sampler_mock.call_args == mock.call(
+            loop, callback=self.watchdog.check_lag)
+        assert sampler_mock.return_value.start.called is True
+
+
+@mock.patch('omnibus.monitor.watchdog')
+def test_monitored(watchdog_mock):
+    func = mock.Mock(__name__='func')
+    wrapped = monitor.monitored('test')(func)
+
+    watchdog_mock.enabled = False
+    assert wrapped(1) == func.return_value
+    assert watchdog_mock.call.called is False
+
+    watchdog_mock.enabled = True
+    assert wrapped(1) == watchdog_mock.call.return_value
+    assert watchdog_mock.call.call_args == mock.call('test', func, 1)
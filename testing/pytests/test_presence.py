@@ -0,0 +1,183 @@
+import json
+import time
+
+import mock
+
+from omnibus.presence import Presence, PRESENCE_CHANNEL
+
+
+def get_connection(identifier):
+    connection = mock.Mock()
+    connection.authenticator.get_identifier.return_value = identifier
+    return connection
+
+
+def get_message(node, **kwargs):
+    kwargs['node'] = node
+    return [u'{0}:{1}'.format(PRESENCE_CHANNEL, json.dumps(kwargs)).encode('utf-8')]
+
+
+def get_sent(pubsub):
+    return json.loads(pubsub.send.call_args[0][0][len(PRESENCE_CHANNEL) + 1:])
+
+
+def get_delivered(connection):
+    frame, command, payload = connection.send_command_frame.call_args[0]
+    assert command == 'presence'
+    assert json.loads(frame[len('!presence:'):])['payload'] == payload
+    return payload
+
+
+class TestPresence:
+    def setup(self):
+        self.presence = Presence(channels=('room',), interval=1000, max_members=2)
+        self.presence.enabled = True
+        self.presence.pubsub = mock.Mock()
+        self.presence.request_state = False
+
+    def test_start_disabled(self):
+        presence = Presence(channels=())
+        pubsub = mock.Mock()
+        presence.start(pubsub)
+        assert presence.enabled is False
+        assert presence.tracks('room1') is False
+        assert pubsub.get_subscriber.called is False
+
+    def test_start(self):
+        presence = Presence(channels=('room',))
+        pubsub = mock.Mock()
+        with mock.patch('omnibus.presence.PeriodicCallback') as callback:
+            presence.start(pubsub)
+            assert callback.call_args[0] == (presence.flush, 1000)
+
+        assert presence.tracks('room1') is True
+        assert presence.tracks('other') is False
+        assert pubsub.subscribe.call_args[0] == (
+            pubsub.get_subscriber.return_value, PRESENCE_CHANNEL)
+
+    def test_join_leave(self):
+        first, second = get_connection('alice'), get_connection('alice')
+
+        self.presence.join(first, 'room1')
+        self.presence.join(second, 'room1')
+        assert self.presence.local == {'room1': {'alice': 2}}
+        assert self.presence.pending == {'room1': {'alice': True}}
+
+        # Alice is still a member with her second connection.
+        self.presence.pending = {}
+        self.presence.leave(first, 'room1')
+        assert self.presence.pending == {}
+
+        self.presence.leave(second, 'room1')
+        assert self.presence.pending == {'room1': {'alice': False}}
+        assert self.presence.local == {}
+        assert self.presence.subscribers == {}
+
+        # Leaving twice is fine.
+        self.presence.leave(second, 'room1')
+
+    def test_flush(self):
+        connection = get_connection('alice')
+        self.presence.join(connection, 'room1')
+
+        self.presence.flush()
+        assert get_sent(self.presence.pubsub) == {
+            'node': self.presence.node, 'sync': False, 'state': False,
+            'joined': {'room1': ['alice']}, 'left': {}}
+        assert self.presence.members == {'room1': {'alice': set([self.presence.node])}}
+        assert get_delivered(connection) == {
+            'channel': 'room1', 'count': 1, 'joined': ['alice'], 'left': []}
+
+        # Nothing changed, only a sign of life is published.
+        connection.send_command_frame.reset_mock()
+        self.presence.flush()
+        assert self.presence.pubsub.send.call_count == 2
+        assert connection.send_command_frame.called is False
+
+    def test_on_message(self):
+        connection = get_connection('alice')
+        self.presence.join(connection, 'room1')
+        self.presence.flush()
+
+        self.presence.on_message(get_message(
+            'other', state=True, joined={'room1': ['alice', 'bob']}))
+        self.presence.flush()
+        # Alice was a member already.
+        assert get_delivered(connection) == {
+            'channel': 'room1', 'count': 2, 'joined': ['bob'], 'left': []}
+
+        self.presence.on_message(get_message('other', left={'room1': ['alice', 'bob']}))
+        self.presence.flush()
+        assert get_delivered(connection) == {
+            'channel': 'room1', 'count': 1, 'joined': [], 'left': ['bob']}
+
+    def test_on_message_own(self):
+        self.presence.on_message(get_message(
+            self.presence.node, joined={'room1': ['alice']}))
+        assert self.presence.members == {}
+
+    def test_on_message_invalid(self):
+        self.presence.on_message([b'!presence:invalid'])
+        self.presence.on_message([b'!presence:{}'])
+        assert self.presence.members == {}
+
+    def test_join_leave_cancel(self):
+        connection = get_connection('alice')
+        self.presence.join(connection, 'room1')
+        self.presence.on_message(get_message('other', state=True, joined={'room1': ['bob']}))
+        self.presence.on_message(get_message('other', left={'room1': ['bob']}))
+        self.presence.flush()
+        assert get_delivered(connection)['joined'] == ['alice']
+
+    def test_sync(self):
+        self.presence.join(get_connection('alice'), 'room1')
+        bob = get_connection('bob')
+        self.presence.join(bob, 'room1')
+        self.presence.flush()
+        self.presence.leave(bob, 'room1')
+
+        # An unknown node asks for the full state.
+        self.presence.on_message(get_message('other', sync=True))
+        assert self.presence.request_state is True
+        self.presence.flush()
+        assert get_sent(self.presence.pubsub) == {
+            'node': self.presence.node, 'sync': True, 'state': True,
+            'joined': {'room1': ['alice']}, 'left': {'room1': ['bob']}}
+
+        self.presence.flush()
+        assert get_sent(self.presence.pubsub)['state'] is False
+
+    def test_expire(self):
+        connection = get_connection('alice')
+        self.presence.join(connection, 'room1')
+        self.presence.on_message(get_message('other', state=True, joined={'room1': ['bob']}))
+        self.presence.flush()
+
+        self.presence.nodes['other'] = time.time() - 10
+        self.presence.flush()
+        assert 'other' not in self.presence.nodes
+        assert self.presence.members == {'room1': {'alice': set([self.presence.node])}}
+        assert get_delivered(connection) == {
+            'channel': 'room1', 'count': 1, 'joined': [], 'left': ['bob']}
+
+    def test_large_channel(self):
+        connection = get_connection('alice')
+        self.presence.join(connection, 'room1')
+        self.presence.on_message(get_message(
+            'other', state=True, joined={'room1': ['bob', 'carol']}))
+        self.presence.flush()
+        assert get_delivered(connection) == {'channel': 'room1', 'count': 3}
+        assert self.presence.snapshot('room1') == {'channel': 'room1', 'count': 3}
+
+        # Once the channel is small again, all members are sent.
+        self.presence.on_message(get_message('other', left={'room1': ['carol']}))
+        self.presence.flush()
+        payload = get_delivered(connection)
+        assert sorted(payload.pop('members')) == ['alice', 'bob']
+        assert payload == {'channel': 'room1', 'count': 2}
+
+    def test_stop(self):
+        self.presence.callback = mock.Mock()
+        self.presence.stop()
+        assert self.presence.callback is None
+        assert self.presence.pubsub.send.call_count == 1
@@ -0,0 +1,171 @@
+import mock
+import pytest
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+
+from omnibus.exceptions import OmnibusPublisherException
+from omnibus.publishers import ModelPublisher, PublisherRegistry
+
+
+class GroupPublisher(ModelPublisher):
+    channel = 'groups'
+
+    def get_payload(self, instance, action):
+        return {'pk': instance.pk, 'name': instance.name}
+
+
+def get_published(pubsub):
+    return [c[0] for c in pubsub.publish_batch.call_args_list]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPublisherRegistry:
+    def setup(self):
+        self.pubsub = mock.Mock()
+        self.registry = PublisherRegistry(self.pubsub)
+        self.registry.register(Group, GroupPublisher)
+
+    def teardown(self):
+        self.registry.unregister(Group)
+
+    def test_autocommit(self):
+        group = Group.objects.create(name='first')
+        pk = group.pk
+        group.delete()
+
+        assert get_published(self.pubsub) == [
+            ('groups', [('group.created', {'pk': pk, 'name': 'first'}, None)]),
+            ('groups', [('group.deleted', {'pk': pk, 'name': 'first'}, None)]),
+        ]
+
+    def test_publish_failed(self, caplog):
+        self.pubsub.publish_batch.side_effect = OmnibusPublisherException('down')
+
+        with transaction.atomic():
+            Group.objects.create(name='first')
+
+        assert Group.objects.filter(name='first').exists()
+        assert 'Unable to publish changes to groups.' in caplog.text
+
+    def test_transaction(self):
+        existing = Group.objects.create(name='existing')
+        self.pubsub.reset_mock()
+
+        with transaction.atomic():
+            first = Group.objects.create(name='first')
+            first.name = 'renamed'
+            first.save()
+            existing.name = 'changed'
+            existing.save()
+            existing.save()
+            second = Group.objects.create(name='second')
+            second.delete()
+
+            # Nothing is published before the commit.
+            assert self.pubsub.publish_batch.called is False
+
+        # One message per instance, with the latest payload.
+        assert get_published(self.pubsub) == [('groups', [
+            ('group.created', {'pk': first.pk, 'name': 'renamed'}, None),
+            ('group.updated', {'pk': existing.pk, 'name': 'changed'}, None),
+        ])]
+
+    def test_rollback(self):
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                Group.objects.create(name='first')
+                raise ValueError()
+
+        assert self.pubsub.publish_batch.called is False
+
+        # The next transaction isn't affected.
+        with transaction.atomic():
+            group = Group.objects.create(name='second')
+        assert get_published(self.pubsub) == [
+            ('groups', [('group.created', {'pk': group.pk, 'name': 'second'}, None)])]
+
+    def test_savepoint_rollback(self):
+        with transaction.atomic():
+            first = Group.objects.create(name='first')
+            try:
+                with transaction.atomic():
+                    Group.objects.create(name='second')
+                    raise ValueError()
+            except ValueError:
+                pass
+
+        assert get_published(self.pubsub) == [
+            ('groups', [('group.created', {'pk': first.pk, 'name': 'first'}, None)])]
+
+    def test_savepoint_release(self):
+        with transaction.atomic():
+            first = Group.objects.create(name='first')
+            second = Group.objects.create(name='second')
+            with transaction.atomic():
+                first.delete()
+                second.name = 'renamed'
+                second.save()
+                third = Group.objects.create(name='third')
+
+        # The changes of the savepoint are merged into the transaction.
+        assert get_published(self.pubsub) == [('groups', [
+            ('group.created', {'pk': second.pk, 'name': 'renamed'}, None),
+            ('group.created', {'pk': third.pk, 'name': 'third'}, None),
+        ])]
+
+    def test_savepoint_release_continued(self):
+        with transaction.atomic():
+            with transaction.atomic():
+                first = Group.objects.create(name='first')
+            try:
+                with transaction.atomic():
+                    first.name = 'rolled back'
+                    first.save()
+                    raise ValueError()
+            except ValueError:
+                pass
+            with transaction.atomic():
+                with transaction.atomic():
+                    second = Group.objects.create(name='second')
+                second.delete()
+            first.name = 'renamed'
+            first.save()
+
+        assert get_published(self.pubsub) == [('groups', [
+            ('group.created', {'pk': first.pk, 'name': 'renamed'}, None),
+        ])]
+
+    def test_savepoint_rollback_last(self):
+        with transaction.atomic():
+            first = Group.objects.create(name='first')
+            pk = first.pk
+            with transaction.atomic():
+                first.name = 'renamed'
+                first.save()
+            try:
+                with transaction.atomic():
+                    first.delete()
+                    raise ValueError()
+            except ValueError:
+                pass
+
+        # The savepoints ended without later changes.
+        assert get_published(self.pubsub) == [('groups', [
+            ('group.created', {'pk': pk, 'name': 'renamed'}, None),
+        ])]
+
+    def test_register_options(self):
+        self.registry.register(Group, channel='other')
+        Group.objects.create(name='first')
+        assert get_published(self.pubsub)[0][0] == 'other'
+
+    def test_no_channel(self):
+        self.registry.register(Group, channel=None)
+        Group.objects.create(name='first')
+        assert self.pubsub.publish_batch.called is False
+
+    def test_unregister(self):
+        self.registry.unregister(Group)
+        Group.objects.create(name='first')
+        assert self.pubsub.publish_batch.called is False
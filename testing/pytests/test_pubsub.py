@@ -1,15 +1,23 @@
 import json
+import os
+import socket
+import stat
 import time
 import multiprocessing
 
 import mock
 import pytest
 import zmq
+from tornado.ioloop import IOLoop
 
+from omnibus.durable import DurableLog
 from omnibus.exceptions import (
     OmnibusException, OmnibusPublisherException, OmnibusDataException,
     OmnibusSubscriberException)
-from omnibus.pubsub import PubSub
+from omnibus.pubsub import (
+    PubSub, get_ipc_path, get_addresses, INPROC_SUBSCRIBER_ADDRESS,
+    INPROC_PUBLISHER_ADDRESS)
+from omnibus.sharding import Shards
 from omnibus import api
 
 
@@ -45,6 +53,51 @@ class TestPubSub:
         with pytest.raises(OmnibusException):
             self.pubsub.get_connection(zmq.PUB, 'inproc://test')
 
+    def test_get_connection_bind(self):
+        con = self.pubsub.get_connection(zmq.PUB, 'inproc://test', True)
+        assert con.bind.call_args[0] == ('inproc://test',)
+
+    def test_get_ipc_path(self):
+        assert get_ipc_path('ipc:///tmp/omnibus.sock') == '/tmp/omnibus.sock'
+        assert get_ipc_path('ipc://@omnibus') is None
+        assert get_ipc_path('tcp://127.0.0.1:4243') is None
+        assert get_ipc_path('inproc://omnibus') is None
+
+    def test_bind_ipc_stale(self, tmpdir):
+        path = str(tmpdir.join('stale.sock'))
+        # A bound socket which never listened, like one of a killed process.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.close()
+
+        connection = mock.Mock()
+        self.pubsub.bind(connection, 'ipc://' + path)
+        assert os.path.exists(path) is False
+        assert connection.bind.call_args[0] == ('ipc://' + path,)
+
+    def test_bind_ipc_in_use(self, tmpdir):
+        path = str(tmpdir.join('used.sock'))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(1)
+
+        try:
+            with pytest.raises(OmnibusException):
+                self.pubsub.get_connection(zmq.SUB, 'ipc://' + path, True)
+            assert self.context.socket.return_value.bind.called is False
+            assert os.path.exists(path) is True
+        finally:
+            sock.close()
+
+    def test_bind_ipc_permissions(self, tmpdir):
+        path = str(tmpdir.join('omnibus.sock'))
+        connection = mock.Mock()
+        connection.bind.side_effect = lambda address: open(path, 'w').close()
+
+        with mock.patch('omnibus.pubsub.IPC_PERMISSIONS', 0o660):
+            self.pubsub.bind(connection, 'ipc://' + path)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+
     def test_send(self):
         assert self.pubsub.send('testmsg') is True
         assert self.context.socket.return_value.send_unicode.call_count == 1
@@ -57,6 +110,15 @@ class TestPubSub:
         with pytest.raises(OmnibusPublisherException):
             self.pubsub.send('testmsg')
 
+    def test_send_control(self):
+        self.context.socket.side_effect = lambda mode: mock.Mock()
+        self.pubsub.control_publisher_address = 'tcp://127.0.0.1:4247'
+
+        self.pubsub.send('!presence:{}')
+        self.pubsub.send('mychan:{}')
+        assert list(self.pubsub.connections[zmq.PUB]) == [
+            'tcp://127.0.0.1:4247', 'tcp://127.0.0.1:4244']
+
     def test_publish_invalid_data(self):
         with pytest.raises(OmnibusDataException):
             self.pubsub.publish('test', 'test', 'test')
@@ -76,7 +138,49 @@ class TestPubSub:
         assert command == 'test1'
         assert json.loads(args) == {'type': 'test2', 'sender': 'test5', 'payload': {'test3': 'test4'}}  # noqa
 
-    @mock.patch('omnibus.pubsub.ZMQStream')
+    def test_publish_ttl(self):
+        self.pubsub.publish('test1', 'test2', {'test3': 'test4'}, ttl=10)
+
+        msg = self.context.socket.return_value.send_unicode.call_args[0][0]
+        assert msg.startswith('test1:{"expires":')
+        data = json.loads(msg.split(':', 1)[1])
+        assert 9 < data.pop('expires') - time.time() <= 10
+        assert data == {'type': 'test2', 'sender': None, 'payload': {'test3': 'test4'}}
+
+    def test_publish_batch(self):
+        assert self.pubsub.publish_batch('test1', [
+            ('test2', {'test3': 'test4'}, None), ('test5', None, 'test6')]) is True
+
+        msg = self.context.socket.return_value.send_unicode.call_args[0][0]
+        channel, args = msg.split(':', 1)
+        assert channel == 'test1'
+        assert json.loads(args) == [
+            {'type': 'test2', 'sender': None, 'payload': {'test3': 'test4'}},
+            {'type': 'test5', 'sender': 'test6', 'payload': {}},
+        ]
+
+        # A single message isn't wrapped in a list.
+        self.pubsub.publish_batch('test1', [('test2', {}, None)])
+        msg = self.context.socket.return_value.send_unicode.call_args[0][0]
+        assert json.loads(msg.split(':', 1)[1]) == {'type': 'test2', 'sender': None, 'payload': {}}
+
+    def test_publish_batch_invalid_data(self):
+        with pytest.raises(OmnibusDataException):
+            self.pubsub.publish_batch('test', [('test', 'test', None)])
+
+    def test_send_to_invalid_data(self):
+        with pytest.raises(OmnibusDataException):
+            self.pubsub.send_to('alice', 'test', 'test')
+
+    def test_send_to(self):
+        assert self.pubsub.send_to('alice', 'test2', {'test3': 'test4'}, 'test5') is True
+
+        msg = self.context.socket.return_value.send_unicode.call_args[0][0]
+        assert msg.startswith('!direct:"alice":')
+        assert json.loads(msg[len('!direct:"alice":'):]) == {
+            'type': 'test2', 'sender': 'test5', 'payload': {'test3': 'test4'}}
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
     def test_get_subscriber(self, stream_mock):
         cb = mock.Mock()
         subscriber = self.pubsub.get_subscriber(cb)
@@ -96,7 +200,7 @@ class TestPubSub:
 
         assert subscriber == stream_mock.return_value
 
-    @mock.patch('omnibus.pubsub.ZMQStream')
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
     def test_get_subscriber_other_address(self, stream_mock):
         cb = mock.Mock()
         self.pubsub.get_subscriber(cb, 'inproc://test')
@@ -149,6 +253,22 @@ class TestPubSub:
         assert 'mychan' in subscriber.channels
         assert subscriber.setsockopt.call_args[0] == (zmq.SUBSCRIBE, b'mychan')
 
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_subscribe_control(self, stream_mock):
+        self.pubsub.control_subscriber_address = 'tcp://127.0.0.1:4246'
+        subscriber = self.pubsub.get_subscriber(mock.Mock())
+        assert subscriber.control is False
+
+        self.pubsub.subscribe(subscriber, 'mychan')
+        assert subscriber.socket.connect.called is False
+
+        # Internal channels connect to the control lane once.
+        self.pubsub.subscribe(subscriber, '!presence')
+        self.pubsub.subscribe_topic(subscriber, '!direct:"user":')
+        assert subscriber.socket.connect.call_args_list == [
+            mock.call('tcp://127.0.0.1:4246')]
+        assert subscriber.control is True
+
     def test_unsubscribe_not_subscribed(self):
         subscriber = mock.Mock()
         subscriber.channels = ['mychan2']
@@ -187,7 +307,7 @@ class TestPubSub:
             self.pubsub.init_bridge(
                 self.pubsub.BIND, 'test', self.pubsub.CONNECT, 'test2')
 
-    @mock.patch('omnibus.pubsub.ZMQStream')
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
     def test_init_bridge(self, stream_mock):
         self.context.socket.side_effect = lambda s: mock.Mock()
 
@@ -212,7 +332,7 @@ class TestPubSub:
             self.pubsub.BIND, 'inproc://t1', self.pubsub.CONNECT, 'inproc://t2')
         assert self.context.socket.call_count == 2
 
-    @mock.patch('omnibus.pubsub.ZMQStream')
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
     def test_init_bridge_invert(self, stream_mock):
         self.context.socket.side_effect = lambda s: mock.Mock()
 
@@ -237,6 +357,108 @@ class TestPubSub:
             self.pubsub.CONNECT, 'inproc://t1', self.pubsub.BIND, 'inproc://t2')
         assert self.context.socket.call_count == 2
 
+    @mock.patch('omnibus.pubsub.metrics')
+    def test_forward(self, metrics_mock):
+        publisher = mock.Mock()
+        self.pubsub.forward(publisher, [b'mychan:{}'], 'inproc://t1')
+
+        assert publisher.send_multipart.call_args[0] == ([b'mychan:{}'],)
+        assert metrics_mock.bridge_messages.inc.call_args[1] == {'label': 'inproc://t1'}
+        assert metrics_mock.bridge_bytes.inc.call_args == mock.call(
+            9, label='inproc://t1')
+
+    def test_forward_expired(self):
+        publisher = mock.Mock()
+        self.pubsub.forward(publisher, [b'mychan:{"expires":1.0}'], 'inproc://t1')
+        assert publisher.send_multipart.called is False
+
+    def test_forward_durable(self):
+        publisher = mock.Mock()
+        self.pubsub.durable = mock.Mock()
+        self.pubsub.durable.append.return_value = b'orders:{"offset":0}'
+
+        self.pubsub.forward(publisher, [b'orders:{}', b'id'], 'inproc://t1')
+        assert self.pubsub.durable.append.call_args[0] == (b'orders:{}',)
+        assert publisher.send_multipart.call_args[0] == ([b'orders:{"offset":0}', b'id'],)
+
+    @mock.patch('omnibus.pubsub.DURABLE_CHANNELS', ('orders',))
+    @mock.patch('omnibus.durable.DurableLog')
+    @mock.patch('tornado.ioloop.PeriodicCallback')
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_director_durable(self, init_mock, stream_mock, callback_mock, log_mock):
+        self.pubsub.init_director()
+
+        assert self.pubsub.durable is log_mock.return_value
+        server_socket = stream_mock.call_args[0][0]
+        assert self.context.socket.call_args[0] == (zmq.ROUTER,)
+        assert server_socket.bind.call_args[0] == ('tcp://127.0.0.1:4245',)
+        assert callback_mock.call_args_list[0][0] == (log_mock.return_value.flush, 1000)
+
+        self.pubsub.close()
+        assert log_mock.return_value.close.called is True
+        assert stream_mock.return_value.close.called is True
+        assert self.pubsub.durable is None
+
+    def test_serve_replay(self):
+        self.pubsub.durable = mock.Mock()
+        self.pubsub.durable.read.return_value = ([b'orders:{"offset":4}'], 5, True)
+        self.pubsub.durable_server = mock.Mock()
+
+        self.pubsub.serve_replay([b'peer', b'1', b'orders', b'4'])
+        assert self.pubsub.durable.read.call_args[0] == (b'orders', 4, 1000)
+        assert self.pubsub.durable_server.send_multipart.call_args[0][0] == [
+            b'peer', b'1', b'5', b'1', b'orders:{"offset":4}']
+
+        # Invalid requests are dropped.
+        self.pubsub.serve_replay([b'peer', b'1', b'orders', b'x'])
+        self.pubsub.serve_replay([b'peer', b'1'])
+        assert self.pubsub.durable.read.call_count == 1
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_replay(self, stream_mock):
+        callback = mock.Mock()
+        self.pubsub.loop = mock.Mock()
+
+        self.pubsub.replay('orders', 4, callback)
+        self.pubsub.replay('orders', 7, callback)
+        # A single socket to the director.
+        assert stream_mock.call_count == 1
+        assert self.context.socket.return_value.connect.call_args[0] == (
+            'tcp://127.0.0.1:4245',)
+
+        replayer = stream_mock.return_value
+        assert replayer.send_multipart.call_args_list == [
+            mock.call([b'0', b'orders', b'4']), mock.call([b'1', b'orders', b'7'])]
+
+        self.pubsub.on_replay([b'0', b'6', b'1', b'orders:{"offset":4}', b'orders:{"offset":5}'])
+        assert callback.call_args[0] == (
+            [b'orders:{"offset":4}', b'orders:{"offset":5}'], 6, True)
+        assert self.pubsub.loop.remove_timeout.called is True
+
+        # Responses to timed out requests are ignored.
+        self.pubsub.loop.call_later.call_args[0][1]()
+        assert callback.call_args[0] == (None, 7, False)
+        self.pubsub.on_replay([b'1', b'8', b'0', b'orders:{"offset":7}'])
+        assert callback.call_count == 2
+        assert self.pubsub.replays == {}
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_close(self, stream_mock):
+        self.pubsub.get_connection(zmq.PUB, 'inproc://test')
+        self.pubsub.init_bridge('bind', 'inproc://t1', 'bind', 'inproc://t2')
+
+        self.pubsub.close(linger=100)
+        assert stream_mock.return_value.close.call_count == 1
+        assert self.context.destroy.call_args[1] == {'linger': 100}
+        assert self.pubsub.connections == {}
+        assert self.pubsub.bridges == {}
+
+    def test_close_error(self):
+        self.context.destroy.side_effect = zmq.ZMQError
+        with pytest.raises(OmnibusException):
+            self.pubsub.close()
+
     @mock.patch('omnibus.pubsub.PubSub.init_bridge')
     def test_init_director(self, init_mock):
         self.pubsub.init_director()
@@ -252,9 +474,287 @@ class TestPubSub:
         assert init_mock.call_args_list[1][0] == (
             'bind', 'tcp://127.0.0.1:4244', 'connect', None)
 
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_director_control(self, init_mock):
+        self.pubsub.control_publisher_address = 'tcp://127.0.0.1:4247'
+        self.pubsub.control_subscriber_address = 'tcp://127.0.0.1:4246'
+        self.pubsub.init_director()
+
+        assert init_mock.call_args_list == [
+            mock.call('bind', 'tcp://127.0.0.1:4244', 'bind', 'tcp://127.0.0.1:4243'),
+            mock.call('bind', 'tcp://127.0.0.1:4247', 'bind', 'tcp://127.0.0.1:4246')]
+
+    @mock.patch('omnibus.pubsub.DIRECTOR_CONTROL_PUBLISHER_ADDRESS', 'tcp://d1:4247')
+    @mock.patch('omnibus.pubsub.DIRECTOR_CONTROL_SUBSCRIBER_ADDRESS', 'tcp://d1:4246')
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_forwarder_control(self, init_mock):
+        self.pubsub.control_publisher_address = 'tcp://127.0.0.1:4247'
+        self.pubsub.control_subscriber_address = 'tcp://127.0.0.1:4246'
+        self.pubsub.init_forwarder()
+
+        assert init_mock.call_args_list[:2] == [
+            mock.call('bind', 'tcp://127.0.0.1:4247', 'connect', 'tcp://d1:4247'),
+            mock.call('connect', 'tcp://d1:4246', 'bind', 'tcp://127.0.0.1:4246')]
+
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_control_invalid(self, init_mock):
+        self.pubsub.control_publisher_address = 'tcp://127.0.0.1:4247'
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_director()
+
+        # Forwarders need the director's control addresses.
+        self.pubsub.control_subscriber_address = 'tcp://127.0.0.1:4246'
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_forwarder()
+
+        self.pubsub.shards = Shards(SHARDS)
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_director()
+
+    @mock.patch('tornado.ioloop.PeriodicCallback')
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_director_heartbeat(self, init_mock, callback_mock):
+        self.pubsub.init_director()
+        assert callback_mock.call_args[0][1] == 1000
+        assert callback_mock.return_value.start.called is True
+
+        # The heartbeat is published to the subscribers of the director.
+        callback_mock.call_args[0][0]()
+        frame = init_mock.return_value.__getitem__.return_value.send.call_args[0][0]
+        assert frame.startswith(b'!director:')
+
+        # Test double init.
+        self.pubsub.init_director()
+        assert callback_mock.call_count == 1
+
+        self.pubsub.close()
+        assert callback_mock.return_value.stop.called is True
+        assert self.pubsub.heartbeat is None
+
+    def test_get_addresses(self):
+        assert get_addresses(None) == [None]
+        assert get_addresses('tcp://d1:4243') == ['tcp://d1:4243']
+        assert get_addresses(('tcp://d1:4243', 'tcp://d2:4243')) == [
+            'tcp://d1:4243', 'tcp://d2:4243']
+
+    @mock.patch('omnibus.pubsub.DIRECTOR_SUBSCRIBER_ADDRESS', ['tcp://d1:4243', 'tcp://d2:4243'])
+    @mock.patch('omnibus.pubsub.DIRECTOR_PUBLISHER_ADDRESS', ['tcp://d1:4244', 'tcp://d2:4244'])
+    @mock.patch('omnibus.forwarder.Forwarder')
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_forwarder_redundant(self, init_mock, forwarder_mock):
+        forwarder = forwarder_mock.return_value
+        forwarder.bridges = ({'in': mock.Mock()}, {'out': mock.Mock()})
+
+        assert self.pubsub.init_forwarder() == forwarder.bridges
+        assert init_mock.called is False
+        assert forwarder_mock.call_args[0] == (
+            self.pubsub, ['tcp://d1:4243', 'tcp://d2:4243'],
+            ['tcp://d1:4244', 'tcp://d2:4244'])
+        assert forwarder.start.call_args[0] == (
+            'tcp://127.0.0.1:4244', 'tcp://127.0.0.1:4243')
+
+        # Test double init.
+        self.pubsub.init_forwarder()
+        assert forwarder_mock.call_count == 1
+
+        self.pubsub.close()
+        assert forwarder.close.called is True
+        assert self.pubsub.forwarder is None
+
+    @mock.patch('omnibus.pubsub.DURABLE_CHANNELS', ('orders',))
+    @mock.patch('omnibus.pubsub.DIRECTOR_SUBSCRIBER_ADDRESS', ['tcp://d1:4243', 'tcp://d2:4243'])
+    @mock.patch('omnibus.pubsub.DIRECTOR_PUBLISHER_ADDRESS', ['tcp://d1:4244', 'tcp://d2:4244'])
+    @mock.patch('omnibus.forwarder.Forwarder')
+    def test_init_forwarder_redundant_durable(self, forwarder_mock):
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_forwarder()
+        assert forwarder_mock.called is False
+
+    @mock.patch('omnibus.pubsub.INPROC_ENABLED', True)
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_init_director_inproc(self, stream_mock):
+        self.context.socket.side_effect = lambda s: mock.Mock()
+
+        director = self.pubsub.init_director()
+        assert director['in'].bind.call_args_list == [
+            mock.call('tcp://127.0.0.1:4244'), mock.call(INPROC_PUBLISHER_ADDRESS)]
+        assert director['out'].bind.call_args_list == [
+            mock.call('tcp://127.0.0.1:4243'), mock.call(INPROC_SUBSCRIBER_ADDRESS)]
+
+        assert self.pubsub.subscriber_address == INPROC_SUBSCRIBER_ADDRESS
+        assert self.pubsub.publisher_address == INPROC_PUBLISHER_ADDRESS
+
+        # Local subscribers and publishers use the inproc addresses.
+        self.pubsub.get_subscriber(lambda msg: None)
+        subscriber_socket = stream_mock.call_args[0][0]
+        assert subscriber_socket.connect.call_args[0] == (INPROC_SUBSCRIBER_ADDRESS,)
+        self.pubsub.send('testmsg')
+        assert self.pubsub.connections[zmq.PUB][INPROC_PUBLISHER_ADDRESS][False]
+
+        # Test double init.
+        self.pubsub.init_director()
+        assert director['in'].bind.call_count == 2
+
+    @mock.patch('omnibus.pubsub.INPROC_ENABLED', True)
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_init_forwarder_inproc(self, stream_mock):
+        self.context.socket.side_effect = lambda s: mock.Mock()
+
+        pub_forwarder, sub_forwarder = self.pubsub.init_forwarder()
+        assert pub_forwarder['in'].bind.call_args_list[1] == mock.call(
+            INPROC_PUBLISHER_ADDRESS)
+        assert sub_forwarder['out'].bind.call_args_list[1] == mock.call(
+            INPROC_SUBSCRIBER_ADDRESS)
+        assert self.pubsub.subscriber_address == INPROC_SUBSCRIBER_ADDRESS
+
+
+SHARDS = [
+    {'subscriber_address': 'tcp://d1:4243', 'publisher_address': 'tcp://d1:4244'},
+    {'subscriber_address': 'tcp://d2:4243', 'publisher_address': 'tcp://d2:4244'},
+]
+
+
+class TestShardedPubSub:
+
+    @mock.patch('omnibus.pubsub.zmq.Context')
+    def setup(self, cm):
+        self.pubsub = PubSub()
+        self.pubsub.shards = Shards(SHARDS)
+        self.context = cm.return_value
+        self.context.socket.side_effect = lambda mode: mock.Mock()
+
+    def get_channel(self, index):
+        return [c for c in ('a', 'b', 'c', 'd') if self.pubsub.shards.get_index(c) == index][0]
+
+    def test_send(self):
+        for index in (0, 1):
+            channel = self.get_channel(index)
+            self.pubsub.send(u'{0}:{{}}'.format(channel))
+
+            address = SHARDS[index]['publisher_address']
+            publisher = self.pubsub.connections[zmq.PUB][address][False]
+            assert publisher.send_unicode.call_args[0] == (u'{0}:{{}}'.format(channel),)
+
+    @mock.patch('omnibus.pubsub.FORWARDER_ENABLED', True)
+    def test_send_forwarder(self):
+        self.pubsub.send('a:{}')
+        assert list(self.pubsub.connections[zmq.PUB]) == ['tcp://127.0.0.1:4244']
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_subscribe(self, stream_mock):
+        subscriber = self.pubsub.get_subscriber(lambda msg: None)
+        subscriber.socket = stream_mock.call_args[0][0]
+        assert subscriber.socket.connect.called is False
+
+        first, other = self.get_channel(0), self.get_channel(1)
+
+        self.pubsub.subscribe(subscriber, first)
+        assert subscriber.socket.connect.call_args_list == [mock.call('tcp://d1:4243')]
+        self.pubsub.subscribe(subscriber, other)
+        assert subscriber.socket.connect.call_args_list == [
+            mock.call('tcp://d1:4243'), mock.call('tcp://d2:4243')]
+        self.pubsub.subscribe(subscriber, first)
+        assert subscriber.shards == {'tcp://d1:4243': 1, 'tcp://d2:4243': 1}
+
+        self.pubsub.unsubscribe(subscriber, other)
+        assert subscriber.socket.disconnect.call_args[0] == ('tcp://d2:4243',)
+        assert subscriber.shards == {'tcp://d1:4243': 1}
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_subscribe_address(self, stream_mock):
+        # Subscribers of a given address don't use the shards.
+        subscriber = self.pubsub.get_subscriber(lambda msg: None, 'inproc://test')
+        subscriber.socket = stream_mock.call_args[0][0]
+        self.pubsub.subscribe(subscriber, 'a')
+        assert subscriber.socket.connect.call_args_list == [mock.call('inproc://test')]
+
+    @mock.patch('omnibus.pubsub.DIRECTOR_SHARD', 1)
+    @mock.patch('omnibus.pubsub.PubSub.init_bridge')
+    def test_init_director(self, init_mock):
+        self.pubsub.init_director()
+        assert init_mock.call_args[0] == ('bind', 'tcp://d2:4244', 'bind', 'tcp://d2:4243')
+
+    @mock.patch('zmq.eventloop.zmqstream.ZMQStream')
+    def test_init_forwarder(self, stream_mock):
+        shard_router, sub_forwarder = self.pubsub.init_forwarder()
+        assert sub_forwarder is None
+        assert shard_router['in'].bind.call_args[0] == ('tcp://127.0.0.1:4244',)
+        assert stream_mock.return_value.on_recv.call_args[0] == (self.pubsub.route,)
+
+        # Test double init.
+        assert self.pubsub.init_forwarder()[0] is shard_router
+
+        self.pubsub.close()
+        assert stream_mock.return_value.close.called is True
+        assert self.pubsub.shard_router is None
+
+    @mock.patch('omnibus.pubsub.metrics')
+    def test_route(self, metrics_mock):
+        channel = self.get_channel(1)
+        msg = [u'{0}:{{}}'.format(channel).encode('utf-8'), b'id']
+
+        self.pubsub.route(msg)
+        publisher = self.pubsub.connections[zmq.PUB]['tcp://d2:4244'][False]
+        assert publisher.send_multipart.call_args[0] == (msg,)
+        assert metrics_mock.bridge_messages.inc.call_args[1] == {
+            'label': 'tcp://127.0.0.1:4244'}
+
 
 class TestRealPubSub:
 
+    @mock.patch('omnibus.pubsub.DURABLE_CHANNELS', ('orders',))
+    @mock.patch('omnibus.pubsub.DURABLE_ADDRESS', 'inproc://omnibus-durable')
+    def test_durable_replay(self, tmpdir):
+        bus = PubSub(loop=IOLoop())
+
+        with mock.patch('omnibus.durable.DurableLog', lambda: DurableLog(
+                path=str(tmpdir), channels=('orders',))):
+            bus.init_director()
+
+        for index in range(3):
+            bus.forward(mock.Mock(), [u'orders:{{"index":{0}}}'.format(index).encode('utf-8')], '')
+
+        replies = []
+
+        def callback(frames, next_offset, more):
+            replies.append((frames, next_offset, more))
+            bus.loop.stop()
+
+        bus.replay('orders', 1, callback)
+        bus.loop.start()
+        bus.close()
+
+        assert replies == [([
+            b'orders:{"offset":1,"index":1}', b'orders:{"offset":2,"index":2}'], 3, False)]
+
+    def test_control_lane(self):
+        bus = PubSub(loop=IOLoop())
+        bus.control_publisher_address = 'tcp://127.0.0.1:4247'
+        bus.control_subscriber_address = 'tcp://127.0.0.1:4246'
+        bus.init_director()
+        assert 'tcp://127.0.0.1:4247' in bus.bridges
+
+        messages = []
+
+        def callback(msg):
+            messages.append(msg)
+            bus.loop.stop()
+
+        subscriber = bus.get_subscriber(callback)
+        bus.subscribe(subscriber, '!presence')
+
+        # Resend until the subscription reached the director.
+        def send():
+            bus.send('!presence:{}')
+            bus.loop.call_later(0.01, send)
+
+        send()
+        bus.loop.call_later(5, bus.loop.stop)
+        bus.loop.start()
+        bus.close()
+
+        assert messages[0] == [b'!presence:{}']
+
     def test_basic_pubsub(self, settings):
         bus = PubSub()
 
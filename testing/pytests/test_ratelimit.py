@@ -0,0 +1,56 @@
+from omnibus.ratelimit import RateLimiter, TokenBucket, get_rate_limiter
+
+
+class TestTokenBucket:
+    def setup(self):
+        self.bucket = TokenBucket(2, 3, now=100)
+
+    def test_burst(self):
+        assert self.bucket.consume(now=100) == 0
+        assert self.bucket.consume(now=100) == 0
+        assert self.bucket.consume(now=100) == 0
+        assert self.bucket.consume(now=100) == 0.5
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.consume(now=100)
+
+        assert self.bucket.consume(now=100.25) == 0.25
+        assert self.bucket.consume(now=100.5) == 0
+        assert self.bucket.is_full(now=100.5) is False
+        assert self.bucket.is_full(now=110) is True
+        assert self.bucket.tokens == 3
+
+
+class TestRateLimiter:
+    def setup(self):
+        self.limiter = RateLimiter(1, 1, cleanup_size=2)
+
+    def test_check(self):
+        assert self.limiter.check('a', now=100) == 0
+        assert self.limiter.check('a', now=100) == 1
+        assert self.limiter.check('b', now=100) == 0
+
+    def test_cleanup(self):
+        self.limiter.check('a', now=100)
+        self.limiter.check('b', now=100)
+
+        # Both buckets are full again and dropped.
+        self.limiter.check('c', now=110)
+        assert sorted(self.limiter.buckets.keys()) == ['c']
+
+    def test_cleanup_busy(self):
+        self.limiter.check('a', now=100)
+        self.limiter.check('b', now=100)
+        self.limiter.check('c', now=100)
+
+        assert len(self.limiter.buckets) == 3
+        assert self.limiter.cleanup_size == 4
+
+
+def test_get_rate_limiter():
+    assert get_rate_limiter(None) is None
+
+    limiter = get_rate_limiter((5, 10))
+    assert limiter.rate == 5
+    assert limiter.burst == 10
@@ -0,0 +1,270 @@
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import mock
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from omnibus.backend import BasePubSub, get_pubsub
+from omnibus.exceptions import (
+    OmnibusException, OmnibusPublisherException, OmnibusDataException)
+from omnibus.pubsub import PubSub
+from omnibus.redispubsub import RedisPubSub, encode_command
+
+from .fakeredis import FakeRedis
+
+
+def test_encode_command():
+    assert encode_command('PUBLISH', 'chan', u'\xe4') == (
+        b'*3\r\n$7\r\nPUBLISH\r\n$4\r\nchan\r\n$2\r\n\xc3\xa4\r\n')
+
+
+def test_get_pubsub():
+    assert isinstance(get_pubsub(), PubSub)
+
+    with mock.patch('omnibus.backend.PUBSUB_BACKEND', 'omnibus.redispubsub.RedisPubSub'):
+        pubsub = get_pubsub(url='redis://:secret@redis.local:6380')
+    assert isinstance(pubsub, RedisPubSub)
+    assert (pubsub.host, pubsub.port, pubsub.password) == ('redis.local', 6380, 'secret')
+
+
+# Publishes without tornado, which is blocked from being imported.
+PUBLISHER_SCRIPT = """
+import sys
+sys.modules['tornado'] = None
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+from omnibus.redispubsub import RedisPubSub
+assert RedisPubSub(url=sys.argv[1]).send(u'chan:{}') is True
+"""
+
+
+def test_base_pubsub():
+    with pytest.raises(NotImplementedError):
+        BasePubSub().send('chan:{}')
+
+
+class TestRedisPubSub:
+    password = None
+
+    def setup(self):
+        self.server = FakeRedis(self.password)
+        self.loop = IOLoop()
+        self.pubsub = RedisPubSub(loop=self.loop, url=self.server.url)
+        self.received = []
+
+    def teardown(self):
+        self.pubsub.close()
+        self.server.stop()
+        self.loop.close(all_fds=True)
+
+    def run(self, until, timeout=2):
+        @gen.coroutine
+        def wait():
+            deadline = time.time() + timeout
+            while not until() and time.time() < deadline:
+                yield gen.sleep(0.01)
+
+        self.loop.run_sync(wait)
+        assert until()
+
+    def get_subscriber(self, *channels):
+        received = []
+        subscriber = self.pubsub.get_subscriber(received.append)
+        subscriber.received = received
+        for channel in channels:
+            self.pubsub.subscribe(subscriber, channel)
+        return subscriber
+
+    def get_commands(self, command):
+        return [args[1:] for args in self.server.commands if args[0] == command]
+
+    def test_publish_without_tornado(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'testing.pytests.settings')
+        subprocess.check_call(
+            [sys.executable, '-c', PUBLISHER_SCRIPT, self.server.url], env=env)
+        assert self.get_commands(b'PUBLISH') == [[b'chan', b'chan:{}']]
+
+    def test_publish_subscribe(self):
+        first = self.get_subscriber('chan')
+        second = self.get_subscriber('chan', 'other')
+        self.run(lambda: self.server.get_subscriptions() == {b'chan', b'other'})
+
+        # One subscription per process and channel.
+        assert sorted(sum(self.get_commands(b'SUBSCRIBE'), [])) == [b'chan', b'other']
+
+        self.pubsub.publish('chan', 'test', {'foo': 'bar'})
+        self.pubsub.publish('channel', 'test', {'foo': 'bar'})
+        self.run(lambda: len(first.received) == 1 and len(second.received) == 1)
+
+        frame = first.received[0][0]
+        assert frame.startswith(b'chan:{')
+        assert second.received[0] == [frame]
+
+        # Channels are matched exactly, messages arrive in order.
+        self.pubsub.send(u'chan:last')
+        self.run(lambda: len(first.received) == 2)
+        assert first.received[1] == [b'chan:last']
+
+    def test_expired(self):
+        subscriber = self.get_subscriber('chan')
+        self.run(lambda: self.server.get_subscriptions() == {b'chan'})
+
+        self.pubsub.publish('chan', 'test', ttl=-1)
+        self.pubsub.publish('chan', 'test', ttl=60)
+        self.run(lambda: len(subscriber.received) == 1)
+        assert subscriber.received[0][0].startswith(b'chan:{"expires":')
+
+    def test_fanout_chunked(self):
+        self.pubsub.fanout.chunk_size = 2
+        subscribers = [self.get_subscriber('chan') for _ in range(5)]
+        self.run(lambda: self.server.get_subscriptions() == {b'chan'})
+
+        # Subscribers closed while the fan-out is pending are skipped.
+        self.pubsub.on_message(b'chan', b'chan:{}')
+        self.pubsub.close_subscriber(subscribers[-1])
+        self.run(lambda: all(s.received for s in subscribers[:-1]))
+        assert subscribers[-1].received == []
+
+    def test_subscribe_twice(self):
+        subscriber = self.get_subscriber('chan')
+        assert self.pubsub.subscribe(subscriber, 'chan') is False
+        assert self.pubsub.unsubscribe(subscriber, 'other') is False
+
+    def test_unsubscribe(self):
+        first = self.get_subscriber('chan')
+        second = self.get_subscriber('chan')
+        self.run(lambda: self.server.get_subscriptions() == {b'chan'})
+
+        assert self.pubsub.unsubscribe(first, 'chan') is True
+        assert first.channels == []
+        assert self.pubsub.topics == {b'chan': set([second])}
+
+        self.pubsub.close_subscriber(second)
+        assert second.channels == []
+        assert self.pubsub.topics == {}
+        self.run(lambda: self.server.get_subscriptions() == set())
+
+    def test_send_to(self):
+        alice = self.get_subscriber()
+        al = self.get_subscriber()
+        self.pubsub.subscribe_topic(alice, '!direct:"alice":')
+        self.pubsub.subscribe_topic(al, '!direct:"al":')
+        self.run(lambda: len(self.server.get_subscriptions()) == 2)
+
+        self.pubsub.send_to('alice', 'hello', {'text': 'Hi'})
+        self.run(lambda: alice.received)
+        assert alice.received[0][0].startswith(b'!direct:"alice":{')
+        assert al.received == []
+
+        self.pubsub.unsubscribe_topic(alice, '!direct:"alice":')
+        self.run(lambda: self.server.get_subscriptions() == {b'!direct:"al":'})
+
+    def test_send_invalid_direct(self):
+        with pytest.raises(OmnibusDataException):
+            self.pubsub.send('!direct:{invalid')
+
+    def test_pipelined_replies(self):
+        for i in range(100):
+            self.pubsub.send(u'chan:{0}'.format(i))
+        self.run(lambda: len(self.get_commands(b'PUBLISH')) == 100)
+
+        # Replies are read with the next commands.
+        self.pubsub.send(u'chan:last')
+        self.run(lambda: self.pubsub.publisher.pending <= 1)
+
+    def test_publish_error(self):
+        self.server.stop()
+        with pytest.raises(OmnibusPublisherException):
+            self.pubsub.send(u'chan:{}')
+        assert self.pubsub.publisher.connection is None
+
+    def test_publish_high_fd(self):
+        # Occupy the file descriptors below 1024, select() fails beyond.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard != resource.RLIM_INFINITY and hard < 1100:
+            pytest.skip('File descriptor limit too low')
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, 1100), hard))
+
+        descriptors = []
+        try:
+            while not descriptors or descriptors[-1] < 1024:
+                descriptors.append(os.dup(0))
+
+            for i in range(10):
+                self.pubsub.send(u'chan:{0}'.format(i))
+            self.run(lambda: len(self.get_commands(b'PUBLISH')) == 10)
+            assert self.pubsub.publisher.connection.fileno() >= 1024
+
+            self.pubsub.send(u'chan:last')
+            self.run(lambda: self.pubsub.publisher.pending <= 1)
+        finally:
+            self.pubsub.publisher.close()
+            for fd in descriptors:
+                os.close(fd)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    def test_publish_unexpected_error(self):
+        self.pubsub.send(u'chan:{}')
+        with mock.patch.object(
+            self.pubsub.publisher, 'read_replies', side_effect=ValueError('fd')
+        ):
+            with pytest.raises(OmnibusPublisherException):
+                self.pubsub.send(u'chan:{}')
+        assert self.pubsub.publisher.connection is None
+
+        # The next command reconnects.
+        assert self.pubsub.send(u'chan:{}') is True
+
+    def test_resubscribe(self):
+        subscriber = self.get_subscriber('chan')
+        self.pubsub.subscription.reconnect_delay = 0.05
+        self.run(lambda: self.server.get_subscriptions() == {b'chan'})
+
+        # Drop the subscribing connection.
+        with self.server.lock:
+            client = [c for c in self.server.clients if c.channels][0]
+        client.connection.shutdown(2)
+        self.run(lambda: len(self.get_commands(b'SUBSCRIBE')) == 2)
+        self.run(lambda: self.server.get_subscriptions() == {b'chan'})
+
+        self.pubsub.send(u'chan:{}')
+        self.run(lambda: subscriber.received)
+
+    def test_director(self, caplog):
+        with caplog.at_level(logging.INFO):
+            self.pubsub.init_director()
+            self.pubsub.init_forwarder()
+        assert 'is the director' in caplog.text
+
+    def test_replay(self):
+        callback = mock.Mock()
+        self.pubsub.replay('orders-1', 5, callback)
+        self.run(lambda: callback.called)
+        assert callback.call_args == mock.call(None, 5, False)
+
+    @mock.patch('omnibus.redispubsub.DURABLE_CHANNELS', ('orders-',))
+    def test_director_durable(self):
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_director()
+        with pytest.raises(OmnibusException):
+            self.pubsub.init_forwarder()
+
+
+class TestRedisPubSubPassword(TestRedisPubSub):
+    password = 'secret'
+
+    def test_auth(self):
+        self.get_subscriber('chan')
+        self.pubsub.send(u'chan:{}')
+        self.run(lambda: len(self.get_commands(b'AUTH')) == 2)
+        assert self.get_commands(b'AUTH') == [[b'secret'], [b'secret']]
@@ -0,0 +1,115 @@
+import mock
+
+from omnibus.registry import ConnectionRegistry, Drainer, Reaper
+
+
+class TestConnectionRegistry:
+    def setup(self):
+        self.registry = ConnectionRegistry()
+
+    def test_add_remove(self):
+        connection = mock.Mock()
+        self.registry.add(connection)
+        assert connection in self.registry
+        assert len(self.registry) == 1
+
+        self.registry.remove(connection)
+        assert connection not in self.registry
+
+        # Removing twice is fine.
+        self.registry.remove(connection)
+        assert len(self.registry) == 0
+
+    def test_iter_while_removing(self):
+        connections = [mock.Mock(), mock.Mock()]
+        for connection in connections:
+            self.registry.add(connection)
+
+        for connection in self.registry:
+            self.registry.remove(connection)
+        assert len(self.registry) == 0
+
+
+class TestReaper:
+    def setup(self):
+        self.registry = ConnectionRegistry()
+        self.reaper = Reaper(self.registry, interval=1)
+
+    def test_reap(self):
+        connection = mock.Mock()
+        self.registry.add(connection)
+
+        self.reaper.reap()
+        assert connection.check_timeouts.call_count == 1
+
+    @mock.patch('omnibus.registry.logger')
+    def test_reap_error(self, logger_mock):
+        broken, connection = mock.Mock(), mock.Mock()
+        broken.check_timeouts.side_effect = ValueError
+        self.registry.add(broken)
+        self.registry.add(connection)
+
+        self.reaper.reap()
+        assert connection.check_timeouts.call_count == 1
+        assert logger_mock.exception.call_count == 1
+
+    @mock.patch('omnibus.registry.PeriodicCallback')
+    def test_start_stop(self, callback_mock):
+        self.reaper.start()
+        assert callback_mock.call_args[0] == (self.reaper.reap, 1000)
+        assert callback_mock.return_value.start.call_count == 1
+
+        self.reaper.stop()
+        assert callback_mock.return_value.stop.call_count == 1
+        assert self.reaper.callback is None
+
+
+class TestDrainer:
+    def setup(self):
+        self.registry = ConnectionRegistry()
+        self.drainer = Drainer(self.registry, timeout=0.2)
+        self.callback = mock.Mock()
+
+    @mock.patch('omnibus.registry.IOLoop')
+    def test_start(self, loop_mock):
+        connections = [mock.Mock() for _ in range(5)]
+        for connection in connections:
+            self.registry.add(connection)
+
+        self.drainer.start(self.callback)
+        assert self.registry.draining is True
+        assert self.drainer.chunk_size == 3
+        assert sum(c.drain.call_count for c in connections) == 3
+        assert loop_mock.current.return_value.call_later.call_args[0] == (
+            0.1, self.drainer.step)
+
+        self.drainer.step()
+        assert sum(c.drain.call_count for c in connections) == 5
+        assert self.callback.called is False
+
+        # Wait for the connections to close.
+        for connection in connections:
+            self.registry.remove(connection)
+        self.drainer.step()
+        assert self.callback.call_count == 1
+
+    @mock.patch('omnibus.registry.IOLoop')
+    def test_start_empty(self, loop_mock):
+        self.drainer.start(self.callback)
+        assert self.callback.call_count == 1
+        assert loop_mock.current.return_value.call_later.called is False
+
+    @mock.patch('omnibus.registry.IOLoop')
+    @mock.patch('omnibus.registry.logger')
+    def test_deadline(self, logger_mock, loop_mock):
+        connection = mock.Mock()
+        connection.drain.side_effect = ValueError
+        self.registry.add(connection)
+
+        self.drainer.start(self.callback)
+        assert logger_mock.exception.call_count == 1
+        assert self.callback.called is False
+
+        self.drainer.deadline = 0
+        self.drainer.step()
+        assert self.callback.call_count == 1
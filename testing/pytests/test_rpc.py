@@ -0,0 +1,68 @@
+import mock
+import pytest
+
+from omnibus.exceptions import OmnibusRPCException
+from omnibus.rpc import RPC
+
+
+def add(authenticator, params):
+    return params['a'] + params['b']
+
+
+class TestRPC:
+    def setup(self):
+        self.rpc = RPC(handlers={'add': 'testing.pytests.test_rpc.add'}, queue_size=1)
+        self.callback = mock.Mock()
+
+    def teardown(self):
+        self.rpc.shutdown()
+
+    def test_register(self):
+        handler = mock.Mock()
+        self.rpc.register('mock', handler)
+        assert self.rpc.get_handler('mock') is handler
+
+        @self.rpc.register('decorated')
+        def decorated(authenticator, params):
+            pass
+
+        assert self.rpc.get_handler('decorated') is decorated
+
+    def test_get_handler_path(self):
+        assert self.rpc.get_handler('add') is add
+
+    def test_get_handler_unknown(self):
+        with pytest.raises(OmnibusRPCException):
+            self.rpc.get_handler('unknown')
+
+    @mock.patch('omnibus.rpc.IOLoop')
+    def test_submit(self, loop_mock):
+        self.rpc.submit('add', None, {'a': 1, 'b': 2}, self.callback)
+        assert self.rpc.pending == 1
+
+        future, done = loop_mock.current.return_value.add_future.call_args[0]
+        assert future.result(timeout=5) == 3
+
+        done(future)
+        assert self.rpc.pending == 0
+        assert self.callback.call_args[0] == (future,)
+
+    @mock.patch('omnibus.rpc.IOLoop')
+    def test_submit_busy(self, loop_mock):
+        self.rpc.submit('add', None, {'a': 1, 'b': 2}, self.callback)
+        with pytest.raises(OmnibusRPCException):
+            self.rpc.submit('add', None, {'a': 1, 'b': 2}, self.callback)
+
+    def test_submit_unknown(self):
+        with pytest.raises(OmnibusRPCException):
+            self.rpc.submit('unknown', None, {}, self.callback)
+        assert self.rpc.pending == 0
+
+    @mock.patch('omnibus.rpc.close_old_connections')
+    def test_run(self, close_mock):
+        handler = mock.Mock(side_effect=ValueError)
+        with pytest.raises(ValueError):
+            self.rpc.run(handler, 'auth', {'a': 1})
+
+        assert handler.call_args[0] == ('auth', {'a': 1})
+        assert close_mock.call_count == 1
@@ -0,0 +1,55 @@
+from omnibus.sharding import Shards
+
+
+def get_shards(count):
+    return Shards([{
+        'subscriber_address': 'tcp://10.0.0.{0}:4243'.format(i),
+        'publisher_address': 'tcp://10.0.0.{0}:4244'.format(i),
+    } for i in range(count)])
+
+
+class TestShards:
+    def setup(self):
+        self.shards = get_shards(4)
+        self.channels = ['channel{0}'.format(i) for i in range(1000)]
+
+    def test_len(self):
+        assert len(self.shards) == 4
+
+    def test_get_shard(self):
+        shard = self.shards.get_shard('channel')
+        assert self.shards.get_subscriber_address('channel') == shard['subscriber_address']
+        assert self.shards.get_publisher_address('channel') == shard['publisher_address']
+
+        # Bytes and text of the same channel belong to the same shard.
+        assert self.shards.get_index(b'channel') == self.shards.get_index(u'channel')
+
+    def test_consistent(self):
+        other = get_shards(4)
+        assert [self.shards.get_index(c) for c in self.channels] == [
+            other.get_index(c) for c in self.channels]
+
+    def test_distribution(self):
+        counts = [0] * 4
+        for channel in self.channels:
+            counts[self.shards.get_index(channel)] += 1
+        assert min(counts) > 150
+
+    def test_add_shard(self):
+        more = get_shards(5)
+        moved = [
+            c for c in self.channels
+            if self.shards.get_subscriber_address(c) != more.get_subscriber_address(c)]
+
+        # Only the channels of the new shard move.
+        assert len(moved) < 300
+        assert all(more.get_index(c) == 4 for c in moved)
+
+    def test_cache(self):
+        self.shards.cache_size = 2
+        index = self.shards.get_index('channel')
+        assert self.shards.cache == {'channel': index}
+
+        self.shards.get_index('other')
+        self.shards.get_index('third')
+        assert list(self.shards.cache) == ['third']